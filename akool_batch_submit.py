@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+AKOOL Batch Submission
+Пакетная отправка задач createbytalkingphoto с ограничением скорости
+
+Задачи из итератора раздаются ограниченному пулу потоков; число задач "в
+полёте" ограничено, поэтому итератор на 5000 задач не материализуется
+целиком. Все воркеры берут разрешения из общего token bucket, скорость
+которого регулируется по AIMD: аддитивный рост на успехах и
+мультипликативное снижение на ошибке 1015. Результаты отдаются по мере
+готовности.
+"""
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+from akool_circuit_breaker import ENDPOINT_CREATE_TALKING_PHOTO, CircuitBreaker, RetryBudget, get_breaker
+from akool_metrics import get_registry
+
+ERROR_THROTTLED = "1015"
+
+
+class SubmitResult(NamedTuple):
+    """Итог отправки одной задачи"""
+    job: Any
+    task_id: Optional[str]
+    error: Optional[str]
+    attempts: int
+
+
+class SubmitError(Exception):
+    """Ошибка ответа createbytalkingphoto"""
+
+    def __init__(self, message: str, code: Any = None):
+        super().__init__(message)
+        self.code = str(code) if code is not None else None
+
+
+class AimdRateLimiter:
+    """
+    Потокобезопасный token bucket со скоростью, регулируемой по AIMD.
+
+    on_success() увеличивает скорость на increase (запросов/сек),
+    on_throttle() умножает её на decrease, но не чаще раза в cooldown секунд,
+    чтобы пачка одновременных 1015 не обрушила скорость до минимума.
+    """
+
+    def __init__(self, rate: float = 5.0, min_rate: float = 0.2, max_rate: float = 50.0,
+                 increase: float = 0.1, decrease: float = 0.5, cooldown: float = 1.0):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(max(1.0, self.rate), self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> None:
+        """Блокирует поток до получения разрешения на запрос"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait_for = (1.0 - self._tokens) / self.rate
+            time.sleep(wait_for)
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.cooldown:
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                self._last_decrease = now
+                # Сбрасываем накопленный burst, чтобы сразу снизить давление
+                self._tokens = min(self._tokens, 0.0)
+
+
+def _submit_with_retry(job: Any, submit: Callable[[Any], str], limiter: AimdRateLimiter,
+                       max_retries: int, retry_budget: Optional[RetryBudget]) -> SubmitResult:
+    attempts = 0
+    while True:
+        attempts += 1
+        limiter.acquire()
+        try:
+            task_id = submit(job)
+        except SubmitError as e:
+            if e.code == ERROR_THROTTLED:
+                limiter.on_throttle()
+                if attempts < max_retries and (retry_budget is None or retry_budget.try_spend()):
+                    continue
+            return SubmitResult(job, None, str(e), attempts)
+        except Exception as e:
+            return SubmitResult(job, None, str(e), attempts)
+        limiter.on_success()
+        if retry_budget is not None:
+            retry_budget.record_success()
+        return SubmitResult(job, task_id, None, attempts)
+
+
+def submit_batch(jobs: Iterable[Any], submit: Callable[[Any], str],
+                 workers: int = 8, limiter: Optional[AimdRateLimiter] = None,
+                 max_retries: int = 5, max_in_flight: Optional[int] = None,
+                 retry_budget: Optional[RetryBudget] = None) -> Iterator[SubmitResult]:
+    """
+    Отправка задач через пул потоков, результаты - по мере завершения.
+
+    submit(job) возвращает task_id или бросает SubmitError (code='1015'
+    для троттлинга - такие задачи повторяются после снижения скорости,
+    пока не исчерпан retry_budget).
+    """
+    limiter = limiter or AimdRateLimiter()
+    max_in_flight = max_in_flight or workers * 2
+    jobs = iter(jobs)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='akool-submit') as pool:
+        pending = set()
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < max_in_flight:
+                try:
+                    job = next(jobs)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending.add(pool.submit(_submit_with_retry, job, submit, limiter, max_retries, retry_budget))
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def talking_photo_submitter(session, base_url: str, access_token: str,
+                            webhook_url: Optional[str] = None, timeout: float = 30,
+                            breaker: Optional[CircuitBreaker] = None,
+                            on_accepted: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> Callable[[Any], str]:
+    """
+    submit(job) для createbytalkingphoto поверх сессии из akool_http.
+
+    job - кортеж (talking_photo_url, audio_url) или dict с этими ключами.
+    Пока общий breaker для 1015 разомкнут, воркер ждёт, а не шлёт запросы.
+    on_accepted(task_id, data) вызывается из воркера с полем data ответа
+    (там _id видео, по которому AKOOL шлёт webhook).
+    """
+    url = f"{base_url}{ENDPOINT_CREATE_TALKING_PHOTO}"
+    breaker = breaker or get_breaker(ENDPOINT_CREATE_TALKING_PHOTO, ERROR_THROTTLED)
+    metrics = get_registry()
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json"
+    }
+
+    def submit(job: Any) -> str:
+        if isinstance(job, dict):
+            payload = {"talking_photo_url": job['talking_photo_url'], "audio_url": job['audio_url']}
+        else:
+            talking_photo_url, audio_url = job
+            payload = {"talking_photo_url": talking_photo_url, "audio_url": audio_url}
+        if webhook_url:
+            payload["webhookUrl"] = webhook_url
+
+        while not breaker.allow():
+            time.sleep(min(1.0, max(0.05, breaker.remaining_open())))
+
+        response = session.post(url, headers=headers, json=payload, timeout=timeout)
+        if response.status_code != 200:
+            raise SubmitError(f"HTTP ошибка: {response.status_code}", response.status_code)
+
+        data = response.json()
+        code = str(data.get('code', ''))
+        task_id = (data.get('data') or {}).get('task_id')
+        metrics.count_code(ENDPOINT_CREATE_TALKING_PHOTO, code)
+        if code == "1000" and task_id:
+            breaker.record_success()
+            if on_accepted is not None:
+                on_accepted(task_id, data['data'])
+            return task_id
+        if code == ERROR_THROTTLED:
+            breaker.record_failure()
+        raise SubmitError(f"Код: {code}. {data.get('msg', '')}", code)
+
+    return submit
+
+
+def summarize(results: Iterable[SubmitResult]) -> Dict[str, Any]:
+    """Сводка по результатам пакета"""
+    stats: Dict[str, Any] = {'submitted': 0, 'failed': 0, 'attempts': 0}
+    for result in results:
+        stats['attempts'] += result.attempts
+        if result.task_id:
+            stats['submitted'] += 1
+        else:
+            stats['failed'] += 1
+    return stats
+
+
+def split_job_line(line: str) -> Tuple[str, str]:
+    """Строка 'photo_url audio_url' -> (talking_photo_url, audio_url)"""
+    photo, audio = line.split()[:2]
+    return photo, audio
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+AKOOL Webhook Benchmarks
+Бенчмарки горячих путей расшифровки и извлечения данных из webhook AKOOL
+
+Корпус webhook генерируется детерминированно (seed): JSON payload заданной
+длины шифруется AES (как у AKOOL) и, для XOR путей, XOR-ится одним из
+кандидатных ключей. Каждый сценарий замеряется отдельно: ops/sec, p50/p99
+латентности одной операции и пик аллокаций (tracemalloc). Результат -
+JSON; при заданном baseline сценарии, ставшие медленнее порога,
+помечаются как регрессии (код выхода 1 с --fail-on-regression).
+
+    python akool_bench.py --save-baseline bench_baseline.json
+    python akool_bench.py --baseline bench_baseline.json --fail-on-regression
+"""
+
+import argparse
+import base64
+import json
+import platform
+import random
+import string
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from akool_key_sweep import (derive_candidate_keys, find_json, legacy_find_json, legacy_try_decrypt, np, sweep_keys,
+                             xor_bytes)
+from akool_webhook import (DEFAULT_CLIENT_ID, DEFAULT_CLIENT_SECRET, SignatureVerifier, compute_signature,
+                           get_cipher)
+from marker_scan import MarkerMatcher
+
+DEFAULT_SEED = 42
+DEFAULT_COUNT = 500
+DEFAULT_PAYLOAD_LEN = 160
+DEFAULT_THRESHOLD = 0.10
+
+# Маркеры и поиск по hex строке - как было в final_decrypt_akool.py / extract_json_akool.py
+HEX_MARKERS = {
+    '7b': '{',
+    '5b': '[',
+    '22': '"',
+    '766964656f': 'video',
+    '737461747573': 'status',
+    '7461736b': 'task',
+}
+
+
+def hex_marker_scan(data_bytes: bytes, markers: Dict[str, str] = HEX_MARKERS) -> Dict[str, int]:
+    """Позиции маркеров в hex представлении данных (старый путь, для сравнения)"""
+    hex_data = data_bytes.hex()
+    found = {}
+    for hex_marker, name in markers.items():
+        pos = hex_data.find(hex_marker)
+        if pos != -1:
+            found[name] = pos
+    return found
+
+
+# ---------------------------------------------------------------- Корпус
+
+def make_payload(rng: random.Random, payload_len: int) -> bytes:
+    """JSON как в callback AKOOL, дополненный полем note до payload_len байт"""
+    body = {
+        '_id': '%024x' % rng.getrandbits(96),
+        'status': rng.choice([2, 3, 4]),
+        'type': 'talking photo',
+        'url': f"https://d2qf6ukcym4kn9.cloudfront.net/{rng.randrange(10 ** 12)}-{rng.randrange(10 ** 4)}.mp4",
+        'deduction_credit': 30,
+    }
+    raw = json.dumps(body, separators=(',', ':'))
+    missing = payload_len - len(raw) - len(',"note":""')
+    if missing > 0:
+        body['note'] = ''.join(rng.choice(string.ascii_letters) for _ in range(missing))
+        raw = json.dumps(body, separators=(',', ':'))
+    return raw.encode('utf-8')
+
+
+def make_webhook_corpus(count: int = DEFAULT_COUNT, payload_len: int = DEFAULT_PAYLOAD_LEN,
+                        seed: int = DEFAULT_SEED, client_id: str = DEFAULT_CLIENT_ID,
+                        client_secret: str = DEFAULT_CLIENT_SECRET) -> List[Dict[str, Any]]:
+    """
+    Детерминированный корпус webhook.
+
+    Каждая запись: поля webhook (signature, dataEncrypt, timestamp, nonce),
+    plaintext, XOR-вариант payload (xor_data + xor_keys) и расшифрованный
+    текст с мусором вокруг JSON (noisy_text) для сценария извлечения.
+    """
+    rng = random.Random(seed)
+    cipher = get_cipher(client_id, client_secret)
+    corpus = []
+    for _ in range(count):
+        plaintext = make_payload(rng, payload_len)
+        timestamp = 1757000000000 + rng.randrange(10 ** 9)
+        nonce = str(rng.randrange(1000, 10000))
+        data_encrypt = cipher.encrypt(plaintext)
+        signature = compute_signature(client_id, timestamp, nonce, data_encrypt)
+
+        keys = derive_candidate_keys(signature, str(timestamp), nonce)
+        _, key = keys[rng.randrange(len(keys))]
+        noise = ''.join(rng.choice(string.printable[:-6]) for _ in range(rng.randrange(8, 48)))
+
+        corpus.append({
+            'signature': signature,
+            'dataEncrypt': data_encrypt,
+            'timestamp': timestamp,
+            'nonce': nonce,
+            'plaintext': plaintext,
+            'data_bytes': base64.b64decode(data_encrypt),
+            'xor_data': xor_bytes(plaintext, key),
+            'xor_keys': keys,
+            'noisy_text': noise.replace('{', '(').replace('[', '(') + plaintext.decode('utf-8') + noise[::-1],
+        })
+    return corpus
+
+
+# ---------------------------------------------------------------- Сценарии
+
+def build_cases(corpus: Sequence[Dict[str, Any]], client_id: str = DEFAULT_CLIENT_ID,
+                client_secret: str = DEFAULT_CLIENT_SECRET) -> Dict[str, Callable[[Dict[str, Any]], Any]]:
+    """Сценарий -> функция от одной записи корпуса"""
+    cipher = get_cipher(client_id, client_secret)
+    verifier = SignatureVerifier(client_id)
+    matcher = MarkerMatcher()
+
+    def legacy_xor(record: Dict[str, Any]) -> Any:
+        # Старый путь: try_decrypt для каждого ключа до первого JSON
+        for _, key in record['xor_keys']:
+            result = legacy_try_decrypt(record['xor_data'], key)
+            if result is not None:
+                return result
+        return None
+
+    return {
+        'base64_decode': lambda record: base64.b64decode(record['dataEncrypt']),
+        'aes_decrypt': lambda record: cipher.decrypt_json(record['dataEncrypt']),
+        'signature_verify': lambda record: verifier.check(
+            record['timestamp'], record['nonce'], record['dataEncrypt'], record['signature']),
+        'xor_sweep': lambda record: sweep_keys(record['xor_data'], record['xor_keys'], 3),
+        'xor_legacy': legacy_xor,
+        'json_extract': lambda record: find_json(record['noisy_text']),
+        'json_extract_legacy': lambda record: legacy_find_json(record['noisy_text']),
+        'marker_scan': lambda record: matcher.first_positions(record['data_bytes']),
+        'marker_scan_hex': lambda record: hex_marker_scan(record['data_bytes']),
+    }
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def run_case(func: Callable[[Dict[str, Any]], Any], corpus: Sequence[Dict[str, Any]],
+             rounds: int = 3, warmup: int = 20) -> Dict[str, float]:
+    """Замер одного сценария: rounds проходов по корпусу + отдельный проход под tracemalloc"""
+    for record in corpus[:warmup]:
+        func(record)
+
+    timer = time.perf_counter_ns
+    latencies: List[int] = []
+    total = 0
+    for _ in range(rounds):
+        for record in corpus:
+            start = timer()
+            func(record)
+            elapsed = timer() - start
+            latencies.append(elapsed)
+            total += elapsed
+    latencies.sort()
+
+    # tracemalloc замедляет код, поэтому память меряется отдельным проходом
+    tracemalloc.start()
+    try:
+        for record in corpus:
+            func(record)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'ops': len(latencies),
+        'ops_per_sec': len(latencies) / (total / 1e9) if total else 0.0,
+        'p50_us': percentile(latencies, 0.50) / 1e3,
+        'p99_us': percentile(latencies, 0.99) / 1e3,
+        'peak_alloc_kb': peak / 1024,
+    }
+
+
+def run_suite(count: int = DEFAULT_COUNT, payload_len: int = DEFAULT_PAYLOAD_LEN,
+              seed: int = DEFAULT_SEED, rounds: int = 3,
+              cases: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """Все (или выбранные) сценарии на одном корпусе"""
+    corpus = make_webhook_corpus(count, payload_len, seed)
+    available = build_cases(corpus)
+    selected = list(cases) if cases else list(available)
+    unknown = [name for name in selected if name not in available]
+    if unknown:
+        raise ValueError(f"Неизвестные сценарии: {', '.join(unknown)}")
+
+    results = {name: run_case(available[name], corpus, rounds) for name in selected}
+    meta = {
+        'seed': seed,
+        'count': count,
+        'payload_len': payload_len,
+        'rounds': rounds,
+        'python': platform.python_version(),
+        'numpy': np is not None,
+        'platform': platform.platform(),
+    }
+    if resource is not None:
+        # ru_maxrss: КБ на Linux, байты на macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        meta['max_rss_kb'] = maxrss / 1024 if sys.platform == 'darwin' else maxrss
+    return {'meta': meta, 'results': results}
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any],
+            threshold: float = DEFAULT_THRESHOLD) -> Dict[str, Dict[str, Any]]:
+    """Сравнение ops/sec с baseline; regression=True, если стало медленнее порога"""
+    comparison = {}
+    for name, result in current['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if not base or not base.get('ops_per_sec'):
+            continue
+        ratio = result['ops_per_sec'] / base['ops_per_sec']
+        comparison[name] = {
+            'baseline_ops_per_sec': base['ops_per_sec'],
+            'ops_per_sec': result['ops_per_sec'],
+            'ratio': ratio,
+            'regression': ratio < 1.0 - threshold,
+        }
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарки расшифровки и извлечения данных webhook AKOOL')
+    parser.add_argument('--count', type=int, default=DEFAULT_COUNT, help='Webhook в корпусе')
+    parser.add_argument('--payload-len', type=int, default=DEFAULT_PAYLOAD_LEN, help='Длина JSON payload, байт')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='Seed генератора корпуса')
+    parser.add_argument('--rounds', type=int, default=3, help='Проходов по корпусу на сценарий')
+    parser.add_argument('--case', action='append', dest='cases', help='Запустить только этот сценарий (можно несколько)')
+    parser.add_argument('--output', help='Записать результат в JSON файл')
+    parser.add_argument('--baseline', help='JSON с прошлым результатом для сравнения')
+    parser.add_argument('--save-baseline', help='Сохранить результат как baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='Допустимое замедление (0.1 = 10%%)')
+    parser.add_argument('--fail-on-regression', action='store_true', help='Код выхода 1 при регрессии')
+    args = parser.parse_args()
+
+    report = run_suite(args.count, args.payload_len, args.seed, args.rounds, args.cases)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            report['comparison'] = compare(report, json.load(f), args.threshold)
+        regressions = [name for name, item in report['comparison'].items() if item['regression']]
+        report['regressions'] = regressions
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    print(output)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+
+    for name, result in report['results'].items():
+        line = (f"{name:<18} {result['ops_per_sec']:>12.0f} ops/s  p50 {result['p50_us']:>8.1f} мкс  "
+                f"p99 {result['p99_us']:>8.1f} мкс  пик {result['peak_alloc_kb']:>8.1f} КБ")
+        if name in report.get('comparison', {}):
+            ratio = report['comparison'][name]['ratio']
+            line += f"  {'⚠️' if name in regressions else '✅'} x{ratio:.2f}"
+        print(line, file=sys.stderr)
+
+    if regressions and args.fail_on_regression:
+        print(f"❌ Регрессии: {', '.join(regressions)}", file=sys.stderr)
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
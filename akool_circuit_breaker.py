@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+AKOOL Circuit Breaker
+Общий circuit breaker и бюджет повторов для ошибки 1015 AKOOL
+
+Breaker ключуется по (endpoint, код ошибки) и общий для всего процесса:
+после failure_threshold подряд ошибок он "размыкается" на recovery_timeout
+секунд, затем пропускает один пробный запрос (half-open). Если задан
+каталог AKOOL_BREAKER_STATE_DIR, момент размыкания и пробный запрос
+разделяются между процессами через файл под flock.
+
+RetryBudget ограничивает повторы долей от успешных вызовов: каждый успех
+добавляет ratio токена, каждый повтор списывает один.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: состояние только внутри процесса
+    fcntl = None
+
+ENDPOINT_CREATE_TALKING_PHOTO = '/content/video/createbytalkingphoto'
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Запрос не отправлен: breaker разомкнут"""
+
+
+class _SharedState:
+    """Состояние breaker'а в файле, общее для процессов"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mtime = None
+        self._cached: Dict[str, float] = {}
+
+    @contextmanager
+    def _locked(self):
+        with open(self.path, 'a+') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                raw = f.read()
+                try:
+                    state = json.loads(raw) if raw else {}
+                except ValueError:
+                    state = {}
+                yield state
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def read(self) -> Dict[str, float]:
+        """Чтение с кэшем по mtime: os.stat вместо разбора JSON на каждый вызов"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return {}
+        if mtime != self._mtime:
+            try:
+                with open(self.path, 'r') as f:
+                    self._cached = json.loads(f.read() or '{}')
+                self._mtime = mtime
+            except (OSError, ValueError):
+                return self._cached
+        return self._cached
+
+    def open_until(self, until: float) -> None:
+        with self._locked() as state:
+            state['opened_until'] = max(state.get('opened_until', 0.0), until)
+            state['probe_until'] = 0.0
+
+    def close(self) -> None:
+        with self._locked() as state:
+            state['opened_until'] = 0.0
+            state['probe_until'] = 0.0
+
+    def claim_probe(self, now: float, probe_timeout: float) -> bool:
+        """Ровно один процесс получает право на пробный запрос"""
+        with self._locked() as state:
+            if state.get('opened_until', 0.0) > now or state.get('probe_until', 0.0) > now:
+                return False
+            state['probe_until'] = now + probe_timeout
+            return True
+
+
+class CircuitBreaker:
+    """Circuit breaker с half-open пробой"""
+
+    def __init__(self, key: Tuple[str, str], failure_threshold: int = 5,
+                 recovery_timeout: float = 30.0, probe_timeout: Optional[float] = None,
+                 state_path: Optional[str] = None):
+        self.key = key
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.probe_timeout = probe_timeout if probe_timeout is not None else recovery_timeout
+        self._shared = _SharedState(state_path) if state_path else None
+
+        self._failures = 0
+        self._opened_until = 0.0
+        self._probe_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        now = time.time()
+        opened_until = self._effective_opened_until()
+        if opened_until > now:
+            return STATE_OPEN
+        if opened_until:
+            return STATE_HALF_OPEN
+        return STATE_CLOSED
+
+    def _effective_opened_until(self) -> float:
+        if self._shared is None:
+            return self._opened_until
+        # В общем режиме источник истины - файл (его пишет и этот процесс)
+        return self._shared.read().get('opened_until', 0.0)
+
+    def allow(self) -> bool:
+        """Можно ли отправлять запрос сейчас"""
+        opened_until = self._effective_opened_until()
+        if not opened_until:
+            return True
+
+        now = time.time()
+        if opened_until > now:
+            return False
+
+        # Half-open: пропускаем только один пробный запрос
+        with self._lock:
+            if self._probe_until > now:
+                return False
+            if self._shared is not None and not self._shared.claim_probe(now, self.probe_timeout):
+                return False
+            self._probe_until = now + self.probe_timeout
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            was_open = bool(self._opened_until) or self._probe_until
+            self._failures = 0
+            self._opened_until = 0.0
+            self._probe_until = 0.0
+        if self._shared is not None and (was_open or self._shared.read().get('opened_until')):
+            self._shared.close()
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            probing = self._probe_until > 0
+            if not probing and self._failures < self.failure_threshold:
+                return
+            # Порог превышен или проба не удалась - размыкаем заново
+            self._opened_until = time.time() + self.recovery_timeout
+            self._probe_until = 0.0
+            opened_until = self._opened_until
+        if self._shared is not None:
+            self._shared.open_until(opened_until)
+
+    def remaining_open(self) -> float:
+        """Сколько секунд breaker ещё будет разомкнут"""
+        return max(0.0, self._effective_opened_until() - time.time())
+
+
+class RetryBudget:
+    """Повторы не чаще ratio от успешных вызовов (плюс небольшой резерв)"""
+
+    def __init__(self, ratio: float = 0.2, reserve: float = 10.0):
+        self.ratio = ratio
+        # Баланс не копится выше резерва, чтобы после затишья не было лавины повторов
+        self.capacity = reserve
+        self._balance = reserve
+        self._lock = threading.Lock()
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._balance = min(self.capacity, self._balance + self.ratio)
+
+    def try_spend(self) -> bool:
+        """Списать один повтор; False - бюджет исчерпан"""
+        with self._lock:
+            if self._balance >= 1.0:
+                self._balance -= 1.0
+                return True
+            return False
+
+    @property
+    def balance(self) -> float:
+        return self._balance
+
+
+_breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+_budgets: Dict[str, RetryBudget] = {}
+_registry_lock = threading.Lock()
+
+
+def _state_path(key: Tuple[str, str]) -> Optional[str]:
+    state_dir = os.getenv('AKOOL_BREAKER_STATE_DIR')
+    if not state_dir:
+        return None
+    os.makedirs(state_dir, exist_ok=True)
+    name = '_'.join(part.strip('/').replace('/', '_') for part in key)
+    return os.path.join(state_dir, f"breaker_{name}.json")
+
+
+def get_breaker(endpoint: str, code: str = "1015") -> CircuitBreaker:
+    """Общий breaker процесса для (endpoint, код ошибки)"""
+    key = (endpoint, str(code))
+    breaker = _breakers.get(key)
+    if breaker is None:
+        with _registry_lock:
+            breaker = _breakers.get(key)
+            if breaker is None:
+                breaker = CircuitBreaker(key, state_path=_state_path(key))
+                _breakers[key] = breaker
+    return breaker
+
+
+def get_retry_budget(endpoint: str) -> RetryBudget:
+    """Общий бюджет повторов процесса для endpoint"""
+    budget = _budgets.get(endpoint)
+    if budget is None:
+        with _registry_lock:
+            budget = _budgets.setdefault(endpoint, RetryBudget())
+    return budget
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+AKOOL / ElevenLabs Flight Recorder
+Кольцевой буфер последних запросов/ответов по endpoint для отчётов в поддержку
+
+Отчёт create_support_report раньше содержал только последний ответ и
+писался во временный каталог, который cleanup() тут же удалял.
+FlightRecorder держит последние capacity обменов на каждый endpoint
+(deque с maxlen: запись O(1), старые вытесняются): метод, URL, HTTP
+статус, время ответа, размеры и тела, обрезанные до max_body байт и
+сжатые zlib (уровень 1), если длиннее compress_min. Бинарные тела (аудио,
+картинки, multipart) хранятся только первыми BINARY_HEAD байтами. Память
+ограничена: endpoint'ы нормализуются (akool_metrics.normalize_endpoint),
+их конечное число, а на каждый - не больше capacity записей.
+
+Запись идёт response hook'ом сессий из akool_http без блокировок (append
+в deque атомарен). Потоковые ответы (/stream) не читаются - тело не
+записывается; у httpx тело ответа в hook недоступно без чтения, поэтому
+пишутся только метаданные.
+
+dump() атомарно (временный файл + os.replace) пишет JSON со всеми
+буферами в постоянный каталог (~/.cache/airshorts/flight_recorder или
+AKOOL_FLIGHT_DIR) и оставляет только keep последних дампов. Ответы с HTTP
+статусом >= auto_dump_status сбрасываются автоматически, не чаще раза в
+min_dump_interval секунд. Секреты (clientSecret, токены) вырезаются из
+тел при сбросе, заголовки не хранятся вовсе.
+"""
+
+import argparse
+import base64
+import json
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from akool_metrics import normalize_endpoint
+
+DEFAULT_FLIGHT_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'airshorts', 'flight_recorder')
+DEFAULT_CAPACITY = 32
+DEFAULT_MAX_BODY = 4096
+DEFAULT_COMPRESS_MIN = 512
+DEFAULT_KEEP = 20
+DEFAULT_MIN_DUMP_INTERVAL = 30.0
+BINARY_HEAD = 64
+
+DUMP_PREFIX = 'flight-'
+
+_BINARY_TYPES = ('audio/', 'image/', 'video/', 'application/octet-stream', 'multipart/')
+_SECRET_PATTERN = re.compile(
+    rb'("(?:clientSecret|client_secret|token|access_token|api_key|xi-api-key)"\s*:\s*")[^"]*(")', re.IGNORECASE)
+
+
+class Exchange(NamedTuple):
+    """Один записанный обмен; тела - обрезанные bytes, возможно сжатые zlib"""
+    timestamp: float
+    endpoint: str
+    method: str
+    url: str
+    status: int
+    elapsed: float
+    request_size: int
+    request_body: Optional[bytes]
+    request_compressed: bool
+    response_size: int
+    response_body: Optional[bytes]
+    response_compressed: bool
+
+
+def _is_binary(content_type: Optional[str]) -> bool:
+    return bool(content_type) and content_type.lower().startswith(_BINARY_TYPES)
+
+
+class FlightRecorder:
+    """Последние capacity обменов на endpoint"""
+
+    def __init__(self, directory: Optional[str] = None, capacity: int = DEFAULT_CAPACITY,
+                 max_body: int = DEFAULT_MAX_BODY, compress: bool = True,
+                 compress_min: int = DEFAULT_COMPRESS_MIN, keep: int = DEFAULT_KEEP,
+                 auto_dump_status: Optional[int] = 400,
+                 min_dump_interval: float = DEFAULT_MIN_DUMP_INTERVAL):
+        self.directory = directory or os.getenv('AKOOL_FLIGHT_DIR', DEFAULT_FLIGHT_DIR)
+        self.capacity = capacity
+        self.max_body = max_body
+        self.compress = compress
+        self.compress_min = compress_min
+        self.keep = keep
+        self.auto_dump_status = auto_dump_status
+        self.min_dump_interval = min_dump_interval
+        self._rings: Dict[str, Deque[Exchange]] = {}
+        self._dump_lock = threading.Lock()
+        self._last_auto_dump = 0.0
+
+    # ------------------------------------------------------------ Запись
+
+    def _pack(self, body: Any, binary: bool) -> Tuple[int, Optional[bytes], bool]:
+        """(исходный размер, обрезанное тело, сжато ли)"""
+        if body is None:
+            return 0, None, False
+        if isinstance(body, str):
+            body = body.encode('utf-8', 'replace')
+        elif not isinstance(body, (bytes, bytearray, memoryview)):
+            # Генератор/файл (потоковая загрузка) - тело не трогаем
+            return -1, None, False
+        size = len(body)
+        body = bytes(body[:BINARY_HEAD if binary else self.max_body])
+        if self.compress and len(body) >= self.compress_min:
+            return size, zlib.compress(body, 1), True
+        return size, body, False
+
+    def record(self, method: str, url: str, path: str, status: int, elapsed: float,
+               request_body: Any = None, response_body: Any = None,
+               request_type: Optional[str] = None, response_type: Optional[str] = None) -> Exchange:
+        endpoint = normalize_endpoint(path)
+        request_size, request_packed, request_z = self._pack(request_body, _is_binary(request_type))
+        response_size, response_packed, response_z = self._pack(response_body, _is_binary(response_type))
+        exchange = Exchange(time.time(), endpoint, method, url, status, elapsed,
+                            request_size, request_packed, request_z,
+                            response_size, response_packed, response_z)
+        ring = self._rings.get(endpoint)
+        if ring is None:
+            ring = self._rings.setdefault(endpoint, deque(maxlen=self.capacity))
+        ring.append(exchange)
+
+        if self.auto_dump_status is not None and status >= self.auto_dump_status:
+            now = time.monotonic()
+            if now - self._last_auto_dump >= self.min_dump_interval:
+                self._last_auto_dump = now
+                try:
+                    self.dump(f'http-{status}', {'endpoint': endpoint, 'url': url})
+                except OSError:
+                    pass
+        return exchange
+
+    # ------------------------------------------------------------ Чтение
+
+    def exchanges(self, endpoint: Optional[str] = None) -> List[Exchange]:
+        """Снимок буферов (по времени), для одного endpoint или всех"""
+        rings = [self._rings.get(endpoint, ())] if endpoint else list(self._rings.values())
+        items = [exchange for ring in rings for exchange in list(ring)]
+        items.sort(key=lambda exchange: exchange.timestamp)
+        return items
+
+    def memory_bytes(self) -> int:
+        """Объём хранимых тел (оценка памяти буферов)"""
+        return sum(len(exchange.request_body or b'') + len(exchange.response_body or b'')
+                   for ring in list(self._rings.values()) for exchange in list(ring))
+
+    @staticmethod
+    def _unpack(body: Optional[bytes], compressed: bool, size: int) -> Any:
+        if body is None:
+            return None
+        if compressed:
+            body = zlib.decompress(body)
+        truncated = len(body) < size
+        text = None
+        if b'\x00' not in body:
+            try:
+                text = _SECRET_PATTERN.sub(rb'\1***\2', body).decode('utf-8')
+            except UnicodeDecodeError:
+                pass
+        if text is None:
+            return {'binary': True, 'size': size, 'head_base64': base64.b64encode(body[:BINARY_HEAD]).decode('ascii')}
+        return f"{text}... [{size} байт]" if truncated else text
+
+    def to_dict(self, exchange: Exchange) -> Dict[str, Any]:
+        return {
+            'time': datetime.fromtimestamp(exchange.timestamp).isoformat(timespec='milliseconds'),
+            'endpoint': exchange.endpoint,
+            'method': exchange.method,
+            'url': exchange.url,
+            'status': exchange.status,
+            'elapsed_ms': round(exchange.elapsed * 1000, 2),
+            'request_size': exchange.request_size,
+            'request_body': self._unpack(exchange.request_body, exchange.request_compressed, exchange.request_size),
+            'response_size': exchange.response_size,
+            'response_body': self._unpack(exchange.response_body, exchange.response_compressed, exchange.response_size),
+        }
+
+    def summary_lines(self, limit: int = 20) -> List[str]:
+        """Короткие строки о последних обменах (для текстового отчёта)"""
+        lines = []
+        for exchange in self.exchanges()[-limit:]:
+            when = datetime.fromtimestamp(exchange.timestamp).strftime('%H:%M:%S.%f')[:-3]
+            lines.append(f"{when} {exchange.method} {exchange.endpoint} -> {exchange.status} "
+                         f"({exchange.elapsed * 1000:.0f} мс, {exchange.response_size} байт)")
+        return lines
+
+    # ------------------------------------------------------------ Сброс
+
+    def rotate(self, prefix: str = DUMP_PREFIX, keep: Optional[int] = None) -> None:
+        """Оставить keep последних файлов с prefix (имена начинаются со времени)"""
+        keep = self.keep if keep is None else keep
+        try:
+            names = sorted(name for name in os.listdir(self.directory) if name.startswith(prefix))
+        except OSError:
+            return
+        for name in names[:max(0, len(names) - keep)]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def dump(self, reason: str, extra: Optional[Dict[str, Any]] = None) -> str:
+        """Атомарно записать все буферы в JSON; возвращает путь к файлу"""
+        document = {
+            'reason': reason,
+            'time': datetime.now().isoformat(timespec='milliseconds'),
+            'pid': os.getpid(),
+            'extra': extra or {},
+            'capacity': self.capacity,
+            'exchanges': [self.to_dict(exchange) for exchange in self.exchanges()],
+        }
+        safe_reason = re.sub(r'[^A-Za-z0-9_.-]+', '_', reason)[:40]
+        name = f"{DUMP_PREFIX}{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}-{safe_reason}.json"
+        path = os.path.join(self.directory, name)
+        with self._dump_lock:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(document, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, path)
+            self.rotate()
+        return path
+
+
+_recorder: Optional[FlightRecorder] = None
+_recorder_lock = threading.Lock()
+
+
+def get_flight_recorder() -> FlightRecorder:
+    """Общий (на процесс) recorder"""
+    global _recorder
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                _recorder = FlightRecorder()
+    return _recorder
+
+
+def record_session(session, recorder: Optional[FlightRecorder] = None):
+    """
+    Запись обменов сессии в recorder (по умолчанию общий).
+
+    requests: response hook; при stream=True тело ответа не читается.
+    httpx: event hook на ответ, только метаданные и тело запроса.
+    Повторный вызов для той же сессии ничего не делает.
+    """
+    recorder = recorder or get_flight_recorder()
+    if getattr(session, '_akool_flight', None) is recorder:
+        return session
+
+    if hasattr(session, 'event_hooks'):
+        def on_request(request):
+            request.extensions['akool_flight_start'] = time.perf_counter()
+
+        def on_response(response):
+            request = response.request
+            start = request.extensions.get('akool_flight_start')
+            try:
+                request_body = request.content
+            except Exception:  # потоковое тело запроса (httpx.RequestNotRead)
+                request_body = None
+            recorder.record(request.method, str(request.url), request.url.path, response.status_code,
+                            time.perf_counter() - start if start is not None else 0.0, request_body, None,
+                            request.headers.get('content-type'), response.headers.get('content-type'))
+
+        session.event_hooks['request'].append(on_request)
+        session.event_hooks['response'].append(on_response)
+    else:
+        def on_response(response, *args, **kwargs):
+            request = response.request
+            # При stream=True тело ещё не прочитано - его читает вызывающий код
+            body = None if kwargs.get('stream') else response.content
+            recorder.record(request.method, request.url, request.path_url.split('?', 1)[0],
+                            response.status_code, response.elapsed.total_seconds(), request.body, body,
+                            request.headers.get('Content-Type'), response.headers.get('Content-Type'))
+
+        session.hooks['response'].append(on_response)
+
+    session._akool_flight = recorder
+    return session
+
+
+def benchmark(records: int = 200_000) -> Dict[str, Any]:
+    """Стоимость record() и объём памяти буферов под постоянной нагрузкой"""
+    import tracemalloc
+    import tempfile
+
+    request_body = json.dumps({'talking_photo_url': 'https://example.com/p.jpg',
+                               'audio_url': 'https://example.com/a.mp3',
+                               'webhookUrl': 'https://example.com/hook'}).encode('utf-8')
+    response_body = json.dumps({'code': 1000, 'msg': 'OK', 'data': {'_id': 'x' * 24, 'status': 2,
+                                                                    'video': '', 'log': 'y' * 1500}}).encode('utf-8')
+    paths = ['/api/open/v3/content/video/createbytalkingphoto', '/api/open/v3/content/video/getvideostatus',
+             '/v1/text-to-speech/abc', '/v1/voices/add']
+    result: Dict[str, Any] = {'records': records}
+    with tempfile.TemporaryDirectory(prefix='flight_') as tmp:
+        for compress in (False, True):
+            recorder = FlightRecorder(tmp, compress=compress, auto_dump_status=None)
+
+            def run(count: int) -> float:
+                start = time.perf_counter()
+                for i in range(count):
+                    recorder.record('POST', 'https://x' + paths[i & 3], paths[i & 3], 200, 0.05,
+                                    request_body, response_body, 'application/json', 'application/json')
+                return time.perf_counter() - start
+
+            elapsed = run(records)
+            # Память после заполнения буферов не растёт с числом записей
+            tracemalloc.start()
+            run(records // 10)
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            key = 'zlib' if compress else 'plain'
+            result[f'record_us_{key}'] = elapsed / records * 1e6
+            result[f'body_bytes_{key}'] = recorder.memory_bytes()
+            result[f'traced_kb_{key}'] = current / 1024
+
+        start = time.perf_counter()
+        path = recorder.dump('benchmark')
+        result['dump_ms'] = (time.perf_counter() - start) * 1000
+        result['dump_kb'] = os.path.getsize(path) / 1024
+        for _ in range(DEFAULT_KEEP + 5):
+            recorder.dump('rotation')
+        result['dumps_kept'] = len([name for name in os.listdir(tmp) if name.startswith(DUMP_PREFIX)])
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Flight recorder запросов AKOOL/ElevenLabs')
+    parser.add_argument('--show', help='Вывести краткое содержимое дампа')
+    parser.add_argument('--benchmark', type=int, metavar='N', help='Бенчмарк записи N обменов')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        print("🛩️ Flight Recorder Benchmark")
+        print("============================")
+        print(json.dumps(benchmark(args.benchmark), indent=2))
+        return
+
+    recorder = get_flight_recorder()
+    if args.show:
+        with open(args.show, 'r', encoding='utf-8') as f:
+            document = json.load(f)
+        print(f"📄 {document['reason']} ({document['time']}), обменов: {len(document['exchanges'])}")
+        for exchange in document['exchanges']:
+            print(f"  {exchange['time']} {exchange['method']} {exchange['endpoint']} -> "
+                  f"{exchange['status']} ({exchange['elapsed_ms']} мс)")
+        return
+
+    try:
+        names = sorted(name for name in os.listdir(recorder.directory) if name.startswith(DUMP_PREFIX))
+    except OSError:
+        names = []
+    print(f"📂 {recorder.directory}: дампов {len(names)}")
+    for name in names:
+        print(f"  {name}")
+    if not names:
+        print("ℹ️ Дампы появятся после ошибки запроса (или --benchmark N для замера)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
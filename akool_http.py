@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+HTTP Client Layer
+Общий HTTP слой с пулами соединений для AKOOL и ElevenLabs
+
+Вместо module-level requests.post/get (новое TCP+TLS соединение на каждый
+запрос) клиенты используют общую requests.Session с HTTPAdapter: отдельный
+пул keep-alive соединений на каждый хост. При установленном httpx[http2]
+можно получить HTTP/2 клиент с тем же интерфейсом get/post.
+"""
+
+import argparse
+import json
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from akool_flight_recorder import record_session
+from akool_metrics import instrument_session
+
+try:
+    import httpx
+except ImportError:  # httpx опционален, нужен только для HTTP/2
+    httpx = None
+
+# Количество пулов (по одному на хост) и соединений в каждом пуле
+DEFAULT_POOL_CONNECTIONS = 4
+DEFAULT_POOL_MAXSIZE = 32
+
+_sessions: Dict[Tuple[Any, ...], Any] = {}
+_sessions_lock = threading.Lock()
+
+
+def create_session(pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+                   pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+                   pool_block: bool = False) -> requests.Session:
+    """Новая requests.Session с настроенными пулами соединений"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                          pool_block=pool_block, max_retries=0)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['Connection'] = 'keep-alive'
+    return session
+
+
+def create_http2_client(pool_maxsize: int = DEFAULT_POOL_MAXSIZE, keepalive_expiry: float = 30.0):
+    """HTTP/2 клиент (httpx) с интерфейсом, совместимым с вызовами get/post клиентов"""
+    if httpx is None:
+        raise ImportError("Для HTTP/2 нужен httpx: pip install 'httpx[http2]'")
+    limits = httpx.Limits(max_connections=pool_maxsize, max_keepalive_connections=pool_maxsize,
+                          keepalive_expiry=keepalive_expiry)
+    return httpx.Client(http2=True, limits=limits)
+
+
+def get_session(pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+                pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+                http2: bool = False):
+    """
+    Общая (на процесс) сессия с заданными параметрами пула (с записью
+    латентности в akool_metrics и обменов в akool_flight_recorder)
+    """
+    key = (pool_connections, pool_maxsize, http2)
+    session = _sessions.get(key)
+    if session is not None:
+        return session
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            if http2:
+                session = create_http2_client(pool_maxsize)
+            else:
+                session = create_session(pool_connections, pool_maxsize)
+            _sessions[key] = record_session(instrument_session(session))
+        return session
+
+
+def close_sessions() -> None:
+    """Закрытие всех общих сессий"""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Минимальный keep-alive endpoint для бенчмарка"""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = b'{"code":1000}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _latency_stats(samples):
+    samples = sorted(samples)
+    return {
+        'mean_ms': statistics.mean(samples) * 1000,
+        'p50_ms': samples[len(samples) // 2] * 1000,
+        'p99_ms': samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000,
+    }
+
+
+def benchmark(requests_count: int = 500, base_url: Optional[str] = None) -> Dict[str, Any]:
+    """Сравнение латентности: новое соединение на запрос против пула"""
+    server = None
+    if base_url is None:
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _StubHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    url = f"{base_url}/user/info"
+    try:
+        unpooled = []
+        for _ in range(requests_count):
+            start = time.perf_counter()
+            requests.get(url, timeout=10)
+            unpooled.append(time.perf_counter() - start)
+
+        session = create_session()
+        pooled = []
+        for _ in range(requests_count):
+            start = time.perf_counter()
+            session.get(url, timeout=10)
+            pooled.append(time.perf_counter() - start)
+        session.close()
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    return {
+        'requests': requests_count,
+        'url': url,
+        'unpooled': _latency_stats(unpooled),
+        'pooled': _latency_stats(pooled),
+        'speedup': sum(unpooled) / sum(pooled),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк пула HTTP соединений')
+    parser.add_argument('-n', '--requests', type=int, default=500, help='Количество запросов')
+    parser.add_argument('--base-url', help='Внешний stub сервер (по умолчанию локальный)')
+    args = parser.parse_args()
+
+    print("⏱️ HTTP Connection Pool Benchmark")
+    print("=================================")
+    print(json.dumps(benchmark(args.requests, args.base_url), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+AKOOL Job Store
+Хранилище задач рендера AKOOL на SQLite (WAL) с индексами по статусу и времени опроса
+
+Состояние задач (task_id, статус, URL видео, голос ElevenLabs, параметры
+запроса) пишется в SQLite, поэтому после падения процесса незавершённые
+рендеры можно дочитать (--resume в обоих скриптах). База в режиме WAL:
+читатели не блокируют писателя, synchronous=NORMAL - fsync только на
+checkpoint.
+
+Индексы: task_id (PRIMARY KEY), status, updated_at и частичный индекс по
+next_poll_at только для активных задач - завершённые (3/4) в нём не
+лежат, поэтому claim_due стоит O(log n + limit) при любом объёме
+истории. claim_due - один UPDATE ... RETURNING по этому индексу: задачи
+с наступившим next_poll_at получают "аренду" (next_poll_at сдвигается на
+lease), и параллельные опросчики не берут одну задачу дважды.
+
+Запросы - константные строки SQL, sqlite3 кэширует их подготовленные
+выражения на соединение; пакетные upsert'ы идут одним executemany в
+одной транзакции. Соединения - по одному на поток.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from akool_status_poller import STATUS_COMPLETED, STATUS_FAILED, STATUS_PROCESSING, STATUS_QUEUED
+
+DEFAULT_DB_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'airshorts', 'akool_jobs.sqlite3')
+DEFAULT_POLL_INTERVAL = 5.0
+DEFAULT_LEASE = 30.0
+UPSERT_CHUNK = 1000
+
+TERMINAL_STATUSES = (STATUS_COMPLETED, STATUS_FAILED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    task_id      TEXT PRIMARY KEY,
+    status       INTEGER NOT NULL,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    next_poll_at REAL,
+    video_url    TEXT,
+    voice_id     TEXT,
+    payload      TEXT,
+    error        TEXT,
+    created_at   REAL NOT NULL,
+    updated_at   REAL NOT NULL,
+    video_id     TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status);
+CREATE INDEX IF NOT EXISTS jobs_updated_at ON jobs(updated_at);
+CREATE INDEX IF NOT EXISTS jobs_next_poll_at ON jobs(next_poll_at) WHERE next_poll_at IS NOT NULL;
+"""
+
+# Webhook AKOOL несёт только _id видео, task_id находится по нему
+_VIDEO_ID_INDEX = "CREATE INDEX IF NOT EXISTS jobs_video_id ON jobs(video_id) WHERE video_id IS NOT NULL"
+
+# Новые поля перекрывают старые, NULL - не трогает уже сохранённое значение
+_UPSERT = """
+INSERT INTO jobs (task_id, status, next_poll_at, video_id, video_url, voice_id, payload, error, created_at, updated_at)
+VALUES (:task_id, :status, :next_poll_at, :video_id, :video_url, :voice_id, :payload, :error, :now, :now)
+ON CONFLICT(task_id) DO UPDATE SET
+    status = excluded.status,
+    next_poll_at = excluded.next_poll_at,
+    video_id = COALESCE(excluded.video_id, jobs.video_id),
+    video_url = COALESCE(excluded.video_url, jobs.video_url),
+    voice_id = COALESCE(excluded.voice_id, jobs.voice_id),
+    payload = COALESCE(excluded.payload, jobs.payload),
+    error = COALESCE(excluded.error, jobs.error),
+    updated_at = excluded.updated_at
+"""
+
+_RECORD_STATUS = """
+UPDATE jobs SET status = :status, next_poll_at = :next_poll_at,
+    video_url = COALESCE(:video_url, video_url), error = COALESCE(:error, error), updated_at = :now
+WHERE task_id = :task_id
+"""
+
+_CLAIM = """
+UPDATE jobs SET next_poll_at = :now + :lease, attempts = attempts + 1, updated_at = :now
+WHERE task_id IN (
+    SELECT task_id FROM jobs INDEXED BY jobs_next_poll_at
+    WHERE next_poll_at IS NOT NULL AND next_poll_at <= :now
+    ORDER BY next_poll_at LIMIT :limit
+)
+RETURNING task_id, status, attempts, next_poll_at, video_url, voice_id, payload, error, created_at, updated_at, video_id
+"""
+
+_SELECT_DUE = """
+SELECT task_id FROM jobs INDEXED BY jobs_next_poll_at
+WHERE next_poll_at IS NOT NULL AND next_poll_at <= :now
+ORDER BY next_poll_at LIMIT :limit
+"""
+
+_COLUMNS = "task_id, status, attempts, next_poll_at, video_url, voice_id, payload, error, created_at, updated_at, video_id"
+
+
+class JobRecord(NamedTuple):
+    """Строка таблицы jobs (payload - разобранный JSON)"""
+    task_id: str
+    status: int
+    attempts: int
+    next_poll_at: Optional[float]
+    video_url: Optional[str]
+    voice_id: Optional[str]
+    payload: Optional[Dict[str, Any]]
+    error: Optional[str]
+    created_at: float
+    updated_at: float
+    video_id: Optional[str] = None
+
+    @property
+    def terminal(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+
+def _record(row: tuple) -> JobRecord:
+    values = list(row)
+    values[6] = json.loads(values[6]) if values[6] else None
+    return JobRecord(*values)
+
+
+class JobStore:
+    """Задачи рендера AKOOL в SQLite"""
+
+    def __init__(self, path: Optional[str] = None, poll_interval: float = DEFAULT_POLL_INTERVAL):
+        self.path = path or os.getenv('AKOOL_JOB_DB', DEFAULT_DB_PATH)
+        self.poll_interval = poll_interval
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._returning = sqlite3.sqlite_version_info >= (3, 35, 0)
+        connection = self._connection()
+        connection.executescript(_SCHEMA)
+        # Базы, созданные до появления video_id
+        if 'video_id' not in {row[1] for row in connection.execute("PRAGMA table_info(jobs)")}:
+            connection.execute("ALTER TABLE jobs ADD COLUMN video_id TEXT")
+        connection.execute(_VIDEO_ID_INDEX)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # isolation_level=None: транзакции открываются явно (BEGIN) только для пакетов
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None,
+                                         check_same_thread=False, cached_statements=64)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('PRAGMA busy_timeout=30000')
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def _next_poll(self, status: int, now: float, delay: Optional[float]) -> Optional[float]:
+        if status in TERMINAL_STATUSES:
+            return None
+        return now + (self.poll_interval if delay is None else delay)
+
+    def _row(self, task_id: str, status: int, now: float, next_poll_in: Optional[float] = None,
+             video_id: Optional[str] = None, video_url: Optional[str] = None, voice_id: Optional[str] = None,
+             payload: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            'task_id': task_id,
+            'status': status,
+            'next_poll_at': self._next_poll(status, now, next_poll_in),
+            'video_id': video_id,
+            'video_url': video_url,
+            'voice_id': voice_id,
+            'payload': json.dumps(payload, ensure_ascii=False) if payload is not None else None,
+            'error': error,
+            'now': now,
+        }
+
+    # ------------------------------------------------------------ Запись
+
+    def upsert(self, task_id: str, status: int = STATUS_QUEUED, **fields: Any) -> None:
+        """
+        Создать или обновить задачу.
+
+        fields: next_poll_in, video_id (_id из ответа создания), video_url,
+        voice_id, payload (dict), error.
+        Для 3/4 next_poll_at сбрасывается - задача уходит из индекса опроса.
+        """
+        self._connection().execute(_UPSERT, self._row(task_id, status, time.time(), **fields))
+
+    def upsert_many(self, jobs: Iterable[Dict[str, Any]]) -> int:
+        """Пакетный upsert: dict с task_id, status и полями upsert; транзакция на UPSERT_CHUNK строк"""
+        connection = self._connection()
+        now = time.time()
+        total = 0
+        batch: List[Dict[str, Any]] = []
+        for job in jobs:
+            job = dict(job)
+            batch.append(self._row(job.pop('task_id'), job.pop('status', STATUS_QUEUED), now, **job))
+            if len(batch) >= UPSERT_CHUNK:
+                total += self._executemany(connection, _UPSERT, batch)
+                batch = []
+        if batch:
+            total += self._executemany(connection, _UPSERT, batch)
+        return total
+
+    def record_status(self, task_id: str, status: int, video_url: Optional[str] = None,
+                      error: Optional[str] = None, next_poll_in: Optional[float] = None) -> bool:
+        """Новый статус из getvideostatus/webhook; False - задачи нет в базе"""
+        now = time.time()
+        cursor = self._connection().execute(_RECORD_STATUS, {
+            'task_id': task_id, 'status': status, 'video_url': video_url, 'error': error,
+            'next_poll_at': self._next_poll(status, now, next_poll_in), 'now': now,
+        })
+        return cursor.rowcount > 0
+
+    @staticmethod
+    def _executemany(connection: sqlite3.Connection, sql: str, rows: List[Dict[str, Any]]) -> int:
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany(sql, rows)
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return len(rows)
+
+    # ------------------------------------------------------------ Опрос
+
+    def claim_due(self, limit: int = 100, lease: float = DEFAULT_LEASE, now: Optional[float] = None) -> List[JobRecord]:
+        """
+        Забрать до limit задач, которым пора опрашиваться.
+
+        next_poll_at забранных сдвигается на lease: если опросчик упадёт,
+        задача снова станет доступной после аренды.
+        """
+        connection = self._connection()
+        params = {'now': time.time() if now is None else now, 'lease': lease, 'limit': limit}
+        if self._returning:
+            return [_record(row) for row in connection.execute(_CLAIM, params).fetchall()]
+
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            task_ids = [row[0] for row in connection.execute(_SELECT_DUE, params)]
+            connection.executemany(
+                "UPDATE jobs SET next_poll_at = ?, attempts = attempts + 1, updated_at = ? WHERE task_id = ?",
+                [(params['now'] + lease, params['now'], task_id) for task_id in task_ids])
+            records = [self.get(task_id) for task_id in task_ids]
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return [record for record in records if record is not None]
+
+    # ------------------------------------------------------------ Чтение
+
+    def get(self, task_id: str) -> Optional[JobRecord]:
+        row = self._connection().execute(f"SELECT {_COLUMNS} FROM jobs WHERE task_id = ?", (task_id,)).fetchone()
+        return _record(row) if row else None
+
+    def task_for_video(self, video_id: str) -> Optional[str]:
+        """task_id по _id видео (из webhook)"""
+        row = self._connection().execute("SELECT task_id FROM jobs WHERE video_id = ?", (video_id,)).fetchone()
+        return row[0] if row else None
+
+    def latest_active(self) -> Optional[JobRecord]:
+        """Последняя обновлённая незавершённая задача (для продолжения после падения)"""
+        row = self._connection().execute(
+            f"SELECT {_COLUMNS} FROM jobs WHERE next_poll_at IS NOT NULL ORDER BY updated_at DESC LIMIT 1"
+        ).fetchone()
+        return _record(row) if row else None
+
+    def count_by_status(self) -> Dict[int, int]:
+        return dict(self._connection().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def purge(self, older_than: float) -> int:
+        """Удалить завершённые задачи, не обновлявшиеся older_than секунд"""
+        cursor = self._connection().execute(
+            "DELETE FROM jobs WHERE updated_at < ? AND status IN (?, ?)",
+            (time.time() - older_than, *TERMINAL_STATUSES))
+        return cursor.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+_stores: Dict[str, JobStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_job_store(path: Optional[str] = None) -> JobStore:
+    """Общее (на процесс) хранилище для пути (по умолчанию AKOOL_JOB_DB или ~/.cache/airshorts)"""
+    path = path or os.getenv('AKOOL_JOB_DB', DEFAULT_DB_PATH)
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = JobStore(path)
+            _stores[path] = store
+        return store
+
+
+def benchmark(path: str, rows: int = 300_000, claims: int = 20, limit: int = 50) -> Dict[str, Any]:
+    """Пакетная вставка rows задач и время claim_due при заданном объёме"""
+    store = JobStore(path)
+    now = time.time()
+
+    start = time.perf_counter()
+    # 90% завершены, остальные ждут опроса в разное время
+    store.upsert_many(
+        {'task_id': f'bench-{i}', 'status': STATUS_COMPLETED if i % 10 else STATUS_QUEUED,
+         'next_poll_in': (i % 1000) - 500.0, 'payload': {'n': i}}
+        for i in range(rows))
+    insert_elapsed = time.perf_counter() - start
+
+    connection = store._connection()
+    plan = [row[-1] for row in connection.execute('EXPLAIN QUERY PLAN ' + _SELECT_DUE, {'now': now, 'limit': limit})]
+
+    start = time.perf_counter()
+    claimed = 0
+    for _ in range(claims):
+        claimed += len(store.claim_due(limit, now=now))
+    claim_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(0, claims * limit, limit):
+        store.record_status(f'bench-{i * 10 % rows}', STATUS_PROCESSING)
+    status_elapsed = time.perf_counter() - start
+
+    result = {
+        'rows': rows,
+        'upserts_per_sec': rows / insert_elapsed,
+        'claim_limit': limit,
+        'claimed': claimed,
+        'claim_ms': claim_elapsed / claims * 1000,
+        'record_status_us': status_elapsed / claims * 1e6,
+        'query_plan': plan,
+        'by_status': store.count_by_status(),
+    }
+    store.close()
+    return result
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Хранилище задач AKOOL: обзор и бенчмарк')
+    parser.add_argument('--db', help='Путь к базе (по умолчанию AKOOL_JOB_DB или ~/.cache/airshorts)')
+    parser.add_argument('--benchmark', type=int, metavar='ROWS', help='Бенчмарк на ROWS строках во временной базе')
+    parser.add_argument('--purge-days', type=float, help='Удалить завершённые задачи старше N дней')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        import tempfile
+        with tempfile.TemporaryDirectory(prefix='akool_jobs_') as tmp:
+            print("⏱️ AKOOL Job Store Benchmark")
+            print("============================")
+            for rows in (args.benchmark // 10, args.benchmark):
+                print(json.dumps(benchmark(os.path.join(tmp, f'jobs_{rows}.sqlite3'), rows), indent=2))
+        return
+
+    store = JobStore(args.db)
+    if args.purge_days:
+        print(f"🧹 Удалено задач: {store.purge(args.purge_days * 86400)}")
+    print(f"📊 {store.path}: {store.count_by_status()}")
+    active = store.latest_active()
+    if active:
+        print(f"⏳ Последняя активная задача: {active.task_id} (статус {active.status}, попыток {active.attempts})")
+
+
+if __name__ == "__main__":
+    main()
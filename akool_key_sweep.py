@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+AKOOL XOR Key Sweep
+Пакетный перебор XOR ключей для зашифрованных webhook данных AKOOL
+
+Вместо побайтового XOR для каждого ключа по отдельности payload XOR-ится
+сразу со всеми ключами (NumPy broadcasting или XOR целыми словами через
+int.from_bytes). Кандидаты ранжируются по доле печатных/JSON байтов, и
+поиск JSON выполняется только для нескольких лучших.
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import random
+import re
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from json_scan import first_json
+
+try:
+    import numpy as np
+except ImportError:  # NumPy опционален, есть запасной путь на int.from_bytes
+    np = None
+
+# Печатные ASCII символы + пробельные, которые встречаются в JSON
+PRINTABLE_BYTES = bytes(range(0x20, 0x7F)) + b'\t\n\r'
+# Структурные символы JSON получают дополнительный вес
+JSON_STRUCT_BYTES = b'{}[]":,'
+
+# Старый каскад поиска JSON (только для legacy_try_decrypt и сравнения в бенчмарках)
+JSON_PATTERNS = [
+    re.compile(r'\{[^}]*\}', re.DOTALL),  # Простые объекты
+    re.compile(r'\{.*\}', re.DOTALL),     # Объекты с вложенностью
+    re.compile(r'\[.*\]', re.DOTALL),     # Массивы
+]
+
+if np is not None:
+    _BYTE_WEIGHTS = np.zeros(256, dtype=np.float32)
+    _BYTE_WEIGHTS[np.frombuffer(PRINTABLE_BYTES, dtype=np.uint8)] = 1.0
+    _BYTE_WEIGHTS[np.frombuffer(JSON_STRUCT_BYTES, dtype=np.uint8)] = 2.0
+
+
+def derive_candidate_keys(signature: str, timestamp: str, nonce: str) -> List[Tuple[str, bytes]]:
+    """Все ключи-кандидаты, которые выводятся из полей webhook"""
+    keys = []
+
+    # Базовые ключи
+    keys.append(("Signature hex", bytes.fromhex(signature)))
+    keys.append(("Nonce hex", bytes.fromhex(nonce)))
+    keys.append(("Timestamp", timestamp.encode()))
+
+    # Комбинированные ключи
+    keys.append(("Signature + Nonce", (signature + nonce).encode()))
+    keys.append(("Timestamp + Nonce", (timestamp + nonce).encode()))
+    keys.append(("Signature + Timestamp", (signature + timestamp).encode()))
+
+    # Hash ключи
+    keys.append(("SHA256(Signature)", hashlib.sha256(signature.encode()).digest()))
+    keys.append(("SHA256(Nonce)", hashlib.sha256(nonce.encode()).digest()))
+    keys.append(("SHA256(Timestamp)", hashlib.sha256(timestamp.encode()).digest()))
+    keys.append(("SHA256(Signature+Nonce)", hashlib.sha256((signature + nonce).encode()).digest()))
+    keys.append(("SHA256(Timestamp+Nonce)", hashlib.sha256((timestamp + nonce).encode()).digest()))
+
+    # MD5 ключи
+    keys.append(("MD5(Signature)", hashlib.md5(signature.encode()).digest()))
+    keys.append(("MD5(Nonce)", hashlib.md5(nonce.encode()).digest()))
+    keys.append(("MD5(Timestamp)", hashlib.md5(timestamp.encode()).digest()))
+
+    # Повторяющиеся ключи
+    keys.append(("Signature repeated", (signature * 10).encode()[:32]))
+    keys.append(("Nonce repeated", (nonce * 10).encode()[:32]))
+    keys.append(("Timestamp repeated", (timestamp * 10).encode()[:32]))
+
+    # Ключи из hex
+    keys.append(("Signature hex repeated", (signature * 10).encode()[:32]))
+    keys.append(("Nonce hex repeated", (nonce * 10).encode()[:32]))
+
+    return keys
+
+
+def expand_key(key: bytes, length: int) -> bytes:
+    """Повторяет ключ до нужной длины"""
+    return (key * (length // len(key) + 1))[:length]
+
+
+def xor_bytes(data: bytes, key: bytes) -> bytes:
+    """XOR всего буфера с ключом одной операцией над большими целыми"""
+    length = len(data)
+    if not length:
+        return b''
+    stream = expand_key(key, length)
+    return (int.from_bytes(data, 'big') ^ int.from_bytes(stream, 'big')).to_bytes(length, 'big')
+
+
+def xor_sweep(data: bytes, keys: Sequence[bytes]) -> List[bytes]:
+    """XOR одного payload со всеми ключами сразу"""
+    if np is None or not data:
+        return [xor_bytes(data, key) for key in keys]
+
+    length = len(data)
+    payload = np.frombuffer(data, dtype=np.uint8)
+    streams = np.frombuffer(b''.join(expand_key(key, length) for key in keys), dtype=np.uint8)
+    matrix = streams.reshape(len(keys), length) ^ payload
+    return [row.tobytes() for row in matrix]
+
+
+def score_candidates(candidates: Sequence[bytes]) -> List[float]:
+    """Оценка кандидатов по доле печатных и JSON байтов (0..2)"""
+    if np is not None and candidates and len(set(map(len, candidates))) == 1 and candidates[0]:
+        matrix = np.frombuffer(b''.join(candidates), dtype=np.uint8).reshape(len(candidates), -1)
+        return (_BYTE_WEIGHTS[matrix].sum(axis=1) / matrix.shape[1]).tolist()
+
+    scores = []
+    for candidate in candidates:
+        if not candidate:
+            scores.append(0.0)
+            continue
+        printable = len(candidate) - len(candidate.translate(None, PRINTABLE_BYTES))
+        structural = len(candidate) - len(candidate.translate(None, JSON_STRUCT_BYTES))
+        scores.append((printable + structural) / len(candidate))
+    return scores
+
+
+def find_json(text: str) -> Optional[Any]:
+    """Поиск первого валидного JSON в тексте (объекты приоритетнее массивов)"""
+    return first_json(text)
+
+
+def legacy_find_json(text: str) -> Optional[Any]:
+    """Старый поиск: re.findall по каскаду JSON_PATTERNS и json.loads каждого совпадения"""
+    for pattern in JSON_PATTERNS:
+        for match in pattern.findall(text):
+            try:
+                return json.loads(match)
+            except ValueError:
+                pass
+    return None
+
+
+def sweep_keys(data_bytes: bytes, keys: Sequence[Tuple[str, bytes]], top_n: int = 3) -> List[Dict[str, Any]]:
+    """
+    Перебор всех ключей за один проход.
+
+    Возвращает top_n лучших кандидатов по убыванию score; поле 'json'
+    заполнено, если в расшифрованном тексте найден валидный JSON.
+    """
+    if not keys:
+        return []
+
+    candidates = xor_sweep(data_bytes, [key for _, key in keys])
+    scores = score_candidates(candidates)
+    ranked = sorted(range(len(keys)), key=lambda i: scores[i], reverse=True)[:top_n]
+
+    results = []
+    for i in ranked:
+        text = candidates[i].decode('utf-8', errors='ignore')
+        results.append({
+            'method': keys[i][0],
+            'key': keys[i][1],
+            'score': scores[i],
+            'text': text,
+            'json': find_json(text),
+        })
+    return results
+
+
+def legacy_try_decrypt(data_bytes: bytes, key: bytes) -> Optional[Any]:
+    """Старый алгоритм: побайтовый XOR + каскад регулярных выражений"""
+    decrypted = bytearray()
+    for i in range(len(data_bytes)):
+        decrypted.append(data_bytes[i] ^ key[i % len(key)])
+    return legacy_find_json(decrypted.decode('utf-8', errors='ignore'))
+
+
+def make_corpus(count: int, size: int, seed: int = 42) -> List[Tuple[bytes, List[Tuple[str, bytes]]]]:
+    """Синтетические payload'ы с полями webhook для бенчмарка"""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        payload = bytes(rng.getrandbits(8) for _ in range(size))
+        signature = '%040x' % rng.getrandbits(160)
+        timestamp = str(1757000000000 + rng.randrange(10 ** 9))
+        nonce = str(rng.randrange(1000, 10000))
+        corpus.append((payload, derive_candidate_keys(signature, timestamp, nonce)))
+    return corpus
+
+
+def benchmark(count: int = 500, size: int = 176, top_n: int = 3, seed: int = 42) -> Dict[str, float]:
+    """Сравнение payloads/sec: старый перебор против пакетного"""
+    corpus = make_corpus(count, size, seed)
+
+    start = time.perf_counter()
+    for payload, keys in corpus:
+        for _, key in keys:
+            legacy_try_decrypt(payload, key)
+    legacy_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for payload, keys in corpus:
+        sweep_keys(payload, keys, top_n)
+    sweep_elapsed = time.perf_counter() - start
+
+    return {
+        'payloads': count,
+        'payload_size': size,
+        'keys_per_payload': len(corpus[0][1]) if corpus else 0,
+        'numpy': np is not None,
+        'legacy_payloads_per_sec': count / legacy_elapsed,
+        'sweep_payloads_per_sec': count / sweep_elapsed,
+        'speedup': legacy_elapsed / sweep_elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк пакетного перебора XOR ключей AKOOL')
+    parser.add_argument('--payloads', type=int, default=500, help='Количество payload в корпусе')
+    parser.add_argument('--size', type=int, default=176, help='Размер payload в байтах')
+    parser.add_argument('--top', type=int, default=3, help='Сколько лучших кандидатов проверять на JSON')
+    parser.add_argument('--seed', type=int, default=42, help='Seed генератора корпуса')
+    parser.add_argument('--data', help='Расшифровать один base64 payload вместо бенчмарка')
+    parser.add_argument('--signature', default='')
+    parser.add_argument('--timestamp', default='')
+    parser.add_argument('--nonce', default='')
+    args = parser.parse_args()
+
+    if args.data:
+        data_bytes = base64.b64decode(args.data)
+        keys = derive_candidate_keys(args.signature, args.timestamp, args.nonce)
+        for result in sweep_keys(data_bytes, keys, args.top):
+            mark = "✅" if result['json'] is not None else "❌"
+            print(f"{mark} {result['method']} (score {result['score']:.3f}): {result['text'][:100]}")
+        return
+
+    print("⏱️ AKOOL XOR Key Sweep Benchmark")
+    print("================================")
+    stats = benchmark(args.payloads, args.size, args.top, args.seed)
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+AKOOL Media Preflight
+Параллельная проверка URL фото и аудио до отправки задач в AKOOL
+
+validate_request_parameters проверял только схему URL, и битые/медленные
+ссылки на медиа обнаруживались только ошибкой 1015 - после полного
+запроса createbytalkingphoto, повторов и пауз backoff. MediaPreflight
+делает HEAD (при 403/405/501 или без Content-Type - GET с Range:
+bytes=0-0, тело не скачивается) и проверяет HTTP статус, тип содержимого
+(image/* для фото, audio/* для аудио; application/octet-stream - по
+расширению), размер (Content-Length или Content-Range) и время ответа.
+
+URL всех задач пакета проверяются одновременно в пуле потоков, одинаковые
+URL - один раз. Результаты хранятся в TTL кэше по URL и ETag:
+просроченная запись с ETag перепроверяется условным HEAD
+(If-None-Match), и 304 продлевает её без повторной проверки; неудачи
+кэшируются на меньший срок. Задачи с недоступными медиа отклоняются до
+отправки и не тратят запросы, квоту и время повторов.
+"""
+
+import argparse
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
+
+from akool_http import get_session
+from akool_metrics import get_registry
+
+KIND_IMAGE = 'image'
+KIND_AUDIO = 'audio'
+
+DEFAULT_TIMEOUT = 5.0
+DEFAULT_MAX_LATENCY = 3.0
+# Рекомендация поддержки AKOOL: файлы < 100MB
+DEFAULT_MAX_SIZE = 100 * 1024 * 1024
+DEFAULT_TTL = 600.0
+DEFAULT_NEGATIVE_TTL = 60.0
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_WORKERS = 16
+DEFAULT_CHUNK = 256
+
+_EXTENSIONS = {
+    KIND_IMAGE: ('.jpg', '.jpeg', '.png', '.webp'),
+    KIND_AUDIO: ('.mp3', '.wav', '.m4a', '.aac', '.ogg'),
+}
+# HEAD запрещён/не реализован (например, presigned URL S3 только для GET)
+_HEAD_FALLBACK_STATUSES = (403, 405, 501)
+
+
+class PreflightResult(NamedTuple):
+    """Итог проверки одного URL; problems пуст - медиа пригодно"""
+    url: str
+    kind: str
+    status: Optional[int]
+    content_type: Optional[str]
+    size: Optional[int]
+    latency: float
+    etag: Optional[str]
+    problems: Tuple[str, ...]
+    checked_at: float
+    cached: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return not self.problems
+
+
+def _size_from_headers(headers) -> Optional[int]:
+    content_range = headers.get('Content-Range')
+    if content_range and '/' in content_range:
+        total = content_range.rsplit('/', 1)[1].strip()
+        if total.isdigit():
+            return int(total)
+    length = headers.get('Content-Length')
+    return int(length) if length and length.isdigit() else None
+
+
+class MediaPreflight:
+    """Проверка доступности медиа по URL с TTL кэшем"""
+
+    def __init__(self, session=None, timeout: float = DEFAULT_TIMEOUT,
+                 max_latency: float = DEFAULT_MAX_LATENCY, max_size: int = DEFAULT_MAX_SIZE,
+                 ttl: float = DEFAULT_TTL, negative_ttl: float = DEFAULT_NEGATIVE_TTL,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, workers: int = DEFAULT_WORKERS):
+        self.session = session or get_session()
+        self.timeout = timeout
+        self.max_latency = max_latency
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.workers = workers
+        self.metrics = get_registry()
+        self._cache: 'OrderedDict[Tuple[str, str], PreflightResult]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------ Кэш
+
+    def _cached(self, url: str, kind: str) -> Optional[PreflightResult]:
+        with self._lock:
+            result = self._cache.get((url, kind))
+            if result is not None:
+                self._cache.move_to_end((url, kind))
+            return result
+
+    def _store(self, result: PreflightResult) -> None:
+        with self._lock:
+            self._cache[(result.url, result.kind)] = result
+            self._cache.move_to_end((result.url, result.kind))
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def _fresh(self, result: PreflightResult, now: float) -> bool:
+        return now - result.checked_at < (self.ttl if result.ok else self.negative_ttl)
+
+    # ------------------------------------------------------------ Проверка
+
+    def _request(self, method: str, url: str, headers: Dict[str, str]):
+        response = self.session.request(method, url, headers=headers, timeout=self.timeout,
+                                        allow_redirects=True, stream=True)
+        response.close()
+        return response
+
+    def _evaluate(self, url: str, kind: str, response, latency: float) -> PreflightResult:
+        problems = []
+        content_type = (response.headers.get('Content-Type') or '').split(';', 1)[0].strip().lower() or None
+        size = _size_from_headers(response.headers)
+
+        if response.status_code >= 400:
+            problems.append(f"HTTP {response.status_code}")
+        else:
+            path = urlsplit(url).path.lower()
+            if content_type is None or content_type == 'application/octet-stream':
+                if not path.endswith(_EXTENSIONS[kind]):
+                    problems.append(f"неизвестный тип содержимого ({content_type or 'нет Content-Type'})")
+            elif not content_type.startswith(f'{kind}/'):
+                problems.append(f"тип {content_type}, ожидается {kind}/*")
+            if size == 0:
+                problems.append("пустой файл")
+            elif size is not None and size > self.max_size:
+                problems.append(f"размер {size / 1024 / 1024:.1f} МБ больше {self.max_size / 1024 / 1024:.0f} МБ")
+        if latency > self.max_latency:
+            problems.append(f"медленный ответ {latency:.1f} с")
+
+        return PreflightResult(url, kind, response.status_code, content_type, size, latency,
+                               response.headers.get('ETag'), tuple(problems), time.time())
+
+    def _fetch(self, url: str, kind: str, previous: Optional[PreflightResult]) -> Tuple[PreflightResult, bool]:
+        """(результат, подтверждён ли кэш ответом 304)"""
+        headers = {}
+        if previous is not None and previous.ok and previous.etag:
+            headers['If-None-Match'] = previous.etag
+
+        start = time.perf_counter()
+        try:
+            response = self._request('HEAD', url, headers)
+            if response.status_code in _HEAD_FALLBACK_STATUSES or (
+                    response.status_code < 300 and not response.headers.get('Content-Type')):
+                response = self._request('GET', url, dict(headers, Range='bytes=0-0'))
+            if response.status_code == 304 and previous is not None:
+                return previous._replace(checked_at=time.time(), latency=time.perf_counter() - start), True
+        except Exception as e:
+            latency = time.perf_counter() - start
+            return PreflightResult(url, kind, None, None, None, latency, None,
+                                   (f"недоступен: {e.__class__.__name__}",), time.time()), False
+        return self._evaluate(url, kind, response, time.perf_counter() - start), False
+
+    def check(self, url: str, kind: str) -> PreflightResult:
+        """Проверка одного URL (с кэшем)"""
+        if not url or not url.startswith(('http://', 'https://')):
+            return PreflightResult(url, kind, None, None, None, 0.0, None,
+                                   ("URL должен начинаться с http:// или https://",), time.time())
+
+        previous = self._cached(url, kind)
+        if previous is not None and self._fresh(previous, time.time()):
+            self.metrics.incr('media_preflight_total', kind=kind, outcome='cached')
+            return previous._replace(cached=True)
+
+        result, revalidated = self._fetch(url, kind, previous)
+        self._store(result)
+        outcome = 'revalidated' if revalidated else 'ok' if result.ok else 'rejected'
+        self.metrics.incr('media_preflight_total', kind=kind, outcome=outcome)
+        return result
+
+    def check_many(self, items: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], PreflightResult]:
+        """Параллельная проверка пар (url, kind); одинаковые пары проверяются один раз"""
+        unique = list(dict.fromkeys(items))
+        if len(unique) <= 1:
+            return {item: self.check(*item) for item in unique}
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(unique)),
+                                thread_name_prefix='media-preflight') as pool:
+            return dict(zip(unique, pool.map(lambda item: self.check(*item), unique)))
+
+    def check_job(self, talking_photo_url: str, audio_url: str) -> List[PreflightResult]:
+        """Фото и аудио одной задачи (параллельно)"""
+        results = self.check_many([(talking_photo_url, KIND_IMAGE), (audio_url, KIND_AUDIO)])
+        return [results[(talking_photo_url, KIND_IMAGE)], results[(audio_url, KIND_AUDIO)]]
+
+    def iter_checked(self, jobs: Iterable[Any], chunk_size: int = DEFAULT_CHUNK) -> Iterator[Tuple[Any, List[str]]]:
+        """
+        (задача, проблемы) для потока задач: URL проверяются пачками по
+        chunk_size задач, поэтому итератор не материализуется целиком.
+        Задача - (talking_photo_url, audio_url) или dict с этими ключами.
+        """
+        chunk: List[Any] = []
+        jobs = iter(jobs)
+        while True:
+            for job in jobs:
+                chunk.append(job)
+                if len(chunk) >= chunk_size:
+                    break
+            if not chunk:
+                return
+            pairs = [_job_urls(job) for job in chunk]
+            results = self.check_many(item for photo, audio in pairs
+                                      for item in ((photo, KIND_IMAGE), (audio, KIND_AUDIO)))
+            for job, (photo, audio) in zip(chunk, pairs):
+                problems = [f"{label}: {problem}"
+                            for label, result in (('фото', results[(photo, KIND_IMAGE)]),
+                                                  ('аудио', results[(audio, KIND_AUDIO)]))
+                            for problem in result.problems]
+                yield job, problems
+            chunk = []
+
+
+def _job_urls(job: Any) -> Tuple[str, str]:
+    if isinstance(job, dict):
+        return job['talking_photo_url'], job['audio_url']
+    return job[0], job[1]
+
+
+_preflights: Dict[Any, MediaPreflight] = {}
+_preflights_lock = threading.Lock()
+
+
+def get_media_preflight(session=None) -> MediaPreflight:
+    """Общий (на процесс и сессию) экземпляр - кэш переживает отдельные пакеты"""
+    key = id(session)
+    with _preflights_lock:
+        preflight = _preflights.get(key)
+        if preflight is None:
+            preflight = MediaPreflight(session)
+            _preflights[key] = preflight
+        return preflight
+
+
+def benchmark(jobs: int = 200, latency: float = 0.05, workers: int = DEFAULT_WORKERS) -> Dict[str, Any]:
+    """
+    Локальный сервер медиа с задержкой: последовательная проверка против
+    параллельной, повтор из кэша и отбраковка плохих URL.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _reply(self):
+            time.sleep(latency)
+            name = self.path.rsplit('/', 1)[-1]
+            if name.startswith('missing'):
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+            elif self.command == 'HEAD' and name.startswith('nohead'):
+                self.send_response(405)
+                self.send_header('Content-Length', '0')
+            else:
+                content_type = {'jpg': 'image/jpeg', 'mp3': 'audio/mpeg', 'html': 'text/html'}[name.rsplit('.', 1)[1]]
+                etag = f'"{name}"'
+                body = b''
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                elif self.headers.get('Range'):
+                    body = b'\0'
+                    self.send_response(206)
+                    self.send_header('Content-Type', content_type)
+                    self.send_header('Content-Range', 'bytes 0-0/250000')
+                else:
+                    self.send_response(200)
+                    self.send_header('Content-Type', content_type)
+                self.send_header('ETag', etag)
+                # HEAD сообщает полный размер без тела
+                self.send_header('Content-Length', str(len(body)) if self.command == 'GET' else '250000')
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            self.end_headers()
+
+        do_HEAD = _reply
+        do_GET = _reply
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        def photo_url(i: int) -> str:
+            # Каждая 30-я задача - 404, HTML вместо фото и сервер без HEAD (последний пригоден)
+            if i % 30 == 0:
+                return f"{base}/missing{i}.jpg"
+            if i % 30 == 10:
+                return f"{base}/page{i}.html"
+            if i % 30 == 20:
+                return f"{base}/nohead{i}.jpg"
+            return f"{base}/photo{i}.jpg"
+
+        job_list = [(photo_url(i), f"{base}/audio{i}.mp3") for i in range(jobs)]
+
+        sequential = MediaPreflight(get_session(), workers=1)
+        start = time.perf_counter()
+        for photo, audio in job_list:
+            sequential.check(photo, KIND_IMAGE)
+            sequential.check(audio, KIND_AUDIO)
+        sequential_elapsed = time.perf_counter() - start
+
+        preflight = MediaPreflight(get_session(), workers=workers)
+        start = time.perf_counter()
+        checked = list(preflight.iter_checked(job_list))
+        concurrent_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        list(preflight.iter_checked(job_list))
+        cached_elapsed = time.perf_counter() - start
+
+        # Просроченный кэш с ETag -> условный HEAD, 304
+        preflight.ttl = 0.0
+        start = time.perf_counter()
+        list(preflight.iter_checked(job_list))
+        revalidate_elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    return {
+        'jobs': jobs,
+        'server_latency_ms': latency * 1000,
+        'sequential_s': sequential_elapsed,
+        'concurrent_s': concurrent_elapsed,
+        'cached_s': cached_elapsed,
+        'revalidate_s': revalidate_elapsed,
+        'rejected': sum(1 for _, problems in checked if problems),
+        'sample_problems': sorted({problems[0] for _, problems in checked if problems}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Проверка URL медиа перед отправкой в AKOOL')
+    parser.add_argument('urls', nargs='*', help='URL; тип по расширению или --kind')
+    parser.add_argument('--kind', choices=[KIND_IMAGE, KIND_AUDIO], help='Тип медиа для всех URL')
+    parser.add_argument('--jobs', help='Файл задач "photo_url audio_url"')
+    parser.add_argument('--max-latency', type=float, default=DEFAULT_MAX_LATENCY, help='Порог времени ответа, сек')
+    parser.add_argument('--benchmark', type=int, metavar='JOBS', help='Бенчмарк на локальном сервере')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        print("🩺 AKOOL Media Preflight")
+        print("========================")
+        print(json.dumps(benchmark(args.benchmark), indent=2, ensure_ascii=False))
+        return
+
+    preflight = MediaPreflight(max_latency=args.max_latency)
+    failed = 0
+    if args.jobs:
+        from akool_batch_submit import split_job_line
+        with open(args.jobs, 'r', encoding='utf-8') as f:
+            jobs = (split_job_line(line) for line in f if line.strip() and not line.startswith('#'))
+            for job, problems in preflight.iter_checked(jobs):
+                if problems:
+                    failed += 1
+                    print(f"❌ {job[0]} {job[1]}: {'; '.join(problems)}")
+        print(f"📊 Отклонено задач: {failed}")
+    else:
+        items = []
+        for url in args.urls:
+            kind = args.kind or (KIND_AUDIO if urlsplit(url).path.lower().endswith(_EXTENSIONS[KIND_AUDIO]) else KIND_IMAGE)
+            items.append((url, kind))
+        for (url, kind), result in preflight.check_many(items).items():
+            failed += not result.ok
+            mark = '✅' if result.ok else '❌'
+            print(f"{mark} [{kind}] {url}: HTTP {result.status}, {result.content_type}, {result.size} байт, "
+                  f"{result.latency * 1000:.0f} мс {'; '.join(result.problems)}")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+AKOOL / ElevenLabs Metrics
+Гистограммы латентности и счётчики по endpoint для клиентов AKOOL и ElevenLabs
+
+LatencyHistogram - log-linear гистограмма в стиле HDR: значения в
+микросекундах раскладываются по корзинам с относительной точностью ~6%
+(16 под-корзин на каждую степень двойки), индекс корзины считается через
+int.bit_length без логарифмов. Запись одного значения - несколько
+целочисленных операций под локом, порядка микросекунды.
+
+Счётчики ключуются по имени и набору меток (endpoint, HTTP статус, код
+AKOOL, статус видео). Сессии из akool_http инструментируются response
+hook'ом, поэтому латентность каждого запроса записывается автоматически;
+коды ответов AKOOL и статусы видео клиенты добавляют сами.
+
+Экспорт: текстовый формат Prometheus и JSON снимок; start_metrics_server()
+отдаёт их по HTTP (/metrics и /metrics.json).
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+# 2^SUB_BITS значений в первой (точной) области, далее 2^(SUB_BITS-1) корзин на октаву
+SUB_BITS = 5
+HALF = 1 << (SUB_BITS - 1)
+# Верхняя граница: ~1.2 часа в микросекундах
+MAX_VALUE_US = (1 << 32) - 1
+
+# Границы le для экспорта в Prometheus, секунды
+PROMETHEUS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Нормализация пути запроса в шаблон endpoint (id не раздувают число серий)
+ENDPOINT_PATTERNS = [
+    (re.compile(r'/getToken$'), '/getToken'),
+    (re.compile(r'/user/info$'), '/user/info'),
+    (re.compile(r'/content/video/createbytalkingphoto$'), '/content/video/createbytalkingphoto'),
+    (re.compile(r'/content/video/getvideostatus$'), '/content/video/getvideostatus'),
+    (re.compile(r'/voices/add$'), '/voices/add'),
+    (re.compile(r'/voices/[^/]+$'), '/voices/{voice_id}'),
+    (re.compile(r'/voices$'), '/voices'),
+    (re.compile(r'/text-to-speech/[^/]+/stream$'), '/text-to-speech/{voice_id}/stream'),
+    (re.compile(r'/text-to-speech/[^/]+$'), '/text-to-speech/{voice_id}'),
+]
+
+
+def bucket_index(value_us: int) -> int:
+    """Индекс корзины для значения в микросекундах"""
+    if value_us < (1 << SUB_BITS):
+        return value_us if value_us > 0 else 0
+    shift = value_us.bit_length() - SUB_BITS
+    return (shift << (SUB_BITS - 1)) + (value_us >> shift)
+
+
+def bucket_bounds(index: int) -> Tuple[int, int]:
+    """[нижняя, верхняя] граница корзины в микросекундах"""
+    if index < (1 << SUB_BITS):
+        return index, index
+    shift = (index >> (SUB_BITS - 1)) - 1
+    mantissa = index - (shift << (SUB_BITS - 1))
+    return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    """Log-linear гистограмма латентности (микросекунды)"""
+
+    __slots__ = ('counts', 'count', 'total_us', 'min_us', 'max_us', '_lock')
+
+    def __init__(self):
+        self.counts = [0] * (bucket_index(MAX_VALUE_US) + 1)
+        self.count = 0
+        self.total_us = 0
+        self.min_us = 0
+        self.max_us = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        value = int(seconds * 1_000_000)
+        if value < 0:
+            value = 0
+        elif value > MAX_VALUE_US:
+            value = MAX_VALUE_US
+        index = bucket_index(value)
+        with self._lock:
+            self.counts[index] += 1
+            if self.count == 0 or value < self.min_us:
+                self.min_us = value
+            if value > self.max_us:
+                self.max_us = value
+            self.count += 1
+            self.total_us += value
+
+    def percentile(self, fraction: float) -> float:
+        """Значение перцентиля в секундах (середина корзины)"""
+        if self.count == 0:
+            return 0.0
+        target = max(1, int(round(fraction * self.count)))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if not bucket_count:
+                continue
+            seen += bucket_count
+            if seen >= target:
+                low, high = bucket_bounds(index)
+                return min(max((low + high) / 2, self.min_us), self.max_us) / 1_000_000
+        return self.max_us / 1_000_000
+
+    def cumulative(self, bounds_seconds=PROMETHEUS_BUCKETS) -> List[int]:
+        """Накопленные счётчики для границ le (по верхней границе корзины)"""
+        result = []
+        limits = [int(bound * 1_000_000) for bound in bounds_seconds]
+        position = 0
+        seen = 0
+        for limit in limits:
+            while position < len(self.counts) and bucket_bounds(position)[1] <= limit:
+                seen += self.counts[position]
+                position += 1
+            result.append(seen)
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'sum_seconds': self.total_us / 1_000_000,
+            'min_seconds': self.min_us / 1_000_000,
+            'max_seconds': self.max_us / 1_000_000,
+            'p50_seconds': self.percentile(0.50),
+            'p90_seconds': self.percentile(0.90),
+            'p99_seconds': self.percentile(0.99),
+        }
+
+
+def normalize_endpoint(path: str) -> str:
+    for pattern, name in ENDPOINT_PATTERNS:
+        if pattern.search(path):
+            return name
+    return 'other'
+
+
+def _labels_text(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ''
+    escaped = (f'{key}="{value}"'.replace('\n', ' ') for key, value in labels)
+    return '{' + ','.join(escaped) + '}'
+
+
+class MetricsRegistry:
+    """Гистограммы по endpoint и счётчики с метками"""
+
+    def __init__(self, namespace: str = 'airshorts'):
+        self.namespace = namespace
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], int] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, endpoint: str) -> LatencyHistogram:
+        histogram = self.histograms.get(endpoint)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(endpoint, LatencyHistogram())
+        return histogram
+
+    def incr(self, name: str, value: int = 1, **labels: Any) -> None:
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, endpoint: str, seconds: float, http_status: Optional[int] = None) -> None:
+        """Латентность запроса + счётчик запросов по HTTP статусу"""
+        self.histogram(endpoint).record(seconds)
+        self.incr('http_requests_total', endpoint=endpoint, http_status=http_status or 'error')
+
+    def count_code(self, endpoint: str, code: Any) -> None:
+        """Код ответа AKOOL (1000, 1015, ...)"""
+        self.incr('akool_response_codes_total', endpoint=endpoint, code=code)
+
+    def count_video_status(self, status: Any) -> None:
+        """Статус видео из getvideostatus/webhook (1-4)"""
+        self.incr('akool_video_status_total', status=status)
+
+    def timer(self, endpoint: str) -> '_Timer':
+        """Ручной замер: with registry.timer('/voices/add') as t: ...; t.http_status = 200"""
+        return _Timer(self, endpoint)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = list(self.counters.items())
+            histograms = list(self.histograms.items())
+        return {
+            'timestamp': time.time(),
+            'latency': {endpoint: histogram.snapshot() for endpoint, histogram in histograms},
+            'counters': [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(counters)
+            ],
+        }
+
+    def prometheus_text(self) -> str:
+        """Текстовый формат экспозиции Prometheus"""
+        prefix = self.namespace
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items())
+
+        metric = f'{prefix}_request_duration_seconds'
+        lines.append(f'# HELP {metric} Латентность HTTP запросов по endpoint')
+        lines.append(f'# TYPE {metric} histogram')
+        for endpoint, histogram in histograms:
+            labels = (('endpoint', endpoint),)
+            for bound, value in zip(PROMETHEUS_BUCKETS, histogram.cumulative()):
+                lines.append(f'{metric}_bucket{_labels_text(labels + (("le", repr(bound)),))} {value}')
+            lines.append(f'{metric}_bucket{_labels_text(labels + (("le", "+Inf"),))} {histogram.count}')
+            lines.append(f'{metric}_sum{_labels_text(labels)} {histogram.total_us / 1_000_000}')
+            lines.append(f'{metric}_count{_labels_text(labels)} {histogram.count}')
+
+        declared = set()
+        for (name, labels), value in counters:
+            full_name = f'{prefix}_{name}'
+            if full_name not in declared:
+                lines.append(f'# TYPE {full_name} counter')
+                declared.add(full_name)
+            lines.append(f'{full_name}{_labels_text(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str) -> None:
+        """Снимок в файл: .json - JSON, иначе текст Prometheus"""
+        with open(path, 'w', encoding='utf-8') as f:
+            if path.endswith('.json'):
+                json.dump(self.snapshot(), f, indent=2, ensure_ascii=False)
+            else:
+                f.write(self.prometheus_text())
+
+
+class _Timer:
+    __slots__ = ('registry', 'endpoint', 'http_status', '_start')
+
+    def __init__(self, registry: MetricsRegistry, endpoint: str):
+        self.registry = registry
+        self.endpoint = endpoint
+        self.http_status: Optional[int] = None
+
+    def __enter__(self) -> '_Timer':
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.registry.observe(self.endpoint, time.perf_counter() - self._start, self.http_status)
+
+
+_registry = MetricsRegistry()
+
+
+def get_registry() -> MetricsRegistry:
+    """Общий реестр процесса"""
+    return _registry
+
+
+def instrument_session(session, registry: Optional[MetricsRegistry] = None):
+    """
+    Запись латентности каждого запроса сессии.
+
+    requests: response hook и response.elapsed (до получения заголовков,
+    для /stream это время до первого байта). httpx: event hooks на запрос
+    и ответ. Повторный вызов для той же сессии ничего не делает.
+    """
+    registry = registry or _registry
+    if getattr(session, '_akool_metrics', None) is registry:
+        return session
+
+    if hasattr(session, 'event_hooks'):
+        def on_request(request):
+            request.extensions['akool_metrics_start'] = time.perf_counter()
+
+        def on_response(response):
+            start = response.request.extensions.get('akool_metrics_start')
+            if start is not None:
+                registry.observe(normalize_endpoint(response.request.url.path),
+                                 time.perf_counter() - start, response.status_code)
+
+        session.event_hooks['request'].append(on_request)
+        session.event_hooks['response'].append(on_response)
+    else:
+        def on_response(response, *args, **kwargs):
+            path = response.request.path_url.split('?', 1)[0]
+            registry.observe(normalize_endpoint(path), response.elapsed.total_seconds(), response.status_code)
+
+        session.hooks['response'].append(on_response)
+
+    session._akool_metrics = registry
+    return session
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = _registry
+
+    def do_GET(self):
+        if self.path.startswith('/metrics.json'):
+            body = json.dumps(self.registry.snapshot(), ensure_ascii=False).encode('utf-8')
+            content_type = 'application/json'
+        elif self.path.startswith('/metrics'):
+            body = self.registry.prometheus_text().encode('utf-8')
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int, host: str = '127.0.0.1',
+                         registry: Optional[MetricsRegistry] = None) -> ThreadingHTTPServer:
+    """HTTP endpoint /metrics (Prometheus) и /metrics.json в фоновом потоке"""
+    handler = type('MetricsHandler', (_MetricsHandler,), {'registry': registry or _registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name='akool-metrics', daemon=True).start()
+    return server
+
+
+def benchmark(samples: int = 200_000) -> Dict[str, float]:
+    """Стоимость записи одного значения"""
+    registry = MetricsRegistry()
+    histogram = registry.histogram('/bench')
+    values = [(i % 5000) / 1000.0 for i in range(samples)]
+
+    start = time.perf_counter()
+    for value in values:
+        histogram.record(value)
+    record_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for value in values:
+        registry.observe('/bench', value, 200)
+    observe_elapsed = time.perf_counter() - start
+
+    # Точность: сравнение перцентилей с точными значениями
+    exact = sorted(values)
+    errors = []
+    for fraction in (0.5, 0.9, 0.99):
+        expected = exact[int(fraction * (len(exact) - 1))]
+        errors.append(abs(histogram.percentile(fraction) - expected) / expected)
+
+    return {
+        'samples': samples,
+        'record_us': record_elapsed / samples * 1e6,
+        'observe_us': observe_elapsed / samples * 1e6,
+        'max_percentile_error': max(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Метрики клиентов AKOOL и ElevenLabs')
+    parser.add_argument('--benchmark', type=int, metavar='N', default=200_000, help='Замер стоимости записи на N значениях')
+    args = parser.parse_args()
+
+    print("⏱️ Metrics Recording Benchmark")
+    print("==============================")
+    print(json.dumps(benchmark(args.benchmark), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+AKOOL Video Status Poller
+Asyncio опрос /content/video/getvideostatus для тысяч task_id в одном event loop
+
+Все задачи живут в одной куче (heapq) по времени следующего опроса; один
+планировщик забирает "созревшие" задачи, берёт токен из общего бюджета
+запросов и запускает проверку. Интервал подстраивается под статус AKOOL:
+1 (в очереди) - редкие опросы, 2 (обработка) - интервал растёт, 3/4 -
+задача завершается и её future разрешается.
+
+Если задачи создаются с webhookUrl, статус приходит webhook'ом (resolve):
+future разрешается сразу, запланированные опросы отменяются. С
+webhook_timeout опрос становится запасным путём - первая проверка только
+когда webhook просрочен, дальше не чаще fallback_interval.
+"""
+
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+# Статусы видео AKOOL
+STATUS_QUEUED = 1
+STATUS_PROCESSING = 2
+STATUS_COMPLETED = 3
+STATUS_FAILED = 4
+
+# Итог отслеживания задачи
+OUTCOME_COMPLETED = 'completed'
+OUTCOME_FAILED = 'failed'
+OUTCOME_EXHAUSTED = 'exhausted'
+
+# Откуда пришёл итоговый статус
+SOURCE_POLL = 'poll'
+SOURCE_WEBHOOK = 'webhook'
+
+
+class StatusCheckError(Exception):
+    """Ошибка ответа getvideostatus"""
+
+    def __init__(self, message: str, code: Any = None):
+        super().__init__(message)
+        self.code = code
+
+
+class RateBudget:
+    """Общий token bucket: не более rate запросов в секунду (с burst)"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        while True:
+            self._refill()
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return
+            await asyncio.sleep((1.0 - self._tokens) / self.rate)
+
+
+class _TrackedTask:
+    __slots__ = ('task_id', 'future', 'attempts', 'interval', 'status', 'data', 'due_at', 'source')
+
+    def __init__(self, task_id: str, future: asyncio.Future, interval: float):
+        self.task_id = task_id
+        self.future = future
+        self.attempts = 0
+        self.interval = interval
+        self.status: Optional[int] = None
+        self.data: Dict[str, Any] = {}
+        # Время актуальной записи в куче; остальные записи задачи - отменённые опросы
+        self.due_at = 0.0
+        self.source = SOURCE_POLL
+
+
+class VideoStatusPoller:
+    """
+    Опрос статусов множества задач в одном event loop.
+
+    fetch_status(task_id) - корутина, возвращающая поле data ответа
+    getvideostatus или бросающая исключение. webhook_timeout - сколько
+    ждать webhook до первого опроса (None - опрашивать сразу).
+    """
+
+    def __init__(self, fetch_status: Callable[[str], Awaitable[Dict[str, Any]]],
+                 rate: float = 10.0, burst: Optional[float] = None,
+                 base_interval: float = 5.0, max_interval: float = 60.0,
+                 queued_interval: Optional[float] = None, backoff: float = 1.5,
+                 jitter: float = 0.2, max_attempts: Optional[int] = None,
+                 max_concurrency: int = 64, webhook_timeout: Optional[float] = None,
+                 fallback_interval: Optional[float] = None,
+                 on_update: Optional[Callable[[str, Optional[int], Dict[str, Any], int], None]] = None):
+        self.fetch_status = fetch_status
+        self.budget = RateBudget(rate, burst)
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self.queued_interval = queued_interval if queued_interval is not None else base_interval * 2
+        self.backoff = backoff
+        self.jitter = jitter
+        self.max_attempts = max_attempts
+        self.webhook_timeout = webhook_timeout
+        self.fallback_interval = fallback_interval if fallback_interval is not None else max_interval
+        self.on_update = on_update
+        # Запросов getvideostatus и статусов, пришедших webhook'ом
+        self.polls = 0
+        self.webhook_updates = 0
+
+        self._tasks: Dict[str, _TrackedTask] = {}
+        self._heap: List = []
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._runner: Optional[asyncio.Task] = None
+        self._inflight: set = set()
+
+    def _jittered(self, interval: float) -> float:
+        if not self.jitter:
+            return interval
+        return interval * random.uniform(1.0 - self.jitter, 1.0 + self.jitter)
+
+    def _schedule(self, tracked: _TrackedTask, delay: float) -> None:
+        tracked.due_at = time.monotonic() + delay
+        heapq.heappush(self._heap, (tracked.due_at, next(self._seq), tracked.task_id))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def track(self, task_id: str, callback: Optional[Callable[[asyncio.Future], None]] = None,
+              delay: float = 0.0) -> asyncio.Future:
+        """Начать отслеживание task_id; future разрешается итоговым результатом"""
+        tracked = self._tasks.get(task_id)
+        if tracked is None:
+            future = asyncio.get_running_loop().create_future()
+            tracked = _TrackedTask(task_id, future, self.base_interval)
+            self._tasks[task_id] = tracked
+            if self.webhook_timeout is not None:
+                delay += self.webhook_timeout
+            self._schedule(tracked, delay)
+        if callback is not None:
+            tracked.future.add_done_callback(callback)
+        self._ensure_running()
+        return tracked.future
+
+    def pending(self) -> int:
+        """Количество незавершённых задач"""
+        return len(self._tasks)
+
+    def is_tracked(self, task_id: str) -> bool:
+        return task_id in self._tasks
+
+    def _finish(self, tracked: _TrackedTask, outcome: str) -> None:
+        self._tasks.pop(tracked.task_id, None)
+        if not tracked.future.done():
+            tracked.future.set_result({
+                'task_id': tracked.task_id,
+                'outcome': outcome,
+                'status': tracked.status,
+                'video_url': tracked.data.get('video_url') or tracked.data.get('url'),
+                'attempts': tracked.attempts,
+                'source': tracked.source,
+                'data': tracked.data,
+            })
+
+    def resolve(self, task_id: str, status: Optional[int], data: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Статус, пришедший webhook'ом. 3/4 разрешают future, запланированные
+        опросы отменяются; 1/2 откладывают запасной опрос ещё на
+        webhook_timeout. False - задача не отслеживается.
+        """
+        tracked = self._tasks.get(task_id)
+        if tracked is None or tracked.future.done():
+            return False
+        data = data or {}
+        status = int(status) if status not in (None, '') else None
+        self.webhook_updates += 1
+        if self.on_update is not None:
+            self.on_update(task_id, status, data, tracked.attempts)
+
+        tracked.source = SOURCE_WEBHOOK
+        if status in (STATUS_COMPLETED, STATUS_FAILED):
+            tracked.status, tracked.data = status, data
+            # Записи в куче станут устаревшими - планировщик их пропустит
+            self._finish(tracked, OUTCOME_COMPLETED if status == STATUS_COMPLETED else OUTCOME_FAILED)
+            if self._wakeup is not None:
+                self._wakeup.set()
+            return True
+
+        if status is not None:
+            tracked.status, tracked.data = status, data
+        self._schedule(tracked, self._jittered(self.webhook_timeout or self.fallback_interval))
+        return True
+
+    def _next_interval(self, tracked: _TrackedTask, status: Optional[int]) -> float:
+        if self.webhook_timeout is not None:
+            # Webhook просрочен - опрос только как редкая страховка
+            return self.fallback_interval
+        if status == STATUS_QUEUED:
+            return self.queued_interval
+        if status == STATUS_PROCESSING and tracked.status == STATUS_PROCESSING:
+            # Долгий рендер - опрашиваем всё реже
+            return min(tracked.interval * self.backoff, self.max_interval)
+        return self.base_interval
+
+    async def _check(self, tracked: _TrackedTask) -> None:
+        async with self._semaphore:
+            if tracked.future.done():
+                return
+            tracked.attempts += 1
+            self.polls += 1
+            try:
+                data = await self.fetch_status(tracked.task_id)
+                status = data.get('status')
+                status = int(status) if status not in (None, '') else None
+            except Exception as e:
+                data, status = {'error': str(e)}, None
+
+        if tracked.future.done():
+            return
+        tracked.source = SOURCE_POLL
+
+        if self.on_update is not None:
+            self.on_update(tracked.task_id, status, data, tracked.attempts)
+
+        if status == STATUS_COMPLETED:
+            tracked.status, tracked.data = status, data
+            self._finish(tracked, OUTCOME_COMPLETED)
+            return
+        if status == STATUS_FAILED:
+            tracked.status, tracked.data = status, data
+            self._finish(tracked, OUTCOME_FAILED)
+            return
+
+        if status is None:
+            # Ошибка запроса или неизвестный ответ - экспоненциальная пауза
+            tracked.interval = min(max(tracked.interval * self.backoff, self._next_interval(tracked, None)),
+                                   max(self.max_interval, self.fallback_interval))
+            tracked.data = data
+        else:
+            tracked.interval = self._next_interval(tracked, status)
+            tracked.status, tracked.data = status, data
+
+        if self.max_attempts is not None and tracked.attempts >= self.max_attempts:
+            self._finish(tracked, OUTCOME_EXHAUSTED)
+            return
+        self._schedule(tracked, self._jittered(tracked.interval))
+
+    def _ensure_running(self) -> None:
+        if self._runner is None or self._runner.done():
+            self._wakeup = asyncio.Event()
+            self._runner = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        """Планировщик: забирает созревшие задачи из кучи"""
+        while self._tasks or self._inflight:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            due_at, _, task_id = self._heap[0]
+            delay = due_at - time.monotonic()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            tracked = self._tasks.get(task_id)
+            if tracked is None or tracked.future.done() or tracked.due_at != due_at:
+                continue
+
+            await self.budget.acquire()
+            check = asyncio.ensure_future(self._check(tracked))
+            self._inflight.add(check)
+            check.add_done_callback(self._check_done)
+
+    def _check_done(self, check: asyncio.Task) -> None:
+        self._inflight.discard(check)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def wait_all(self, task_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Отследить набор задач и дождаться итогов по всем"""
+        futures = {task_id: self.track(task_id) for task_id in task_ids}
+        await asyncio.gather(*futures.values())
+        return {task_id: future.result() for task_id, future in futures.items()}
+
+    async def close(self) -> None:
+        """Остановка планировщика; незавершённые future отменяются"""
+        for tracked in list(self._tasks.values()):
+            tracked.future.cancel()
+        self._tasks.clear()
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+        for check in list(self._inflight):
+            check.cancel()
+
+
+def http_status_fetcher(session, base_url: str, access_token: str,
+                        executor: Optional[ThreadPoolExecutor] = None,
+                        timeout: float = 10) -> Callable[[str], Awaitable[Dict[str, Any]]]:
+    """
+    fetch_status поверх синхронной сессии из akool_http.
+
+    Блокирующий запрос выполняется в пуле потоков, число одновременных
+    запросов ограничивает сам поллер (max_concurrency).
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+    url = f"{base_url}/content/video/getvideostatus"
+
+    def fetch(task_id: str) -> Dict[str, Any]:
+        response = session.get(url, params={'task_id': task_id}, headers=headers, timeout=timeout)
+        if response.status_code != 200:
+            raise StatusCheckError(f"HTTP ошибка: {response.status_code}", response.status_code)
+        data = response.json()
+        code = str(data.get('code', ''))
+        if code != "1000":
+            raise StatusCheckError(f"Код: {code}. {data.get('msg', '')}", code)
+        return data.get('data') or {}
+
+    async def fetch_status(task_id: str) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, fetch, task_id)
+
+    return fetch_status
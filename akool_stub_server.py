@@ -0,0 +1,539 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+AKOOL + ElevenLabs Stub Server
+Локальная замена AKOOL и ElevenLabs API для офлайн нагрузочных прогонов
+
+Один asyncio сервер (HTTP/1.1 с keep-alive, без внешних зависимостей)
+отвечает на:
+  AKOOL      /api/open/v3/getToken, /user/info,
+             /content/video/createbytalkingphoto, /content/video/getvideostatus
+  ElevenLabs /v1/voices, /v1/voices/{id}, /v1/voices/add,
+             /v1/text-to-speech/{id}, /v1/text-to-speech/{id}/stream
+
+Задержка ответа, время рендера и доставки webhook задаются распределениями
+(LatencyModel), ошибка 1015 и неудачный рендер - вероятностями. Статус
+задачи вычисляется по времени, а не отдельной корутиной на задачу, поэтому
+тысячи одновременных задач почти ничего не стоят. По завершении рендера
+на webhookUrl отправляется зашифрованный callback в формате AKOOL.
+
+Клиенты направляются на сервер через AKOOL_BASE_URL / ELEVENLABS_BASE_URL
+или флаги --akool-base-url / --elevenlabs-base-url.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import math
+import random
+import re
+import ssl
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, AsyncIterator, Dict, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlsplit
+
+from akool_webhook import DEFAULT_CLIENT_ID, DEFAULT_CLIENT_SECRET, compute_signature, get_cipher
+
+AKOOL_PREFIX = '/api/open/v3'
+ELEVENLABS_PREFIX = '/v1'
+
+CODE_OK = 1000
+CODE_THROTTLED = 1015
+CODE_UNAUTHORIZED = 1101
+
+STATUS_QUEUED = 1
+STATUS_PROCESSING = 2
+STATUS_COMPLETED = 3
+STATUS_FAILED = 4
+
+# Заготовка MP3 кадра для синтетической озвучки
+_MP3_FRAME = b'\xff\xfb\x90\x64' + bytes(413)
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 401: 'Unauthorized', 404: 'Not Found',
+            405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+class LatencyModel:
+    """
+    Распределение задержки в секундах из строки:
+    '0.05' / 'fixed:0.05', 'uniform:0.01,0.1', 'exp:0.05' (среднее),
+    'lognormal:0.05,0.5' (медиана, сигма).
+    """
+
+    def __init__(self, spec: Union[str, float] = '0'):
+        self.spec = str(spec)
+        kind, _, args = self.spec.partition(':')
+        if not args:
+            kind, args = 'fixed', kind
+        self.kind = kind
+        self.args = [float(value) for value in args.split(',') if value]
+        if kind not in ('fixed', 'uniform', 'exp', 'lognormal'):
+            raise ValueError(f"Неизвестное распределение: {self.spec}")
+
+    def sample(self, rnd: random.Random) -> float:
+        if self.kind == 'fixed':
+            return self.args[0]
+        if self.kind == 'uniform':
+            return rnd.uniform(self.args[0], self.args[1])
+        if self.kind == 'exp':
+            return rnd.expovariate(1.0 / self.args[0]) if self.args[0] > 0 else 0.0
+        return rnd.lognormvariate(math.log(self.args[0]), self.args[1])
+
+
+class StubRequest:
+    __slots__ = ('method', 'path', 'query', 'headers', 'body')
+
+    def __init__(self, method: str, path: str, query: Dict[str, str], headers: Dict[str, str], body: bytes):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+
+    def json(self) -> Dict[str, Any]:
+        try:
+            return json.loads(self.body or b'{}')
+        except ValueError:
+            return {}
+
+
+class _Job:
+    __slots__ = ('task_id', 'video_id', 'created_at', 'queue_time', 'render_time', 'fails', 'webhook_url')
+
+    def __init__(self, task_id: str, video_id: str, created_at: float, queue_time: float,
+                 render_time: float, fails: bool, webhook_url: Optional[str]):
+        self.task_id = task_id
+        self.video_id = video_id
+        self.created_at = created_at
+        self.queue_time = queue_time
+        self.render_time = render_time
+        self.fails = fails
+        self.webhook_url = webhook_url
+
+    def status(self, now: float) -> int:
+        elapsed = now - self.created_at
+        if elapsed < self.queue_time:
+            return STATUS_QUEUED
+        if elapsed < self.queue_time + self.render_time:
+            return STATUS_PROCESSING
+        return STATUS_FAILED if self.fails else STATUS_COMPLETED
+
+    @property
+    def done_after(self) -> float:
+        return self.queue_time + self.render_time
+
+
+class StubServer:
+    """Stub AKOOL и ElevenLabs"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0,
+                 latency: str = '0', render_time: str = 'uniform:5,15', queue_time: str = '0',
+                 webhook_delay: str = '0', error_rate: float = 0.0, failure_rate: float = 0.0,
+                 client_id: str = DEFAULT_CLIENT_ID, client_secret: str = DEFAULT_CLIENT_SECRET,
+                 token_ttl: float = 3600, tts_bytes_per_char: int = 1000,
+                 tts_chunk_size: int = 4096, tts_chunk_delay: float = 0.0,
+                 max_webhooks_in_flight: int = 256, seed: Optional[int] = None,
+                 route_latency: Optional[Dict[str, str]] = None):
+        self.host = host
+        self.port = port
+        self.latency = LatencyModel(latency)
+        self.route_latency = {route: LatencyModel(spec) for route, spec in (route_latency or {}).items()}
+        self.render_time = LatencyModel(render_time)
+        self.queue_time = LatencyModel(queue_time)
+        self.webhook_delay = LatencyModel(webhook_delay)
+        self.error_rate = error_rate
+        self.failure_rate = failure_rate
+        self.client_id = client_id
+        self.cipher = get_cipher(client_id, client_secret)
+        self.token_ttl = token_ttl
+        self.tts_bytes_per_char = tts_bytes_per_char
+        self.tts_chunk_size = tts_chunk_size
+        self.tts_chunk_delay = tts_chunk_delay
+        self.random = random.Random(seed)
+
+        self.jobs: Dict[str, _Job] = {}
+        self.voices: Dict[str, str] = {}
+        self.stats: Counter = Counter()
+        self._webhook_slots: Optional[asyncio.Semaphore] = None
+        self._max_webhooks_in_flight = max_webhooks_in_flight
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._connections: set = set()
+
+        self._routes = [
+            ('POST', re.compile(f'^{AKOOL_PREFIX}/getToken$'), 'akool_token', self._get_token),
+            ('GET', re.compile(f'^{AKOOL_PREFIX}/user/info$'), 'akool_user_info', self._user_info),
+            ('POST', re.compile(f'^{AKOOL_PREFIX}/content/video/createbytalkingphoto$'),
+             'akool_create', self._create_talking_photo),
+            ('GET', re.compile(f'^{AKOOL_PREFIX}/content/video/getvideostatus$'),
+             'akool_status', self._video_status),
+            ('GET', re.compile(f'^{ELEVENLABS_PREFIX}/voices$'), 'el_voices', self._list_voices),
+            ('POST', re.compile(f'^{ELEVENLABS_PREFIX}/voices/add$'), 'el_voice_add', self._add_voice),
+            ('GET', re.compile(f'^{ELEVENLABS_PREFIX}/voices/([^/]+)$'), 'el_voice_get', self._get_voice),
+            ('DELETE', re.compile(f'^{ELEVENLABS_PREFIX}/voices/([^/]+)$'), 'el_voice_delete', self._delete_voice),
+            ('POST', re.compile(f'^{ELEVENLABS_PREFIX}/text-to-speech/([^/]+)/stream$'),
+             'el_tts_stream', self._tts_stream),
+            ('POST', re.compile(f'^{ELEVENLABS_PREFIX}/text-to-speech/([^/]+)$'), 'el_tts', self._tts),
+        ]
+
+    # ------------------------------------------------------------ URL
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def akool_base_url(self) -> str:
+        return self.base_url + AKOOL_PREFIX
+
+    @property
+    def elevenlabs_base_url(self) -> str:
+        return self.base_url + ELEVENLABS_PREFIX
+
+    # ------------------------------------------------------------ AKOOL
+
+    def _make_token(self) -> str:
+        def encode(data: Dict[str, Any]) -> str:
+            return base64.urlsafe_b64encode(json.dumps(data).encode('utf-8')).decode('ascii').rstrip('=')
+        payload = {'sub': self.client_id, 'exp': int(time.time() + self.token_ttl)}
+        return f"{encode({'alg': 'none', 'typ': 'JWT'})}.{encode(payload)}.stub"
+
+    def _authorized(self, request: StubRequest) -> bool:
+        return request.headers.get('authorization', '').startswith('Bearer ')
+
+    async def _get_token(self, request: StubRequest, match) -> Tuple[int, Any]:
+        body = request.json()
+        if body.get('clientId') != self.client_id:
+            return 200, {'code': CODE_UNAUTHORIZED, 'msg': 'invalid clientId'}
+        return 200, {'code': CODE_OK, 'token': self._make_token()}
+
+    async def _user_info(self, request: StubRequest, match) -> Tuple[int, Any]:
+        if not self._authorized(request):
+            return 200, {'code': CODE_UNAUTHORIZED, 'msg': 'invalid authorization'}
+        return 200, {'code': CODE_OK, 'data': {'remaining_quota': 1_000_000, 'total_quota': 1_000_000}}
+
+    async def _create_talking_photo(self, request: StubRequest, match) -> Tuple[int, Any]:
+        if not self._authorized(request):
+            return 200, {'code': CODE_UNAUTHORIZED, 'msg': 'invalid authorization'}
+        body = request.json()
+        if not body.get('talking_photo_url') or not body.get('audio_url'):
+            return 200, {'code': 1003, 'msg': 'talking_photo_url and audio_url are required'}
+        if self.random.random() < self.error_rate:
+            self.stats['throttled'] += 1
+            return 200, {'code': CODE_THROTTLED, 'msg': 'create video error, please try again later'}
+
+        now = time.time()
+        job = _Job(uuid.uuid4().hex, uuid.uuid4().hex[:24], now,
+                   self.queue_time.sample(self.random), self.render_time.sample(self.random),
+                   self.random.random() < self.failure_rate, body.get('webhookUrl'))
+        self.jobs[job.task_id] = job
+        self.stats['jobs'] += 1
+        if job.webhook_url:
+            delay = job.done_after + self.webhook_delay.sample(self.random)
+            self._loop.call_later(delay, lambda: asyncio.ensure_future(self._deliver_webhook(job)))
+        return 200, {'code': CODE_OK, 'msg': 'OK', 'data': {
+            '_id': job.video_id, 'task_id': job.task_id, 'video_status': STATUS_QUEUED,
+            'video': '', 'type': 'talking photo'
+        }}
+
+    def _job_result(self, job: _Job, status: int) -> Dict[str, Any]:
+        result = {'_id': job.video_id, 'task_id': job.task_id, 'status': status, 'type': 'talking photo'}
+        if status == STATUS_COMPLETED:
+            result['video_url'] = result['url'] = f"{self.base_url}/videos/{job.video_id}.mp4"
+            result['deduction_credit'] = 30
+        return result
+
+    async def _video_status(self, request: StubRequest, match) -> Tuple[int, Any]:
+        if not self._authorized(request):
+            return 200, {'code': CODE_UNAUTHORIZED, 'msg': 'invalid authorization'}
+        job = self.jobs.get(request.query.get('task_id', ''))
+        if job is None:
+            return 200, {'code': 1004, 'msg': 'task not found'}
+        return 200, {'code': CODE_OK, 'msg': 'OK', 'data': self._job_result(job, job.status(time.time()))}
+
+    def webhook_body(self, job: _Job) -> Dict[str, Any]:
+        """Тело callback в формате AKOOL: {signature, dataEncrypt, timestamp, nonce}"""
+        result = self._job_result(job, STATUS_FAILED if job.fails else STATUS_COMPLETED)
+        result.pop('task_id')
+        result.pop('video_url', None)
+        data_encrypt = self.cipher.encrypt(json.dumps(result))
+        timestamp = int(time.time() * 1000)
+        nonce = str(self.random.randint(1000, 9999))
+        return {
+            'signature': compute_signature(self.client_id, timestamp, nonce, data_encrypt),
+            'dataEncrypt': data_encrypt,
+            'timestamp': timestamp,
+            'nonce': nonce,
+        }
+
+    async def _deliver_webhook(self, job: _Job) -> None:
+        if self._webhook_slots is None:
+            self._webhook_slots = asyncio.Semaphore(self._max_webhooks_in_flight)
+        async with self._webhook_slots:
+            try:
+                status = await post_json(job.webhook_url, self.webhook_body(job))
+                self.stats['webhooks_sent' if status < 400 else 'webhooks_rejected'] += 1
+            except (OSError, asyncio.TimeoutError, ValueError):
+                self.stats['webhooks_failed'] += 1
+
+    # ------------------------------------------------------------ ElevenLabs
+
+    def _elevenlabs_authorized(self, request: StubRequest) -> bool:
+        return bool(request.headers.get('xi-api-key'))
+
+    async def _list_voices(self, request: StubRequest, match) -> Tuple[int, Any]:
+        if not self._elevenlabs_authorized(request):
+            return 401, {'detail': {'status': 'invalid_api_key'}}
+        return 200, {'voices': [{'voice_id': voice_id, 'name': name} for voice_id, name in self.voices.items()]}
+
+    async def _add_voice(self, request: StubRequest, match) -> Tuple[int, Any]:
+        if not self._elevenlabs_authorized(request):
+            return 401, {'detail': {'status': 'invalid_api_key'}}
+        name = re.search(rb'name="name"\r\n\r\n([^\r]*)', request.body)
+        voice_id = uuid.uuid4().hex[:20]
+        self.voices[voice_id] = name.group(1).decode('utf-8', 'replace') if name else voice_id
+        return 200, {'voice_id': voice_id}
+
+    async def _get_voice(self, request: StubRequest, match) -> Tuple[int, Any]:
+        voice_id = match.group(1)
+        if voice_id not in self.voices:
+            return 404, {'detail': {'status': 'voice_not_found'}}
+        return 200, {'voice_id': voice_id, 'name': self.voices[voice_id]}
+
+    async def _delete_voice(self, request: StubRequest, match) -> Tuple[int, Any]:
+        if self.voices.pop(match.group(1), None) is None:
+            return 404, {'detail': {'status': 'voice_not_found'}}
+        return 200, {'status': 'ok'}
+
+    def _tts_size(self, request: StubRequest) -> int:
+        return max(1, len(str(request.json().get('text', '')))) * self.tts_bytes_per_char
+
+    async def _tts(self, request: StubRequest, match) -> Tuple[int, Any]:
+        if not self._elevenlabs_authorized(request):
+            return 401, {'detail': {'status': 'invalid_api_key'}}
+        if match.group(1) not in self.voices:
+            return 404, {'detail': {'status': 'voice_not_found'}}
+        size = self._tts_size(request)
+        audio = (_MP3_FRAME * (size // len(_MP3_FRAME) + 1))[:size]
+        return 200, audio
+
+    async def _tts_stream(self, request: StubRequest, match) -> Tuple[int, Any]:
+        if not self._elevenlabs_authorized(request):
+            return 401, {'detail': {'status': 'invalid_api_key'}}
+        if match.group(1) not in self.voices:
+            return 404, {'detail': {'status': 'voice_not_found'}}
+        size = self._tts_size(request)
+        chunk = (_MP3_FRAME * (self.tts_chunk_size // len(_MP3_FRAME) + 1))[:self.tts_chunk_size]
+
+        async def chunks() -> AsyncIterator[bytes]:
+            remaining = size
+            while remaining > 0:
+                if self.tts_chunk_delay:
+                    await asyncio.sleep(self.tts_chunk_delay)
+                yield chunk[:remaining]
+                remaining -= len(chunk)
+
+        return 200, chunks()
+
+    # ------------------------------------------------------------ HTTP
+
+    async def _dispatch(self, request: StubRequest) -> Tuple[int, Any]:
+        for method, pattern, name, handler in self._routes:
+            match = pattern.match(request.path)
+            if match is None:
+                continue
+            if method != request.method:
+                continue
+            self.stats[name] += 1
+            latency = self.route_latency.get(name, self.latency).sample(self.random)
+            if latency > 0:
+                await asyncio.sleep(latency)
+            return await handler(request, match)
+        self.stats['not_found'] += 1
+        return 404, {'detail': 'not found'}
+
+    async def _write_response(self, writer: asyncio.StreamWriter, status: int, payload: Any,
+                              keep_alive: bool) -> None:
+        head = [f"HTTP/1.1 {status} {_REASONS.get(status, 'OK')}",
+                f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        if isinstance(payload, (bytes, bytearray)):
+            head += ['Content-Type: audio/mpeg', f'Content-Length: {len(payload)}']
+            writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + payload)
+        elif hasattr(payload, '__aiter__'):
+            head += ['Content-Type: audio/mpeg', 'Transfer-Encoding: chunked']
+            writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+            async for chunk in payload:
+                writer.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+                await writer.drain()
+            writer.write(b'0\r\n\r\n')
+        else:
+            body = json.dumps(payload).encode('utf-8')
+            head += ['Content-Type: application/json', f'Content-Length: {len(body)}']
+            writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                request_line, *header_lines = head.decode('latin-1').split('\r\n')
+                method, target, version = request_line.split(' ', 2)
+                headers = {}
+                for line in header_lines:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+
+                if headers.get('transfer-encoding', '').lower() == 'chunked':
+                    body = await read_chunked(reader)
+                else:
+                    body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                parts = urlsplit(target)
+                query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+                request = StubRequest(method.upper(), parts.path, query, headers, body)
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+
+                try:
+                    status, payload = await self._dispatch(request)
+                except Exception as e:
+                    self.stats['errors'] += 1
+                    status, payload = 500, {'detail': str(e)}
+                await self._write_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    # ------------------------------------------------------------ Запуск
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, backlog=4096)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            # Keep-alive соединения ждут следующий запрос - закрываем их явно
+            for task in list(self._connections):
+                task.cancel()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+
+    def start_in_thread(self) -> 'StubServer':
+        """Запуск в фоновом потоке со своим event loop (для синхронных клиентов)"""
+        started = threading.Event()
+
+        def run() -> None:
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.start())
+            started.set()
+            try:
+                loop.run_forever()
+            finally:
+                loop.close()
+
+        self._thread = threading.Thread(target=run, name='akool-stub', daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop_thread(self) -> None:
+        if self._loop is not None and self._thread is not None:
+            asyncio.run_coroutine_threadsafe(self.stop(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+
+async def read_chunked(reader: asyncio.StreamReader) -> bytes:
+    """Тело в chunked transfer encoding"""
+    parts = []
+    while True:
+        size_line = await reader.readuntil(b'\r\n')
+        size = int(size_line.split(b';', 1)[0], 16)
+        if size == 0:
+            await reader.readuntil(b'\r\n')
+            return b''.join(parts)
+        parts.append(await reader.readexactly(size))
+        await reader.readexactly(2)
+
+
+async def post_json(url: str, body: Dict[str, Any], timeout: float = 10) -> int:
+    """Минимальный асинхронный POST JSON; возвращает HTTP статус"""
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https'):
+        raise ValueError(f"Неподдерживаемый URL: {url}")
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    ssl_context = ssl.create_default_context() if parts.scheme == 'https' else None
+    data = json.dumps(body).encode('utf-8')
+    path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+    request = (f"POST {path} HTTP/1.1\r\nHost: {parts.hostname}\r\n"
+               f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+               f"Connection: close\r\n\r\n").encode('latin-1') + data
+
+    async def send() -> int:
+        reader, writer = await asyncio.open_connection(parts.hostname, port, ssl=ssl_context)
+        try:
+            writer.write(request)
+            await writer.drain()
+            status_line = await reader.readline()
+            return int(status_line.split()[1])
+        finally:
+            writer.close()
+
+    return await asyncio.wait_for(send(), timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Локальный stub AKOOL и ElevenLabs API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8787)
+    parser.add_argument('--latency', default='0', help="Задержка ответа: 0.05, uniform:0.01,0.1, exp:0.05, lognormal:0.05,0.5")
+    parser.add_argument('--render-time', default='uniform:5,15', help='Время рендера видео (распределение)')
+    parser.add_argument('--queue-time', default='0', help='Время в очереди до рендера (распределение)')
+    parser.add_argument('--webhook-delay', default='0', help='Задержка доставки webhook (распределение)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Доля ответов 1015 на createbytalkingphoto')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Доля задач, завершающихся статусом 4')
+    parser.add_argument('--tts-chunk-delay', type=float, default=0.0, help='Пауза между чанками /stream, сек')
+    parser.add_argument('--seed', type=int, help='Seed генератора случайных чисел')
+    args = parser.parse_args()
+
+    server = StubServer(args.host, args.port, latency=args.latency, render_time=args.render_time,
+                        queue_time=args.queue_time, webhook_delay=args.webhook_delay,
+                        error_rate=args.error_rate, failure_rate=args.failure_rate,
+                        tts_chunk_delay=args.tts_chunk_delay, seed=args.seed)
+
+    async def serve() -> None:
+        await server.start()
+        print(f"🚀 Stub сервер запущен")
+        print(f"   export AKOOL_BASE_URL={server.akool_base_url}")
+        print(f"   export ELEVENLABS_BASE_URL={server.elevenlabs_base_url}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await server.stop()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        print(f"\n📊 Статистика: {dict(server.stats)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+AKOOL Token Cache
+Кэш bearer токена AKOOL с проактивным обновлением
+
+Токен вместе со сроком действия хранится в файле, общем для всех процессов
+на машине. Обновление выполняется под межпроцессной блокировкой (flock):
+если N воркеров одновременно видят устаревший токен, /getToken вызывает
+только первый, остальные читают уже обновлённый файл. Фоновый поток
+обновляет токен заранее, до истечения срока.
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: только внутрипроцессная блокировка
+    fcntl = None
+
+from akool_http import get_session
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'airshorts')
+# Обновляем токен за refresh_margin секунд до истечения
+DEFAULT_REFRESH_MARGIN = 300
+# Срок жизни, если в токене нет поля exp
+DEFAULT_TOKEN_TTL = 3600
+
+
+class AkoolTokenError(Exception):
+    """Ошибка получения токена AKOOL"""
+
+    def __init__(self, message: str, code: Any = None):
+        super().__init__(message)
+        self.code = code
+
+
+def token_expiry(token: str, default_ttl: float = DEFAULT_TOKEN_TTL) -> float:
+    """Срок действия токена: exp из JWT payload или now + default_ttl"""
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get('exp')
+        if exp:
+            return float(exp)
+    except (IndexError, ValueError, AttributeError):
+        pass
+    return time.time() + default_ttl
+
+
+class TokenProvider:
+    """Поставщик токена AKOOL с дисковым кэшем и single-flight обновлением"""
+
+    def __init__(self, client_id: str, client_secret: str, base_url: str,
+                 session=None, cache_dir: Optional[str] = None,
+                 refresh_margin: float = DEFAULT_REFRESH_MARGIN,
+                 default_ttl: float = DEFAULT_TOKEN_TTL):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.base_url = base_url
+        self.session = session or get_session()
+        self.refresh_margin = refresh_margin
+        self.default_ttl = default_ttl
+
+        cache_dir = cache_dir or os.getenv('AKOOL_TOKEN_CACHE_DIR', DEFAULT_CACHE_DIR)
+        os.makedirs(cache_dir, exist_ok=True)
+        name = hashlib.sha256(f"{base_url}|{client_id}".encode('utf-8')).hexdigest()[:16]
+        self.cache_path = os.path.join(cache_dir, f"akool_token_{name}.json")
+        self.lock_path = self.cache_path + '.lock'
+
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        self._refresher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _is_fresh(self, expires_at: float, now: Optional[float] = None) -> bool:
+        now = time.time() if now is None else now
+        return expires_at - self.refresh_margin > now
+
+    @contextmanager
+    def _file_lock(self):
+        """Межпроцессная блокировка на время обновления"""
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _read_cache(self) -> Tuple[Optional[str], float]:
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data.get('token'), float(data.get('expires_at', 0))
+        except (OSError, ValueError):
+            return None, 0.0
+
+    def _write_cache(self, token: str, expires_at: float) -> None:
+        """Атомарная запись: временный файл + os.replace"""
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.cache_path), prefix='.akool_token_')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'token': token, 'expires_at': expires_at}, f)
+            os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def _fetch(self) -> Tuple[str, float]:
+        """Запрос /getToken"""
+        response = self.session.post(
+            f"{self.base_url}/getToken",
+            json={
+                "clientId": self.client_id,
+                "clientSecret": self.client_secret
+            },
+            timeout=10
+        )
+        data = response.json()
+        if data.get('code') == 1000 and data.get('token'):
+            token = data['token']
+            return token, token_expiry(token, self.default_ttl)
+        raise AkoolTokenError(f"Ошибка получения токена. Код: {data.get('code')}", data.get('code'))
+
+    def refresh(self, force: bool = False) -> str:
+        """Обновление токена; только один процесс реально вызывает /getToken"""
+        with self._lock, self._file_lock():
+            token, expires_at = self._read_cache()
+            if force and token == self._token:
+                token = None
+            if not token or not self._is_fresh(expires_at):
+                token, expires_at = self._fetch()
+                self._write_cache(token, expires_at)
+                logger.info("🔑 Токен AKOOL обновлен, действует до %s", time.ctime(expires_at))
+            self._token, self._expires_at = token, expires_at
+            return token
+
+    def get_token(self) -> str:
+        """Актуальный токен: из памяти, из файла или через /getToken"""
+        token = self._token
+        if token and self._is_fresh(self._expires_at):
+            return token
+
+        token, expires_at = self._read_cache()
+        if token and self._is_fresh(expires_at):
+            self._token, self._expires_at = token, expires_at
+            return token
+
+        return self.refresh()
+
+    def invalidate(self) -> None:
+        """Сброс токена (например, после ответа 401)"""
+        if self._token:
+            self.refresh(force=True)
+
+    def start_background_refresh(self) -> None:
+        """Фоновый поток, обновляющий токен до истечения срока"""
+        if self._refresher is not None and self._refresher.is_alive():
+            return
+        self._stop.clear()
+        self._refresher = threading.Thread(target=self._refresh_loop, name='akool-token-refresh', daemon=True)
+        self._refresher.start()
+
+    def stop_background_refresh(self) -> None:
+        self._stop.set()
+
+    def _refresh_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.get_token()
+                delay = max(1.0, self._expires_at - self.refresh_margin - time.time())
+            except Exception as e:
+                logger.warning("⚠️ Фоновое обновление токена AKOOL не удалось: %s", e)
+                delay = 30.0
+            self._stop.wait(delay)
+
+
+_providers: Dict[Tuple[str, str], TokenProvider] = {}
+_providers_lock = threading.Lock()
+
+
+def get_token_provider(client_id: str, client_secret: str, base_url: str, session=None) -> TokenProvider:
+    """Общий (на процесс) TokenProvider для пары clientId/base_url"""
+    key = (client_id, base_url)
+    with _providers_lock:
+        provider = _providers.get(key)
+        if provider is None or provider.client_secret != client_secret:
+            provider = TokenProvider(client_id, client_secret, base_url, session=session)
+            _providers[key] = provider
+        return provider
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Кэш токена AKOOL')
+    parser.add_argument('--client-id', default=os.getenv('AKOOL_CLIENT_ID', ''))
+    parser.add_argument('--client-secret', default=os.getenv('AKOOL_CLIENT_SECRET', ''))
+    parser.add_argument('--base-url', default=os.getenv('AKOOL_BASE_URL', 'https://openapi.akool.com/api/open/v3'))
+    parser.add_argument('--force', action='store_true', help='Принудительно обновить токен')
+    args = parser.parse_args()
+
+    provider = get_token_provider(args.client_id, args.client_secret, args.base_url)
+    token = provider.refresh(force=True) if args.force else provider.get_token()
+    print(f"✅ Токен: {token[:16]}... (до {time.ctime(provider._expires_at)})")
+    print(f"📄 Кэш: {provider.cache_path}")
+
+
+if __name__ == "__main__":
+    main()
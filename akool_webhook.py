@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+AKOOL Webhook Decryption
+Расшифровка webhook данных AKOOL: AES-CBC, PKCS#7, key = clientSecret, IV = clientId
+
+Документация называет схему AES-192-CBC, но сервер (как и crypto-js) выбирает
+размер AES по длине clientSecret: 32 байта -> AES-256. IV - первые 16 байт
+clientId. Параметры шифра выводятся один раз на пару credentials и кэшируются;
+один ECB контекст переиспользуется для всех сообщений, а CBC цепочка
+считается XOR-ом целых слов, поэтому на сообщение нет затрат на настройку.
+"""
+
+import argparse
+import base64
+import binascii
+import functools
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+except ImportError:  # cryptography опционален, пробуем pycryptodome
+    Cipher = None
+
+try:
+    from Crypto.Cipher import AES as PyCryptoAES
+except ImportError:
+    PyCryptoAES = None
+
+BLOCK_SIZE = 16
+AES_KEY_SIZES = (16, 24, 32)
+
+# Тестовые данные из реальных логов (см. AKOOL_WEBHOOK_FIX_REPORT.md)
+SAMPLE_WEBHOOK = {
+    "signature": "9a0403251957a130fad76ea64236e02c3c521e70",
+    "dataEncrypt": "dOiIGl2CZPmj6UKlO9yzmWPW4Tb+T93rLqKQj6ES7xP7k4H5OhvVugbymXZ0kGW8v+Bfa0oJKI0RlPkC7P7ow8MGfv8ow1idyPVOpDA0ncWuZmgMLazug/Vm1yEHrDhdr77Sz4hk9O0Oezc5VHKB6/Me5xwehJZjyVSCKTe/+2lqV7ezzDhi6LmMy7sCkVwt4rOFvq8Yafi64CnCcZLzpA==",
+    "timestamp": 1757785623798,
+    "nonce": "9047",
+}
+DEFAULT_CLIENT_ID = "mrj0kTxsc6LoKCEJX2oyyA=="
+DEFAULT_CLIENT_SECRET = "J6QZyb+g0ucATnJa7MSG9QRm9FfVDsMF"
+
+
+class AkoolDecryptError(ValueError):
+    """Ошибка расшифровки webhook данных (аналог 'bad decrypt')"""
+
+
+def _xor_block_chain(plain_ecb: bytes, previous: bytes) -> bytes:
+    """CBC цепочка: XOR результата ECB с предыдущими блоками шифротекста"""
+    return (int.from_bytes(plain_ecb, 'big') ^ int.from_bytes(previous, 'big')).to_bytes(len(plain_ecb), 'big')
+
+
+def _unpad(data: bytes) -> bytes:
+    """Снятие PKCS#7 padding с проверкой"""
+    if not data or len(data) % BLOCK_SIZE:
+        raise AkoolDecryptError("bad decrypt: длина не кратна размеру блока")
+    pad = data[-1]
+    if not 1 <= pad <= BLOCK_SIZE or data[-pad:] != bytes([pad]) * pad:
+        raise AkoolDecryptError("bad decrypt: неверный PKCS#7 padding")
+    return data[:-pad]
+
+
+def _pad(data: bytes) -> bytes:
+    """PKCS#7 padding"""
+    pad = BLOCK_SIZE - len(data) % BLOCK_SIZE
+    return data + bytes([pad]) * pad
+
+
+class AkoolCipher:
+    """Переиспользуемый AES контекст для одной пары clientId/clientSecret"""
+
+    def __init__(self, client_id: str, client_secret: str):
+        key = client_secret.encode('utf-8')
+        iv = client_id.encode('utf-8')[:BLOCK_SIZE]
+
+        if len(key) not in AES_KEY_SIZES:
+            raise AkoolDecryptError(f"clientSecret должен быть 16/24/32 байта, получено {len(key)}")
+        if len(iv) != BLOCK_SIZE:
+            raise AkoolDecryptError(f"clientId должен быть не короче {BLOCK_SIZE} байт")
+
+        self.client_id = client_id
+        self.key = key
+        self.iv = iv
+        self.key_bits = len(key) * 8
+
+        if Cipher is not None:
+            ecb = Cipher(algorithms.AES(key), modes.ECB())
+            self._decrypt_ecb = ecb.decryptor().update
+            self._encrypt_ecb = ecb.encryptor().update
+        elif PyCryptoAES is not None:
+            ecb = PyCryptoAES.new(key, PyCryptoAES.MODE_ECB)
+            self._decrypt_ecb = ecb.decrypt
+            self._encrypt_ecb = ecb.encrypt
+        else:
+            raise ImportError("Нужен пакет cryptography или pycryptodome: pip install cryptography")
+
+    def decrypt_bytes(self, ciphertext: bytes) -> bytes:
+        """Расшифровка сырых байтов"""
+        if not ciphertext or len(ciphertext) % BLOCK_SIZE:
+            raise AkoolDecryptError("bad decrypt: длина не кратна размеру блока")
+        plain_ecb = self._decrypt_ecb(ciphertext)
+        return _unpad(_xor_block_chain(plain_ecb, self.iv + ciphertext[:-BLOCK_SIZE]))
+
+    def decrypt(self, data_encrypt: Union[str, bytes]) -> str:
+        """Расшифровка base64 поля dataEncrypt в строку"""
+        try:
+            ciphertext = base64.b64decode(data_encrypt, validate=True)
+        except (binascii.Error, ValueError) as e:
+            raise AkoolDecryptError(f"dataEncrypt не является base64: {e}")
+        try:
+            return self.decrypt_bytes(ciphertext).decode('utf-8')
+        except UnicodeDecodeError as e:
+            raise AkoolDecryptError(f"bad decrypt: результат не UTF-8: {e}")
+
+    def decrypt_json(self, data_encrypt: Union[str, bytes]) -> Any:
+        """Расшифровка dataEncrypt и разбор JSON"""
+        return json.loads(self.decrypt(data_encrypt))
+
+    def decrypt_stream(self, payloads: Iterable[Union[str, bytes]], errors: str = 'raise') -> Iterator[Optional[str]]:
+        """
+        Потоковая расшифровка последовательности dataEncrypt.
+
+        errors='raise' - пробрасывать AkoolDecryptError,
+        errors='skip' - возвращать None для битых сообщений.
+        """
+        decrypt = self.decrypt
+        for payload in payloads:
+            try:
+                yield decrypt(payload)
+            except AkoolDecryptError:
+                if errors == 'raise':
+                    raise
+                yield None
+
+    def encrypt(self, plaintext: Union[str, bytes]) -> str:
+        """Шифрование в формат dataEncrypt (для тестов и stub сервера)"""
+        if isinstance(plaintext, str):
+            plaintext = plaintext.encode('utf-8')
+        data = _pad(plaintext)
+        previous = self.iv
+        blocks = []
+        for offset in range(0, len(data), BLOCK_SIZE):
+            previous = self._encrypt_ecb(_xor_block_chain(data[offset:offset + BLOCK_SIZE], previous))
+            blocks.append(previous)
+        return base64.b64encode(b''.join(blocks)).decode('ascii')
+
+
+@functools.lru_cache(maxsize=64)
+def get_cipher(client_id: str, client_secret: str) -> AkoolCipher:
+    """Кэшированный AkoolCipher для пары credentials"""
+    return AkoolCipher(client_id, client_secret)
+
+
+def compute_signature(client_id: str, timestamp: Union[str, int], nonce: str, data_encrypt: str) -> str:
+    """signature = sha1(sort(clientId, timestamp, nonce, dataEncrypt))"""
+    sorted_params = ''.join(sorted([client_id, str(timestamp), str(nonce), data_encrypt]))
+    return hashlib.sha1(sorted_params.encode('utf-8')).hexdigest()
+
+
+def verify_signature(client_id: str, timestamp: Union[str, int], nonce: str, data_encrypt: str, signature: str) -> bool:
+    """Проверка подписи webhook"""
+    return hmac.compare_digest(compute_signature(client_id, timestamp, nonce, data_encrypt), str(signature))
+
+
+# Результаты проверки подписи
+VERIFY_OK = 'ok'
+VERIFY_BAD_SIGNATURE = 'bad_signature'
+VERIFY_REPLAY = 'replay'
+
+
+class NonceCache:
+    """Ограниченный LRU/TTL кэш (timestamp, nonce) для отсечения повторов"""
+
+    def __init__(self, max_size: int = 100000, ttl: float = 300.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._seen: 'OrderedDict[str, float]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, timestamp: Union[str, int], nonce: str, now: Optional[float] = None) -> bool:
+        """Запоминает пару; False, если она уже встречалась в пределах TTL"""
+        key = f"{timestamp}:{nonce}"
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            expires = self._seen.get(key)
+            if expires is not None and expires > now:
+                return False
+            self._seen[key] = now + self.ttl
+            self._seen.move_to_end(key)
+            # Старые записи в начале: вытесняем истекшие и лишние
+            while self._seen:
+                oldest_key, oldest_expires = next(iter(self._seen.items()))
+                if oldest_expires > now and len(self._seen) <= self.max_size:
+                    break
+                del self._seen[oldest_key]
+            return True
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+
+class SignatureVerifier:
+    """
+    Проверка подписей webhook для одного clientId.
+
+    Если clientId при сортировке оказывается первым, SHA1 продолжается от
+    заранее посчитанного состояния hashlib (copy() вместо повторного хеширования
+    токена). Сравнение подписи - за постоянное время, повторы (timestamp, nonce)
+    отсекаются через NonceCache.
+    """
+
+    def __init__(self, client_id: str, nonce_cache: Optional[NonceCache] = None):
+        self.client_id = client_id
+        self.nonce_cache = nonce_cache
+        self._token_bytes = client_id.encode('utf-8')
+        self._prefix_state = hashlib.sha1(self._token_bytes)
+
+    def _digest(self, timestamp: str, nonce: str, data_encrypt: str) -> bytes:
+        token = self.client_id
+        parts = sorted((timestamp, nonce, data_encrypt))
+        if token <= parts[0]:
+            state = self._prefix_state.copy()
+            state.update(''.join(parts).encode('utf-8'))
+        else:
+            state = hashlib.sha1(''.join(sorted((token, *parts))).encode('utf-8'))
+        return state.hexdigest().encode('ascii')
+
+    def check(self, timestamp: Union[str, int], nonce: str, data_encrypt: str, signature: str) -> str:
+        """Проверка одной записи: VERIFY_OK / VERIFY_BAD_SIGNATURE / VERIFY_REPLAY"""
+        timestamp = str(timestamp)
+        nonce = str(nonce)
+        expected = self._digest(timestamp, nonce, data_encrypt)
+        if not hmac.compare_digest(expected, str(signature).encode('utf-8')):
+            return VERIFY_BAD_SIGNATURE
+        # Nonce запоминаем только после валидной подписи, чтобы подделки не засоряли кэш
+        if self.nonce_cache is not None and not self.nonce_cache.add(timestamp, nonce):
+            return VERIFY_REPLAY
+        return VERIFY_OK
+
+    def verify(self, timestamp: Union[str, int], nonce: str, data_encrypt: str, signature: str) -> bool:
+        """Проверка одной записи"""
+        return self.check(timestamp, nonce, data_encrypt, signature) == VERIFY_OK
+
+    def verify_batch(self, records: Iterable[Tuple[Union[str, int], str, str, str]]) -> List[str]:
+        """Проверка пачки (timestamp, nonce, dataEncrypt, signature)"""
+        check = self.check
+        return [check(timestamp, nonce, data_encrypt, signature)
+                for timestamp, nonce, data_encrypt, signature in records]
+
+
+def decrypt_webhook(body: Dict[str, Any], client_id: str, client_secret: str) -> Any:
+    """Расшифровка тела webhook ({dataEncrypt, signature, timestamp, nonce}) в JSON"""
+    return get_cipher(client_id, client_secret).decrypt_json(body['dataEncrypt'])
+
+
+def benchmark(count: int, client_id: str, client_secret: str) -> Dict[str, float]:
+    """Замер расшифровок и проверок подписи в секунду на одном ядре"""
+    cipher = get_cipher(client_id, client_secret)
+    payloads = [SAMPLE_WEBHOOK['dataEncrypt']] * count
+
+    start = time.perf_counter()
+    for _ in cipher.decrypt_stream(payloads):
+        pass
+    elapsed = time.perf_counter() - start
+
+    verifier = SignatureVerifier(client_id)
+    sample = SAMPLE_WEBHOOK
+    records = [(sample['timestamp'], sample['nonce'], sample['dataEncrypt'], sample['signature'])] * count
+
+    start = time.perf_counter()
+    verifier.verify_batch(records)
+    verify_elapsed = time.perf_counter() - start
+
+    return {
+        'decryptions': count,
+        'key_bits': cipher.key_bits,
+        'backend': 'cryptography' if Cipher is not None else 'pycryptodome',
+        'decryptions_per_sec': count / elapsed,
+        'verifications_per_sec': count / verify_elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Расшифровка webhook данных AKOOL')
+    parser.add_argument('--data', help='dataEncrypt (base64), по умолчанию тестовые данные из логов')
+    parser.add_argument('--client-id', default=os.getenv('AKOOL_CLIENT_ID', DEFAULT_CLIENT_ID))
+    parser.add_argument('--client-secret', default=os.getenv('AKOOL_CLIENT_SECRET', DEFAULT_CLIENT_SECRET))
+    parser.add_argument('--benchmark', type=int, metavar='N', help='Замерить скорость на N расшифровках')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        print(json.dumps(benchmark(args.benchmark, args.client_id, args.client_secret), indent=2))
+        return
+
+    data_encrypt = args.data or SAMPLE_WEBHOOK['dataEncrypt']
+    try:
+        result = get_cipher(args.client_id, args.client_secret).decrypt_json(data_encrypt)
+        print("✅ Расшифровка успешна:")
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    except (AkoolDecryptError, ValueError) as e:
+        print(f"❌ Ошибка расшифровки: {e}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
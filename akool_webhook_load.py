@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+AKOOL Webhook Load Test
+Нагрузочный прогон akool_webhook_server.py на localhost
+
+Генерирует корпус подписанных и зашифрованных webhook (как шлёт AKOOL),
+поднимает сервер приёма отдельным процессом (или бьёт в --url) и
+отправляет тела с concurrency keep-alive соединений. Меряет задержку
+подтверждения (от отправки запроса до ответа), запросов в секунду, долю
+503 и время, за которое все события оказались в очереди (по /health).
+
+    python akool_webhook_load.py --requests 20000 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from akool_bench import make_payload
+from akool_webhook import DEFAULT_CLIENT_ID, DEFAULT_CLIENT_SECRET, compute_signature, get_cipher
+
+
+def make_requests(count: int, host: str, path: str, payload_len: int = 160, seed: int = 42,
+                  client_id: str = DEFAULT_CLIENT_ID, client_secret: str = DEFAULT_CLIENT_SECRET) -> List[bytes]:
+    """Готовые HTTP запросы с телами webhook (уникальные timestamp + nonce)"""
+    rng = random.Random(seed)
+    cipher = get_cipher(client_id, client_secret)
+    base_timestamp = int(time.time() * 1000)
+    requests = []
+    for i in range(count):
+        data_encrypt = cipher.encrypt(make_payload(rng, payload_len))
+        timestamp = base_timestamp + i
+        nonce = str(rng.randrange(1000, 10000))
+        body = json.dumps({
+            'signature': compute_signature(client_id, timestamp, nonce, data_encrypt),
+            'dataEncrypt': data_encrypt,
+            'timestamp': timestamp,
+            'nonce': nonce,
+        }).encode('utf-8')
+        head = (f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n").encode('latin-1')
+        requests.append(head + body)
+    return requests
+
+
+async def _connection(host: str, port: int, requests: Sequence[bytes], next_index: List[int],
+                      latencies: List[float], statuses: Counter) -> None:
+    """Одно keep-alive соединение: запросы по очереди из общего списка"""
+    reader, writer = await asyncio.open_connection(host, port)
+    timer = time.perf_counter
+    try:
+        while next_index[0] < len(requests):
+            request = requests[next_index[0]]
+            next_index[0] += 1
+            start = timer()
+            writer.write(request)
+            head = await reader.readuntil(b'\r\n\r\n')
+            length = 0
+            for line in head.split(b'\r\n'):
+                if line[:15].lower() == b'content-length:':
+                    length = int(line[15:])
+            if length:
+                await reader.readexactly(length)
+            latencies.append(timer() - start)
+            statuses[int(head.split(b' ', 2)[1])] += 1
+            if b'connection: close' in head.lower():
+                writer.close()
+                reader, writer = await asyncio.open_connection(host, port)
+    finally:
+        writer.close()
+
+
+async def send_all(url: str, requests: Sequence[bytes], concurrency: int) -> Tuple[List[float], Counter, float]:
+    parts = urlsplit(url)
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    next_index = [0]
+    start = time.perf_counter()
+    await asyncio.gather(*(_connection(parts.hostname, parts.port or 80, requests, next_index, latencies, statuses)
+                           for _ in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - start
+
+
+def health(url: str) -> Dict[str, Any]:
+    parts = urlsplit(url)
+    with urllib.request.urlopen(f"{parts.scheme}://{parts.netloc}/health", timeout=5) as response:
+        return json.loads(response.read())
+
+
+def wait_processed(url: str, expected: int, timeout: float = 120.0) -> Tuple[Optional[float], Dict[str, Any]]:
+    """Время до момента, когда сервер записал все принятые тела"""
+    start = time.perf_counter()
+    info: Dict[str, Any] = {}
+    while time.perf_counter() - start < timeout:
+        info = health(url)
+        processed = sum(info.get(key, 0) for key in ('ok', 'invalid_signature', 'decrypt_error', 'parse_error'))
+        if processed >= expected and info.get('in_pipeline', 0) == 0:
+            return time.perf_counter() - start, info
+        time.sleep(0.05)
+    return None, info
+
+
+def start_server(port: int, queue_dir: str, workers: int, extra: Sequence[str] = ()) -> subprocess.Popen:
+    """Сервер приёма отдельным процессом, чтобы клиент не делил с ним GIL"""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'akool_webhook_server.py')
+    process = subprocess.Popen([sys.executable, script, '--port', str(port), '--queue-dir', queue_dir,
+                                '--workers', str(workers), *extra],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}/"
+    for _ in range(200):
+        try:
+            health(url)
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("Сервер приёма не запустился")
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * (len(sorted_values) - 1)))]
+
+
+def run_load_test(url: str, count: int, concurrency: int, warmup: int = 500) -> Dict[str, Any]:
+    parts = urlsplit(url)
+    requests = make_requests(count + warmup, parts.netloc, parts.path or '/')
+    if warmup:
+        asyncio.run(send_all(url, requests[:warmup], min(concurrency, warmup)))
+        wait_processed(url, warmup)
+    baseline = health(url)
+
+    latencies, statuses, elapsed = asyncio.run(send_all(url, requests[warmup:], concurrency))
+    accepted = statuses.get(200, 0)
+    drain_seconds, info = wait_processed(url, accepted + sum(
+        baseline.get(key, 0) for key in ('ok', 'invalid_signature', 'decrypt_error', 'parse_error')))
+    latencies.sort()
+    return {
+        'requests': count,
+        'concurrency': concurrency,
+        'requests_per_sec': count / elapsed,
+        'ack_p50_ms': percentile(latencies, 0.50) * 1000,
+        'ack_p99_ms': percentile(latencies, 0.99) * 1000,
+        'ack_max_ms': latencies[-1] * 1000 if latencies else 0.0,
+        'statuses': dict(statuses),
+        'drain_after_send_seconds': drain_seconds,
+        'server': info,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный прогон приёма webhook AKOOL')
+    parser.add_argument('--url', help='Адрес уже запущенного сервера (по умолчанию поднимается локальный)')
+    parser.add_argument('--requests', type=int, default=20000, help='Количество webhook')
+    parser.add_argument('--concurrency', type=int, default=64, help='Одновременных keep-alive соединений')
+    parser.add_argument('--port', type=int, default=8791, help='Порт локального сервера')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Процессов расшифровки локального сервера')
+    parser.add_argument('--max-ack-p99-ms', type=float, help='Код выхода 1, если p99 подтверждения выше')
+    args = parser.parse_args()
+
+    process = None
+    queue_dir = None
+    url = args.url
+    if not url:
+        queue_dir = tempfile.mkdtemp(prefix='akool_webhook_queue_')
+        process = start_server(args.port, queue_dir, args.workers)
+        url = f"http://127.0.0.1:{args.port}/"
+
+    try:
+        report = run_load_test(url, args.requests, args.concurrency)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        if queue_dir:
+            shutil.rmtree(queue_dir, ignore_errors=True)
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    print(f"📊 {report['requests_per_sec']:.0f} req/s, подтверждение p50 {report['ack_p50_ms']:.2f} мс, "
+          f"p99 {report['ack_p99_ms']:.2f} мс", file=sys.stderr)
+    if args.max_ack_p99_ms is not None and report['ack_p99_ms'] > args.max_ack_p99_ms:
+        print(f"❌ p99 подтверждения выше {args.max_ack_p99_ms} мс", file=sys.stderr)
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
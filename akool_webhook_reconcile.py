@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+AKOOL Webhook Reconciliation
+Сведение webhook и опроса getvideostatus: статус из webhook отменяет опросы задачи
+
+Задачи создаются с webhookUrl, и раньше клиент всё равно опрашивал
+getvideostatus до status_check_attempts раз - webhook приходил, а цикл
+опроса о нём не знал. WebhookReconciler читает расшифрованные события
+(DurableQueue из akool_webhook_server.py или напрямую), находит task_id и
+вызывает VideoStatusPoller.resolve: future задачи разрешается сразу,
+запланированные опросы отменяются. Поллер при этом создаётся с
+webhook_timeout - опрос идёт только для задач, чей webhook просрочен.
+
+AKOOL кладёт в webhook только _id видео (без task_id), поэтому _id из
+ответа createbytalkingphoto запоминается (expect/track или job store).
+Событие, пришедшее раньше track(), придерживается и применяется при
+регистрации задачи. События для задач, которые поллер не отслеживает,
+пишутся в job store напрямую (--resume их уже не будет опрашивать).
+
+    python akool_webhook_reconcile.py --queue-dir ./webhook_queue --follow
+    python akool_webhook_reconcile.py --simulate 2000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from akool_job_store import JobStore, get_job_store
+from akool_status_poller import STATUS_COMPLETED, STATUS_FAILED, STATUS_PROCESSING, STATUS_QUEUED, VideoStatusPoller
+from akool_webhook_server import DurableQueue
+
+DEFAULT_FOLLOW_INTERVAL = 0.2
+DEFAULT_MAX_EARLY = 10000
+
+
+def event_data(event: Any) -> Optional[Dict[str, Any]]:
+    """Расшифрованные данные webhook: запись очереди {'ok', 'data'} или сам dict"""
+    if not isinstance(event, dict):
+        return None
+    if 'data' in event and ('ok' in event or 'line' in event):
+        if not event.get('ok', True):
+            return None
+        event = event['data']
+    return event if isinstance(event, dict) else None
+
+
+class WebhookReconciler:
+    """
+    События webhook -> VideoStatusPoller.resolve и job store.
+
+    Статус отслеживаемой задачи отдаётся поллеру (его on_update решает,
+    куда писать); остальные события пишутся в store, если он задан.
+    """
+
+    def __init__(self, poller: Optional[VideoStatusPoller] = None, store: Optional[JobStore] = None,
+                 max_early: int = DEFAULT_MAX_EARLY):
+        self.poller = poller
+        self.store = store
+        self.max_early = max_early
+        self.stats: Counter = Counter()
+        self._video_to_task: Dict[str, str] = {}
+        self._early: 'OrderedDict[str, Tuple[Optional[int], Dict[str, Any]]]' = OrderedDict()
+
+    def expect(self, task_id: str, video_id: Optional[str]) -> None:
+        """Запомнить _id видео задачи (из ответа createbytalkingphoto)"""
+        if video_id:
+            self._video_to_task[video_id] = task_id
+
+    def track(self, task_id: str, video_id: Optional[str] = None, **kwargs: Any) -> asyncio.Future:
+        """poller.track + применение события, пришедшего до регистрации"""
+        self.expect(task_id, video_id)
+        future = self.poller.track(task_id, **kwargs)
+        early = self._early.pop(task_id, None)
+        if early is not None:
+            self.stats['early_applied'] += 1
+            self.poller.resolve(task_id, *early)
+        return future
+
+    def _task_id(self, data: Dict[str, Any]) -> Optional[str]:
+        task_id = data.get('task_id')
+        if task_id:
+            return task_id
+        video_id = data.get('_id')
+        if not video_id:
+            return None
+        task_id = self._video_to_task.get(video_id)
+        if task_id is None and self.store is not None:
+            task_id = self.store.task_for_video(video_id)
+        return task_id
+
+    def feed(self, event: Any) -> Optional[str]:
+        """Одно событие; возвращает найденный task_id"""
+        data = event_data(event)
+        if data is None:
+            self.stats['invalid'] += 1
+            return None
+        task_id = self._task_id(data)
+        if task_id is None:
+            self.stats['unknown'] += 1
+            return None
+
+        status = data.get('status')
+        status = int(status) if status not in (None, '') else None
+        if self.poller is not None and self.poller.resolve(task_id, status, data):
+            self.stats['resolved'] += 1
+            return task_id
+
+        if self.store is not None:
+            self.store.record_status(task_id, status, video_url=data.get('video_url') or data.get('url'))
+            self.stats['stored'] += 1
+        if self.poller is not None:
+            # Задача ещё не зарегистрирована в поллере - применим при track()
+            self._early[task_id] = (status, data)
+            if len(self._early) > self.max_early:
+                self._early.popitem(last=False)
+            self.stats['early'] += 1
+        return task_id
+
+    def drain(self, queue: DurableQueue, batch: int = 1000) -> int:
+        """Прочитать всё, что есть в очереди, и сдвинуть курсор"""
+        total = 0
+        while True:
+            items, cursor = queue.read(batch)
+            if not items:
+                return total
+            for item in items:
+                self.feed(item)
+            queue.commit(cursor)
+            total += len(items)
+
+    async def follow(self, queue: DurableQueue, interval: float = DEFAULT_FOLLOW_INTERVAL, batch: int = 1000) -> None:
+        """Читать очередь в том же event loop, что и поллер, до отмены"""
+        loop = asyncio.get_running_loop()
+        while True:
+            items, cursor = await loop.run_in_executor(None, queue.read, batch)
+            if not items:
+                await asyncio.sleep(interval)
+                continue
+            for item in items:
+                self.feed(item)
+            await loop.run_in_executor(None, queue.commit, cursor)
+
+
+async def _simulate(tasks: int, webhooks: bool, webhook_loss: float, seed: int,
+                    scale: float) -> Dict[str, Any]:
+    """Рендер tasks задач с фиктивным getvideostatus; время в scale раз быстрее реального"""
+    rng = random.Random(seed)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    # Рендер 30-150 с, webhook через ~1 с после готовности (как у AKOOL)
+    done_at = {f'task-{i}': started + rng.uniform(30, 150) * scale for i in range(tasks)}
+    failed = {task_id for task_id in done_at if rng.random() < 0.05}
+
+    async def fetch_status(task_id: str) -> Dict[str, Any]:
+        now = loop.time()
+        if now >= done_at[task_id]:
+            status = STATUS_FAILED if task_id in failed else STATUS_COMPLETED
+        else:
+            status = STATUS_PROCESSING if now - started > 10 * scale else STATUS_QUEUED
+        return {'_id': task_id, 'status': status}
+
+    poller = VideoStatusPoller(fetch_status, rate=1e6, base_interval=5 * scale, max_interval=60 * scale,
+                               webhook_timeout=180 * scale if webhooks else None,
+                               fallback_interval=30 * scale)
+    reconciler = WebhookReconciler(poller)
+    latencies = []
+
+    def deliver(task_id: str) -> None:
+        status = STATUS_FAILED if task_id in failed else STATUS_COMPLETED
+        reconciler.feed({'ok': True, 'data': {'_id': task_id, 'status': status}})
+
+    futures = []
+    for task_id, ready in done_at.items():
+        future = reconciler.track(task_id, video_id=task_id)
+        future.add_done_callback(lambda f, ready=ready: latencies.append(loop.time() - ready))
+        futures.append(future)
+        if webhooks and rng.random() >= webhook_loss:
+            loop.call_at(ready + rng.uniform(0.5, 2.0) * scale, deliver, task_id)
+    results = await asyncio.gather(*futures)
+    await poller.close()
+
+    latencies.sort()
+    return {
+        'webhooks': webhooks,
+        'tasks': tasks,
+        'status_requests': poller.polls,
+        'requests_per_task': poller.polls / tasks,
+        'resolved_by_webhook': sum(1 for result in results if result['source'] == 'webhook'),
+        'median_delay_after_ready_s': latencies[len(latencies) // 2] / scale,
+        'max_delay_after_ready_s': latencies[-1] / scale,
+    }
+
+
+def simulate(tasks: int = 2000, webhook_loss: float = 0.02, seed: int = 42, scale: float = 0.01) -> Dict[str, Any]:
+    """Сравнение трафика getvideostatus: слепой опрос против webhook + запасного опроса"""
+    blind = asyncio.run(_simulate(tasks, False, webhook_loss, seed, scale))
+    reconciled = asyncio.run(_simulate(tasks, True, webhook_loss, seed, scale))
+    return {
+        'blind_polling': blind,
+        'webhook_reconciled': reconciled,
+        'webhook_loss': webhook_loss,
+        'traffic_reduction': blind['status_requests'] / max(1, reconciled['status_requests']),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сведение webhook AKOOL со статусами задач')
+    parser.add_argument('--queue-dir', help='Очередь akool_webhook_server.py: события пишутся в job store')
+    parser.add_argument('--job-db', help='SQLite база задач (по умолчанию AKOOL_JOB_DB или ~/.cache/airshorts)')
+    parser.add_argument('--follow', action='store_true', help='Ждать новые события')
+    parser.add_argument('--simulate', type=int, metavar='TASKS', help='Симуляция трафика опроса на TASKS задачах')
+    parser.add_argument('--webhook-loss', type=float, default=0.02, help='Доля потерянных webhook в симуляции')
+    args = parser.parse_args()
+
+    if args.simulate:
+        print("🔁 AKOOL Webhook Reconciliation")
+        print("===============================")
+        report = simulate(args.simulate, args.webhook_loss)
+        print(json.dumps(report, indent=2))
+        print(f"📉 Запросов getvideostatus меньше в {report['traffic_reduction']:.1f} раз", file=sys.stderr)
+        return
+
+    if not args.queue_dir:
+        parser.error('нужен --queue-dir или --simulate')
+
+    reconciler = WebhookReconciler(store=get_job_store(args.job_db))
+    queue = DurableQueue(args.queue_dir)
+    try:
+        while True:
+            if reconciler.drain(queue):
+                print(f"📊 {dict(reconciler.stats)}")
+            if not args.follow:
+                break
+            time.sleep(DEFAULT_FOLLOW_INTERVAL)
+    except KeyboardInterrupt:
+        pass
+    print(f"📊 Итог: {dict(reconciler.stats)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,493 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+AKOOL Webhook Ingest Server
+Приём webhook AKOOL: мгновенный ответ, проверка и расшифровка в пуле, долговременная очередь
+
+Asyncio HTTP/1.1 сервер (keep-alive, без внешних зависимостей) только
+читает тело POST и сразу отвечает 200 - подпись и AES не выполняются в
+event loop. Тела копятся в пачки (batch_size или flush_interval) и
+уходят в пул процессов, где обрабатываются той же process_record, что и
+офлайн replay_akool_webhooks.py (SignatureVerifier + AkoolCipher, как в
+final_decrypt_akool.py). Расшифрованные события пачкой дописываются в
+DurableQueue - сегменты JSONL на диске с курсором потребителя;
+отклонённые (подпись, расшифровка, разбор) - в dead-letter.jsonl.
+
+Back-pressure: число пачек в пуле ограничено, запись в очередь ждёт, пока
+непрочитанный хвост больше max_backlog_bytes, а когда в памяти набралось
+max_pending необработанных тел, новые webhook получают 503 с Retry-After
+(AKOOL повторит доставку) вместо неограниченного роста памяти.
+
+Ответ отправляется до записи на диск: при аварии теряются только тела из
+текущих пачек (не больше max_pending).
+
+    python akool_webhook_server.py --port 8080 --queue-dir ./webhook_queue
+    python akool_webhook_server.py --queue-dir ./webhook_queue --consume
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from akool_webhook import DEFAULT_CLIENT_ID, DEFAULT_CLIENT_SECRET
+from replay_akool_webhooks import _init_worker, process_record
+
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_FLUSH_INTERVAL = 0.005
+DEFAULT_MAX_PENDING = 20000
+DEFAULT_MAX_BODY = 1024 * 1024
+DEFAULT_SEGMENT_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_BACKLOG_BYTES = 1024 * 1024 * 1024
+
+_ACK_BODY = b'{"code":1000,"msg":"OK"}'
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            413: 'Payload Too Large', 503: 'Service Unavailable'}
+
+
+def process_batch(batch: List[Tuple[int, str]]) -> Tuple[List[str], List[str], Dict[str, int]]:
+    """Пачка тел в воркере: (события, отклонённые, статистика по статусам)"""
+    accepted: List[str] = []
+    rejected: List[str] = []
+    stats: Dict[str, int] = {}
+    for seq, body in batch:
+        status, line = process_record(seq, body)
+        stats[status] = stats.get(status, 0) + 1
+        (accepted if status == 'ok' else rejected).append(line)
+    return accepted, rejected, stats
+
+
+# ---------------------------------------------------------------- Очередь
+
+class DurableQueue:
+    """
+    Очередь на диске: сегменты queue-NNNNNN.jsonl и курсор потребителя.
+
+    Писатель дописывает строки пачками (один write, опционально fsync),
+    сегмент сменяется после segment_bytes. Курсор {segment, offset}
+    сохраняется атомарно (os.replace); полностью прочитанные сегменты
+    удаляются при commit. Потребитель может работать в другом процессе:
+    backlog_bytes считается по размерам файлов и курсору на диске.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = DEFAULT_SEGMENT_BYTES, fsync: bool = False):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+        self._cursor_path = os.path.join(directory, 'cursor.json')
+        self._lock = threading.Lock()
+        segments = self.segments()
+        self._write_segment = segments[-1] if segments else 1
+        self._writer = None
+
+    def _segment_path(self, number: int) -> str:
+        return os.path.join(self.directory, f'queue-{number:06d}.jsonl')
+
+    def segments(self) -> List[int]:
+        numbers = []
+        for name in os.listdir(self.directory):
+            if name.startswith('queue-') and name.endswith('.jsonl'):
+                numbers.append(int(name[6:-6]))
+        return sorted(numbers)
+
+    # ------------------------------------------------------------ Запись
+
+    def append(self, lines: List[str]) -> None:
+        """Дописать строки (JSON без переводов строк) одной операцией"""
+        if not lines:
+            return
+        data = ('\n'.join(lines) + '\n').encode('utf-8')
+        with self._lock:
+            if self._writer is None:
+                self._writer = open(self._segment_path(self._write_segment), 'ab')
+            elif self._writer.tell() >= self.segment_bytes:
+                self._writer.close()
+                self._write_segment += 1
+                self._writer = open(self._segment_path(self._write_segment), 'ab')
+            self._writer.write(data)
+            self._writer.flush()
+            if self.fsync:
+                os.fsync(self._writer.fileno())
+
+    def close(self) -> None:
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    # ------------------------------------------------------------ Чтение
+
+    def cursor(self) -> Tuple[int, int]:
+        try:
+            with open(self._cursor_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data['segment'], data['offset']
+        except (OSError, ValueError, KeyError):
+            segments = self.segments()
+            return (segments[0] if segments else 1), 0
+
+    def backlog_bytes(self) -> int:
+        """Непрочитанный объём по курсору на диске"""
+        segment, offset = self.cursor()
+        total = 0
+        for number in self.segments():
+            if number < segment:
+                continue
+            try:
+                size = os.path.getsize(self._segment_path(number))
+            except OSError:
+                continue
+            total += size - offset if number == segment else size
+        return max(0, total)
+
+    def read(self, max_items: int = 1000, cursor: Optional[Tuple[int, int]] = None) -> Tuple[List[Any], Tuple[int, int]]:
+        """До max_items событий после cursor (по умолчанию - сохранённого) и новый курсор"""
+        segment, offset = cursor or self.cursor()
+        items: List[Any] = []
+        segments = self.segments()
+        while len(items) < max_items:
+            path = self._segment_path(segment)
+            if not os.path.exists(path):
+                break
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                while len(items) < max_items:
+                    line = f.readline()
+                    # Недописанная строка - писатель ещё не закончил пачку
+                    if not line.endswith(b'\n'):
+                        break
+                    offset += len(line)
+                    items.append(json.loads(line))
+            later = [number for number in segments if number > segment]
+            if len(items) >= max_items or not later or os.path.getsize(path) > offset:
+                break
+            segment, offset = later[0], 0
+        return items, (segment, offset)
+
+    def commit(self, cursor: Tuple[int, int]) -> None:
+        """Сохранить курсор и удалить полностью прочитанные сегменты"""
+        segment, offset = cursor
+        tmp_path = f"{self._cursor_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'segment': segment, 'offset': offset}, f)
+        os.replace(tmp_path, self._cursor_path)
+        for number in self.segments():
+            if number < segment and number != self._write_segment:
+                try:
+                    os.remove(self._segment_path(number))
+                except OSError:
+                    pass
+
+    def consume(self, batch: int = 1000, follow: bool = False, poll: float = 0.5) -> Iterator[Any]:
+        """События с фиксацией курсора после каждой пачки"""
+        while True:
+            items, cursor = self.read(batch)
+            yield from items
+            if items:
+                self.commit(cursor)
+            elif not follow:
+                return
+            else:
+                time.sleep(poll)
+
+
+# ---------------------------------------------------------------- Сервер
+
+class WebhookIngestServer:
+    """Приём webhook AKOOL с проверкой/расшифровкой вне event loop"""
+
+    def __init__(self, queue: DurableQueue, host: str = '127.0.0.1', port: int = 0,
+                 client_id: str = DEFAULT_CLIENT_ID, client_secret: str = DEFAULT_CLIENT_SECRET,
+                 workers: int = 0, verify: bool = True, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL, max_pending: int = DEFAULT_MAX_PENDING,
+                 max_backlog_bytes: int = DEFAULT_MAX_BACKLOG_BYTES, max_body: int = DEFAULT_MAX_BODY,
+                 path: Optional[str] = None):
+        self.queue = queue
+        self.host = host
+        self.port = port
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.workers = workers
+        self.verify = verify
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_backlog_bytes = max_backlog_bytes
+        self.max_body = max_body
+        self.path = path
+        self.stats: Counter = Counter()
+
+        self._pending: List[Tuple[int, str]] = []
+        self._in_pipeline = 0  # тел принято, но ещё не записано в очередь
+        self._seq = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._batches: Optional[asyncio.Queue] = None
+        self._executor: Optional[Executor] = None
+        self._io_executor: Optional[ThreadPoolExecutor] = None
+        self._tasks: List[asyncio.Task] = []
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: set = set()
+        self._dead_letter = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}{self.path or '/'}"
+
+    # ------------------------------------------------------------ Конвейер
+
+    def _create_executor(self) -> Executor:
+        if self.workers <= 0:
+            # Без пула процессов: один поток, но всё равно вне event loop
+            _init_worker(self.client_id, self.client_secret, self.verify)
+            return ThreadPoolExecutor(max_workers=1, thread_name_prefix='webhook-decrypt')
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                   initargs=(self.client_id, self.client_secret, self.verify))
+
+    async def _batcher(self) -> None:
+        """Пачки из принятых тел -> пул; число пачек в обработке ограничено очередью _batches"""
+        loop = asyncio.get_running_loop()
+        while True:
+            if len(self._pending) < self.batch_size:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            if not self._pending:
+                continue
+            batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+            future = loop.run_in_executor(self._executor, process_batch, batch)
+            await self._batches.put((len(batch), future))
+
+    async def _writer(self) -> None:
+        """Результаты пачек (в порядке отправки) -> DurableQueue и dead-letter"""
+        loop = asyncio.get_running_loop()
+        while True:
+            size, future = await self._batches.get()
+            try:
+                accepted, rejected, stats = await future
+            except Exception:
+                self.stats['batch_errors'] += 1
+                self._in_pipeline -= size
+                continue
+            # Потребитель отстал: не пишем дальше, пока хвост очереди не сократится
+            while self.max_backlog_bytes and self.queue.backlog_bytes() > self.max_backlog_bytes:
+                self.stats['backlog_waits'] += 1
+                await asyncio.sleep(0.1)
+            await loop.run_in_executor(self._io_executor, self._persist, accepted, rejected)
+            self.stats.update(stats)
+            self.stats['batches'] += 1
+            self._in_pipeline -= size
+
+    def _persist(self, accepted: List[str], rejected: List[str]) -> None:
+        self.queue.append(accepted)
+        if rejected:
+            if self._dead_letter is None:
+                self._dead_letter = open(os.path.join(self.queue.directory, 'dead-letter.jsonl'), 'a', encoding='utf-8')
+            self._dead_letter.write('\n'.join(rejected) + '\n')
+            self._dead_letter.flush()
+
+    def _accept(self, body: bytes) -> bool:
+        """Тело в конвейер; False - очередь в памяти переполнена"""
+        if self._in_pipeline >= self.max_pending:
+            self.stats['rejected_busy'] += 1
+            return False
+        self._seq += 1
+        self._in_pipeline += 1
+        self._pending.append((self._seq, body.decode('utf-8', errors='replace')))
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    # ------------------------------------------------------------ HTTP
+
+    def _status_body(self) -> bytes:
+        info = dict(self.stats)
+        info.update({'in_pipeline': self._in_pipeline, 'backlog_bytes': self.queue.backlog_bytes()})
+        return json.dumps(info).encode('utf-8')
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                request_line, *header_lines = head.decode('latin-1').split('\r\n')
+                method, target, version = request_line.split(' ', 2)
+                headers = {}
+                for line in header_lines:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+
+                length = int(headers.get('content-length', 0))
+                if headers.get('transfer-encoding', '').lower() == 'chunked' or length > self.max_body:
+                    # Тело не читаем - соединение после ответа закрывается
+                    status, payload, keep_alive = 413, b'{"detail":"payload too large"}', False
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                    path = target.split('?', 1)[0]
+                    if method == 'GET' and path == '/health':
+                        status, payload = 200, self._status_body()
+                    elif self.path is not None and path != self.path:
+                        status, payload = 404, b'{"detail":"not found"}'
+                    elif method != 'POST':
+                        status, payload = 405, b'{"detail":"method not allowed"}'
+                    elif self._accept(body):
+                        status, payload = 200, _ACK_BODY
+                    else:
+                        status, payload = 503, b'{"detail":"busy"}'
+
+                self.stats[f'http_{status}'] += 1
+                extra = 'Retry-After: 1\r\n' if status == 503 else ''
+                writer.write((f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+                              f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n{extra}"
+                              f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n"
+                              ).encode('latin-1') + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError, ValueError):
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    # ------------------------------------------------------------ Запуск
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        workers = max(1, self.workers)
+        self._batches = asyncio.Queue(maxsize=workers * 2)
+        self._executor = self._create_executor()
+        self._io_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='webhook-queue')
+        self._tasks = [asyncio.create_task(self._batcher()), asyncio.create_task(self._writer())]
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, backlog=4096)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def drain(self, timeout: float = 30.0) -> bool:
+        """Дождаться записи всех принятых тел"""
+        deadline = time.monotonic() + timeout
+        while self._in_pipeline > 0 and time.monotonic() < deadline:
+            self._wakeup.set()
+            await asyncio.sleep(0.01)
+        return self._in_pipeline == 0
+
+    async def stop(self, drain_timeout: float = 30.0) -> None:
+        if self._server is not None:
+            self._server.close()
+            for task in list(self._connections):
+                task.cancel()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+        await self.drain(drain_timeout)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        if self._io_executor is not None:
+            self._io_executor.shutdown(wait=True)
+        self.queue.close()
+        if self._dead_letter is not None:
+            self._dead_letter.close()
+
+    def start_in_thread(self) -> 'WebhookIngestServer':
+        """Запуск в фоновом потоке со своим event loop"""
+        started = threading.Event()
+
+        def run() -> None:
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.start())
+            started.set()
+            try:
+                loop.run_forever()
+            finally:
+                loop.close()
+
+        self._thread = threading.Thread(target=run, name='webhook-ingest', daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop_thread(self) -> None:
+        if self._loop is not None and self._thread is not None:
+            asyncio.run_coroutine_threadsafe(self.stop(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Приём webhook AKOOL в долговременную очередь')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--path', help='Принимать POST только на этот путь (по умолчанию - на любой)')
+    parser.add_argument('--queue-dir', default='webhook_queue', help='Каталог очереди событий')
+    parser.add_argument('--client-id', default=os.getenv('AKOOL_CLIENT_ID', DEFAULT_CLIENT_ID))
+    parser.add_argument('--client-secret', default=os.getenv('AKOOL_CLIENT_SECRET', DEFAULT_CLIENT_SECRET))
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1, help='Процессов проверки/расшифровки (0 - один поток)')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Тел в одной пачке')
+    parser.add_argument('--flush-interval', type=float, default=DEFAULT_FLUSH_INTERVAL, help='Максимальное ожидание пачки, сек')
+    parser.add_argument('--max-pending', type=int, default=DEFAULT_MAX_PENDING, help='Необработанных тел до ответа 503')
+    parser.add_argument('--max-backlog-mb', type=int, default=DEFAULT_MAX_BACKLOG_BYTES // 1024 // 1024,
+                        help='Непрочитанный хвост очереди, после которого приём притормаживается')
+    parser.add_argument('--fsync', action='store_true', help='fsync после каждой пачки')
+    parser.add_argument('--no-verify', action='store_true', help='Не проверять подпись')
+    parser.add_argument('--consume', action='store_true', help='Вывести события из очереди и сдвинуть курсор')
+    parser.add_argument('--follow', action='store_true', help='С --consume: ждать новые события')
+    args = parser.parse_args()
+
+    queue = DurableQueue(args.queue_dir, fsync=args.fsync)
+    if args.consume:
+        try:
+            for event in queue.consume(follow=args.follow):
+                print(json.dumps(event, ensure_ascii=False))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    server = WebhookIngestServer(queue, args.host, args.port, args.client_id, args.client_secret,
+                                 workers=args.workers, verify=not args.no_verify, batch_size=args.batch_size,
+                                 flush_interval=args.flush_interval, max_pending=args.max_pending,
+                                 max_backlog_bytes=args.max_backlog_mb * 1024 * 1024, path=args.path)
+
+    async def serve() -> None:
+        await server.start()
+        print(f"🚀 Webhook ingest: {server.url} -> {os.path.abspath(args.queue_dir)}")
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):  # Windows
+                pass
+        try:
+            await stop.wait()
+        finally:
+            await server.stop()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    print(f"\n📊 Статистика: {dict(server.stats)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,10 @@ Extract JSON from AKOOL Webhook
 
 import base64
 import json
-import re
+
+from akool_key_sweep import find_json, score_candidates, xor_sweep
+from json_scan import scan_json
+from marker_scan import JSON_EDGE_MARKERS, MarkerMatcher, context
 
 def main():
     print("🔍 Extract JSON from AKOOL Webhook")
@@ -32,25 +35,12 @@ def main():
         data_bytes = base64.b64decode(data_encrypt)
         print(f"Data length: {len(data_bytes)} bytes")
         
-        # Конвертируем в hex для анализа
-        hex_data = data_bytes.hex()
-        print(f"Hex data: {hex_data[:100]}...")
-        
-        # Ищем JSON маркеры
-        json_markers = {
-            '7b': '{',  # {
-            '5b': '[',  # [
-            '22': '"',  # "
-            '766964656f': 'video',
-            '737461747573': 'status',
-            '7461736b': 'task'
-        }
+        print(f"Hex data: {data_bytes[:50].hex()}...")
         
+        # Ищем JSON маркеры прямо в байтах, позиции байтовые
         print("\n🔍 Поиск JSON маркеров:")
-        for hex_marker, char in json_markers.items():
-            pos = hex_data.find(hex_marker)
-            if pos != -1:
-                print(f"Found {char} ({hex_marker}) at position {pos}")
+        for char, pos in MarkerMatcher().first_positions(data_bytes).items():
+            print(f"Found {char} at byte {pos}")
         
         # Попробуем извлечь JSON разными способами
         print("\n🔍 Попытки извлечения JSON:")
@@ -61,29 +51,17 @@ def main():
                 text = data_bytes.decode(encoding, errors='ignore')
                 print(f"\n{encoding} encoding:")
                 print(f"Text: {text[:200]}...")
-                
-                # Ищем JSON объекты
-                json_patterns = [
-                    r'\{[^}]*\}',  # Простые объекты
-                    r'\{.*\}',     # Объекты с вложенностью
-                    r'\[.*\]',     # Массивы
-                ]
-                
-                for pattern in json_patterns:
-                    matches = re.findall(pattern, text, re.DOTALL)
-                    for match in matches:
-                        print(f"Found JSON pattern: {match[:100]}...")
-                        try:
-                            json_data = json.loads(match)
-                            print("✅ Valid JSON found:")
-                            print(json.dumps(json_data, indent=2))
-                            break
-                        except:
-                            pass
-                            
             except Exception as e:
                 print(f"❌ {encoding} encoding failed: {e}")
         
+        # Один линейный проход по байтам: все JSON значения с байтовыми смещениями
+        matches = scan_json(data_bytes)
+        if not matches:
+            print("\n❌ Валидный JSON в исходных байтах не найден")
+        for match in matches:
+            print(f"\n✅ Valid JSON found at bytes {match.offset}-{match.end}:")
+            print(json.dumps(match.value, indent=2, ensure_ascii=False))
+        
         # Способ 2: XOR с разными ключами и поиск JSON
         print("\n🔍 XOR + JSON поиск:")
         
@@ -95,67 +73,38 @@ def main():
             (timestamp + nonce).encode()
         ]
         
-        for i, key in enumerate(keys):
-            try:
-                decrypted = bytearray()
-                for j in range(len(data_bytes)):
-                    decrypted.append(data_bytes[j] ^ key[j % len(key)])
+        # XOR со всеми ключами за один проход, JSON ищем только у лучших кандидатов
+        try:
+            candidates = xor_sweep(data_bytes, keys)
+            scores = score_candidates(candidates)
+            top = set(sorted(range(len(keys)), key=lambda i: scores[i], reverse=True)[:3])
+            
+            for i, candidate in enumerate(candidates):
+                text = candidate.decode('utf-8', errors='ignore')
+                print(f"\nXOR key {i+1} (score {scores[i]:.3f}): {text[:100]}...")
                 
-                text = decrypted.decode('utf-8', errors='ignore')
-                print(f"\nXOR key {i+1}: {text[:100]}...")
+                if i not in top:
+                    continue
                 
-                # Ищем JSON в расшифрованном тексте
-                json_patterns = [
-                    r'\{[^}]*\}',
-                    r'\{.*\}',
-                    r'\[.*\]',
-                ]
-                
-                for pattern in json_patterns:
-                    matches = re.findall(pattern, text, re.DOTALL)
-                    for match in matches:
-                        print(f"Found JSON in XOR {i+1}: {match[:100]}...")
-                        try:
-                            json_data = json.loads(match)
-                            print("✅ Valid JSON found in XOR:")
-                            print(json.dumps(json_data, indent=2))
-                            break
-                        except:
-                            pass
-                            
-            except Exception as e:
-                print(f"❌ XOR key {i+1} failed: {e}")
+                json_data = find_json(text)
+                if json_data is not None:
+                    print("✅ Valid JSON found in XOR:")
+                    print(json.dumps(json_data, indent=2))
+                    
+        except Exception as e:
+            print(f"❌ XOR sweep failed: {e}")
         
         # Способ 3: Поиск по hex паттернам
         print("\n🔍 Hex pattern search:")
         
-        # Ищем возможные JSON строки в hex
-        hex_patterns = [
-            '7b22',  # {"
-            '227b',  # "{
-            '5b22',  # ["
-            '227d',  # "}
-            '227d',  # "}
-        ]
-        
-        for pattern in hex_patterns:
-            pos = hex_data.find(pattern)
-            if pos != -1:
-                print(f"Found hex pattern {pattern} at position {pos}")
-                
-                # Извлекаем окружающие данные
-                start = max(0, pos - 20)
-                end = min(len(hex_data), pos + 100)
-                context = hex_data[start:end]
-                print(f"Context: {context}")
-                
-                # Пробуем декодировать как hex
-                try:
-                    hex_bytes = bytes.fromhex(context)
-                    text = hex_bytes.decode('utf-8', errors='ignore')
-                    print(f"Decoded: {text}")
-                except:
-                    pass
+        # Возможные начала/концы JSON строк, все вхождения за один проход
+        for hit in MarkerMatcher(JSON_EDGE_MARKERS).iter_hits(data_bytes):
+            print(f"Found pattern {hit.name} ({hit.marker.hex()}) at byte {hit.offset}")
+            
+            # Окружающие байты: 10 до и 50 после
+            window = context(data_bytes, hit.offset, 10, 50)
+            print(f"Context: {window.hex()}")
+            print(f"Decoded: {window.decode('utf-8', errors='ignore')}")
 
     except Exception as e:
         print(f"❌ Общая ошибка: {e}")
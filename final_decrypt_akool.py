@@ -8,35 +8,23 @@ Final AKOOL Webhook Decryption
 
 import base64
 import json
-import re
-import hashlib
+import os
+
+from akool_webhook import DEFAULT_CLIENT_ID, DEFAULT_CLIENT_SECRET, get_cipher
+from akool_key_sweep import derive_candidate_keys, find_json, sweep_keys, xor_bytes
+from marker_scan import MarkerMatcher, context
 
 def try_decrypt(data_bytes, key, method_name):
     """Попытка расшифровки с одним ключом"""
     try:
-        decrypted = bytearray()
-        for i in range(len(data_bytes)):
-            decrypted.append(data_bytes[i] ^ key[i % len(key)])
-        
-        text = decrypted.decode('utf-8', errors='ignore')
+        text = xor_bytes(data_bytes, key).decode('utf-8', errors='ignore')
         
         # Ищем JSON в расшифрованном тексте
-        json_patterns = [
-            r'\{[^}]*\}',  # Простые объекты
-            r'\{.*\}',     # Объекты с вложенностью
-            r'\[.*\]',     # Массивы
-        ]
-        
-        for pattern in json_patterns:
-            matches = re.findall(pattern, text, re.DOTALL)
-            for match in matches:
-                try:
-                    json_data = json.loads(match)
-                    print(f"✅ {method_name} - Valid JSON found:")
-                    print(json.dumps(json_data, indent=2))
-                    return json_data
-                except:
-                    pass
+        json_data = find_json(text)
+        if json_data is not None:
+            print(f"✅ {method_name} - Valid JSON found:")
+            print(json.dumps(json_data, indent=2))
+            return json_data
         
         # Если JSON не найден, показываем первые 100 символов
         print(f"❌ {method_name} - No valid JSON found: {text[:100]}...")
@@ -69,51 +57,37 @@ def main():
         print(f"Data length: {len(data_bytes)} bytes")
         print()
         
-        # Создаем все возможные ключи
-        keys = []
-        
-        # Базовые ключи
-        keys.append(("Signature hex", bytes.fromhex(signature)))
-        keys.append(("Nonce hex", bytes.fromhex(nonce)))
-        keys.append(("Timestamp", timestamp.encode()))
-        
-        # Комбинированные ключи
-        keys.append(("Signature + Nonce", (signature + nonce).encode()))
-        keys.append(("Timestamp + Nonce", (timestamp + nonce).encode()))
-        keys.append(("Signature + Timestamp", (signature + timestamp).encode()))
+        # Сначала официальная схема AKOOL: AES-CBC, key = clientSecret, IV = clientId
+        client_id = os.getenv('AKOOL_CLIENT_ID', DEFAULT_CLIENT_ID)
+        client_secret = os.getenv('AKOOL_CLIENT_SECRET', DEFAULT_CLIENT_SECRET)
+        try:
+            json_data = get_cipher(client_id, client_secret).decrypt_json(data_encrypt)
+            print("✅ AES - Valid JSON found:")
+            print(json.dumps(json_data, indent=2))
+            print("\n🎯 Финальная расшифровка завершена!")
+            return
+        except (ImportError, ValueError) as e:
+            print(f"❌ AES - {e}, пробуем XOR ключи")
+            print()
         
-        # Hash ключи
-        keys.append(("SHA256(Signature)", hashlib.sha256(signature.encode()).digest()))
-        keys.append(("SHA256(Nonce)", hashlib.sha256(nonce.encode()).digest()))
-        keys.append(("SHA256(Timestamp)", hashlib.sha256(timestamp.encode()).digest()))
-        keys.append(("SHA256(Signature+Nonce)", hashlib.sha256((signature + nonce).encode()).digest()))
-        keys.append(("SHA256(Timestamp+Nonce)", hashlib.sha256((timestamp + nonce).encode()).digest()))
-        
-        # MD5 ключи
-        keys.append(("MD5(Signature)", hashlib.md5(signature.encode()).digest()))
-        keys.append(("MD5(Nonce)", hashlib.md5(nonce.encode()).digest()))
-        keys.append(("MD5(Timestamp)", hashlib.md5(timestamp.encode()).digest()))
-        
-        # Повторяющиеся ключи
-        keys.append(("Signature repeated", (signature * 10).encode()[:32]))
-        keys.append(("Nonce repeated", (nonce * 10).encode()[:32]))
-        keys.append(("Timestamp repeated", (timestamp * 10).encode()[:32]))
-        
-        # Ключи из hex
-        keys.append(("Signature hex repeated", (signature * 10).encode()[:32]))
-        keys.append(("Nonce hex repeated", (nonce * 10).encode()[:32]))
+        # Создаем все возможные ключи
+        keys = derive_candidate_keys(signature, timestamp, nonce)
         
         print("🔍 Пробуем все возможные ключи:")
         print("=" * 50)
         
+        # XOR со всеми ключами сразу, JSON ищем только у лучших кандидатов
         success = False
-        for method_name, key in keys:
-            print(f"\n🔑 {method_name}:")
-            result = try_decrypt(data_bytes, key, method_name)
-            if result:
+        for result in sweep_keys(data_bytes, keys, top_n=3):
+            method_name = result['method']
+            print(f"\n🔑 {method_name} (score {result['score']:.3f}):")
+            if result['json'] is not None:
                 success = True
+                print(f"✅ {method_name} - Valid JSON found:")
+                print(json.dumps(result['json'], indent=2))
                 print(f"🎉 УСПЕХ! Найден JSON с ключом: {method_name}")
                 break
+            print(f"❌ {method_name} - No valid JSON found: {result['text'][:100]}...")
         
         if not success:
             print("\n❌ Ни один ключ не сработал")
@@ -126,31 +100,11 @@ def main():
         print("\n🔍 Дополнительный анализ:")
         print("=" * 30)
         
-        # Анализ hex данных
-        hex_data = data_bytes.hex()
-        print(f"Hex data: {hex_data}")
-        
-        # Поиск паттернов
-        patterns = {
-            '7b': '{',
-            '5b': '[',
-            '22': '"',
-            '766964656f': 'video',
-            '737461747573': 'status',
-            '7461736b': 'task'
-        }
-        
+        # Поиск маркеров прямо в байтах (без hex копии), позиции байтовые
         print("\n🔍 Найденные паттерны:")
-        for hex_pattern, char in patterns.items():
-            pos = hex_data.find(hex_pattern)
-            if pos != -1:
-                print(f"  {char} ({hex_pattern}) at position {pos}")
-                
-                # Показываем контекст
-                start = max(0, pos - 20)
-                end = min(len(hex_data), pos + 40)
-                context = hex_data[start:end]
-                print(f"    Context: {context}")
+        for name, pos in MarkerMatcher().first_positions(data_bytes).items():
+            print(f"  {name} at byte {pos}")
+            print(f"    Context: {context(data_bytes, pos, 10, 20).hex()}")
 
     except Exception as e:
         print(f"❌ Общая ошибка: {e}")
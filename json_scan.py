@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+JSON Candidate Scanner
+Однопроходный поиск JSON значений в тексте или байтах
+
+Вместо каскада re.findall (r'\\{[^}]*\\}', r'\\{.*\\}', r'\\[.*\\]' с DOTALL)
+и json.loads для каждого совпадения JSONDecoder.raw_decode запускается
+только с позиций '{' и '['. Найденное значение сразу возвращается уже
+разобранным, а поиск продолжается с его конца, так что каждый байт
+входит не больше чем в одно найденное значение верхнего уровня.
+
+Позиции, после которых значение заведомо невозможно ('{' не перед '"'
+или '}'), отсекаются lookahead'ом в том же регулярном выражении, что ищет
+кандидатов. Остальные неудачи дешёвые: raw_decode останавливается на
+первом недопустимом символе. Декодеру передаётся окно текста от кандидата
+(удваивается, только если разбор дошёл до его края): JSONDecodeError
+считает номер строки по всему документу до позиции ошибки, и без окна
+каждая неудача стоила бы O(offset). Отдельный дорогой случай - глубокая вложенность
+('[[[[...', '{"a":{"a":...'), на которой декодер упирается в лимит
+рекурсии. Тогда вся область до парной скобки пропускается одним проходом,
+без повторных попыток с каждой вложенной позиции (значения внутри
+слишком глубокой структуры не извлекаются).
+
+Для bytes поиск идёт по latin-1 представлению (символ = байт), поэтому
+смещения в результатах - байтовые; значения с не-ASCII символами
+перечитываются из исходных байтов как UTF-8.
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+OPENERS = '{['
+# Начальное окно для raw_decode, символов
+DECODE_WINDOW = 256
+# Ошибка ближе к краю окна может быть следствием обрезки (литералы вроде -Infinity)
+_EDGE_MARGIN = 16
+
+_decoder = json.JSONDecoder()
+_BRACKETS = re.compile(r'[\[\]{}]')
+_opener_patterns: Dict[str, 're.Pattern[str]'] = {}
+# Кандидат отсекается без вызова декодера, если следующий символ не может продолжить значение
+_OPENER_REGEX = {
+    '{': r'\{(?=\s*["}])',
+    '[': r'\[(?=\s*[\]\[{"\-0-9tfnNI])',
+}
+
+
+class JsonMatch(NamedTuple):
+    """Найденное JSON значение: [offset, end) в исходных данных"""
+    offset: int
+    end: int
+    value: Any
+
+
+def _opener_pattern(openers: str) -> 're.Pattern[str]':
+    pattern = _opener_patterns.get(openers)
+    if pattern is None:
+        pattern = _opener_patterns[openers] = re.compile('|'.join(_OPENER_REGEX[opener] for opener in openers))
+    return pattern
+
+
+def _skip_nested(text: str, start: int) -> int:
+    """Позиция после парной скобки для start (строки не учитываются) или конец текста"""
+    depth = 0
+    for match in _BRACKETS.finditer(text, start):
+        depth += 1 if match.group() in '{[' else -1
+        if depth <= 0:
+            return match.end()
+    return len(text)
+
+
+def _decode_at(text: str, start: int) -> Tuple[Any, int]:
+    """raw_decode с позиции start в растущем окне; ошибки - как у raw_decode"""
+    decode = _decoder.raw_decode
+    window = DECODE_WINDOW
+    length = len(text)
+    while True:
+        stop = start + window
+        chunk = text[start:stop]
+        try:
+            value, end = decode(chunk)
+            return value, start + end
+        except json.JSONDecodeError as e:
+            truncated = stop < length
+            if not truncated or (e.pos < len(chunk) - _EDGE_MARGIN and not e.msg.startswith('Unterminated string')):
+                raise
+        window *= 2
+
+
+def scan_json(data: Union[str, bytes, bytearray, memoryview], first: bool = False,
+              openers: str = OPENERS, limit: Optional[int] = None) -> List[JsonMatch]:
+    """
+    Все валидные JSON значения верхнего уровня, начинающиеся с openers.
+
+    first=True - остановиться на первом найденном значении,
+    limit - не больше limit значений.
+    """
+    if isinstance(data, str):
+        raw = None
+        text = data
+    else:
+        raw = bytes(data)
+        text = raw.decode('latin-1')
+
+    pattern = _opener_pattern(openers)
+    if first:
+        limit = 1
+    results: List[JsonMatch] = []
+    pos = 0
+    while limit is None or len(results) < limit:
+        match = pattern.search(text, pos)
+        if match is None:
+            break
+        start = match.start()
+        try:
+            value, end = _decode_at(text, start)
+        except RecursionError:
+            pos = _skip_nested(text, start)
+            continue
+        except ValueError:
+            pos = start + 1
+            continue
+
+        if raw is not None and not text.isascii() and not text[start:end].isascii():
+            try:
+                value = json.loads(raw[start:end].decode('utf-8'))
+            except (UnicodeDecodeError, ValueError):
+                pos = start + 1
+                continue
+
+        results.append(JsonMatch(start, end, value))
+        pos = end
+    return results
+
+
+def first_json(data: Union[str, bytes, bytearray, memoryview]) -> Optional[Any]:
+    """
+    Первый валидный JSON: сначала объекты, затем массивы (как в старом каскаде).
+
+    Два прохода по тексту, оба линейные.
+    """
+    for opener in OPENERS:
+        found = scan_json(data, first=True, openers=opener)
+        if found:
+            return found[0].value
+    return None
+
+
+# ---------------------------------------------------------------- Самопроверка
+
+def _pathological_inputs(size: int) -> Dict[str, str]:
+    """Входы, на которых regex каскад и наивный перебор деградируют"""
+    return {
+        'open_braces': '{' * size,
+        'open_brackets': '[' * size,
+        'deep_valid': '[' * (size // 2) + ']' * (size // 2),
+        'deep_objects': '{"a":' * (size // 5),
+        'nested_unclosed_lists': '[1,' * (size // 3),
+        'unterminated_strings': '{"k":"' * (size // 6),
+        'noise_then_object': 'x{' * (size // 2) + '{"status":3}',
+        'many_objects': '{"a":1} ' * (size // 8),
+    }
+
+
+def _legacy_find(text: str) -> Optional[Any]:
+    """Старый каскад регулярных выражений - только для сравнения в самопроверке"""
+    for pattern in (r'\{[^}]*\}', r'\{.*\}', r'\[.*\]'):
+        for match in re.findall(pattern, text, re.DOTALL):
+            try:
+                return json.loads(match)
+            except ValueError:
+                pass
+    return None
+
+
+def _timed(func: Callable[[], Any]) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def self_check(size: int = 200_000, growth_limit: float = 8.0) -> Dict[str, Any]:
+    """
+    Время scan_json на патологических входах размера size/4 и size.
+
+    При линейной сложности время растёт примерно в 4 раза; growth_limit
+    с запасом отсекает квадратичное поведение (x16).
+    """
+    small = _pathological_inputs(size // 4)
+    large = _pathological_inputs(size)
+    report: Dict[str, Any] = {}
+    ok = True
+    for name, text in large.items():
+        small_time = min(_timed(lambda: scan_json(small[name])) for _ in range(3))
+        large_time = min(_timed(lambda: scan_json(text)) for _ in range(3))
+        # Совсем короткие замеры шумят, для них рост не проверяется
+        growth = large_time / small_time if small_time > 1e-4 else 1.0
+        passed = growth <= growth_limit
+        ok = ok and passed
+        report[name] = {'seconds': round(large_time, 5), 'growth_x4': round(growth, 2), 'passed': passed}
+
+    # Корректность: смещения, UTF-8 в bytes, приоритет объектов
+    payload = '{"status":3,"url":"видео.mp4"}'.encode('utf-8')
+    data = b'\x00\xff[7]' + payload + b'}}'
+    matches = scan_json(data)
+    checks = {
+        'byte_offsets': [(m.offset, m.end) for m in matches] == [(2, 5), (5, 5 + len(payload))],
+        'utf8_value': matches[-1].value == {'status': 3, 'url': 'видео.mp4'},
+        'objects_first': first_json(data) == {'status': 3, 'url': 'видео.mp4'},
+        'first_stops_early': len(scan_json('{"a":1}{"b":2}', first=True)) == 1,
+        'deep_skipped': scan_json('[' * 5000 + ']' * 5000 + '{"ok":1}')[-1].value == {'ok': 1},
+    }
+    ok = ok and all(checks.values())
+
+    legacy_size = min(size, 20_000)
+    legacy_text = '{' * legacy_size
+    report['legacy_regex_open_braces'] = {
+        'size': legacy_size,
+        'legacy_seconds': round(_timed(lambda: _legacy_find(legacy_text)), 5),
+        'scan_seconds': round(_timed(lambda: scan_json(legacy_text)), 5),
+    }
+    return {'ok': ok, 'size': size, 'cases': report, 'checks': checks}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Линейный поиск JSON в тексте и самопроверка на патологических входах')
+    parser.add_argument('file', nargs='?', help='Файл для поиска JSON (без аргумента - самопроверка)')
+    parser.add_argument('--size', type=int, default=200_000, help='Размер патологических входов')
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, 'rb') as f:
+            for match in scan_json(f.read()):
+                print(f"✅ [{match.offset}:{match.end}] {json.dumps(match.value, ensure_ascii=False)[:200]}")
+        return
+
+    print("🔍 JSON Scanner Self-Check")
+    print("==========================")
+    report = self_check(args.size)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if not report['ok']:
+        print("❌ Самопроверка не пройдена", file=sys.stderr)
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
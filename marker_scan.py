@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Byte Marker Scanner
+Поиск маркеров JSON/AKOOL сразу в байтах за один проход
+
+Раньше payload переводился в hex строку (вдвое больше исходных данных), и
+для каждого маркера вызывался отдельный hex_data.find - с возможными
+совпадениями на нечётном полубайте. MarkerMatcher компилирует все маркеры
+в одно регулярное выражение над bytes (альтернатива, длинные маркеры
+первыми) и ищет их напрямую в bytes/bytearray/memoryview/mmap. Позиции -
+байтовые, контекст берётся срезом исходного буфера.
+
+Большие дампы перехваченных payload'ов сканируются через mmap без чтения
+файла в память (scan_file), а потоки - кусками с перекрытием на длину
+самого длинного маркера (scan_stream).
+"""
+
+import argparse
+import io
+import json
+import mmap
+import os
+import random
+import re
+import sys
+import time
+from collections import Counter
+from typing import BinaryIO, Dict, Iterator, NamedTuple, Optional, Union
+
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+
+# Маркер -> имя (те же, что искались в hex: 7b, 5b, 22, video, status, task)
+DEFAULT_MARKERS: Dict[bytes, str] = {
+    b'{': '{',
+    b'[': '[',
+    b'"': '"',
+    b'video': 'video',
+    b'status': 'status',
+    b'task': 'task',
+}
+
+# Начала/концы JSON строк и объектов (бывшие hex паттерны 7b22, 227b, 5b22, 227d)
+JSON_EDGE_MARKERS: Dict[bytes, str] = {
+    b'{"': '{"',
+    b'"{': '"{',
+    b'["': '["',
+    b'"}': '"}',
+}
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+
+class MarkerHit(NamedTuple):
+    """Найденный маркер: байтовое смещение и имя"""
+    offset: int
+    marker: bytes
+    name: str
+
+
+class MarkerMatcher:
+    """
+    Множественный поиск маркеров одним проходом.
+
+    Совпадения не перекрываются: в каждой позиции берётся самый длинный
+    маркер, дальше поиск продолжается после него.
+    """
+
+    def __init__(self, markers: Optional[Dict[bytes, str]] = None):
+        self.markers = dict(markers or DEFAULT_MARKERS)
+        if not self.markers:
+            raise ValueError("Нужен хотя бы один маркер")
+        ordered = sorted(self.markers, key=len, reverse=True)
+        self.pattern = re.compile(b'|'.join(re.escape(marker) for marker in ordered))
+        self.max_len = len(ordered[0])
+
+    def iter_hits(self, data: Buffer, start: int = 0, end: Optional[int] = None,
+                  base_offset: int = 0) -> Iterator[MarkerHit]:
+        """Все вхождения по порядку; base_offset добавляется к позициям (для кусков потока)"""
+        markers = self.markers
+        make_hit = MarkerHit
+        end = len(data) if end is None else end
+        for match in self.pattern.finditer(data, start, end):
+            marker = match.group()
+            yield make_hit(base_offset + match.start(), marker, markers[marker])
+
+    def first_positions(self, data: Buffer) -> Dict[str, int]:
+        """
+        Первое вхождение каждого маркера.
+
+        Для bytes/bytearray/mmap это find на каждый маркер (memchr по исходным
+        байтам, без hex копии) - на коротких payload быстрее одного прохода
+        регулярным выражением; для memoryview - проход iter_hits до первого
+        вхождения всех маркеров.
+        """
+        if hasattr(data, 'find'):
+            found = {}
+            for marker, name in self.markers.items():
+                pos = data.find(marker)
+                if pos != -1 and (name not in found or pos < found[name]):
+                    found[name] = pos
+            return found
+
+        found: Dict[str, int] = {}
+        wanted = len(set(self.markers.values()))
+        for hit in self.iter_hits(data):
+            if hit.name not in found:
+                found[hit.name] = hit.offset
+                if len(found) == wanted:
+                    break
+        return found
+
+    def count(self, data: Buffer) -> Counter:
+        return Counter(hit.name for hit in self.iter_hits(data))
+
+
+def context(data: Buffer, offset: int, before: int = 10, after: int = 20) -> bytes:
+    """Окно байтов вокруг offset"""
+    return bytes(data[max(0, offset - before):min(len(data), offset + after)])
+
+
+def scan_stream(stream: BinaryIO, matcher: Optional[MarkerMatcher] = None,
+                chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[MarkerHit]:
+    """
+    Поиск в потоке кусками по chunk_size.
+
+    Хвост длиной max_len - 1 переносится в следующий кусок, чтобы не
+    терять маркеры на границе; совпадения в хвосте не повторяются.
+    """
+    matcher = matcher or MarkerMatcher()
+    overlap = matcher.max_len - 1
+    buffer = bytearray()
+    consumed = 0  # смещение начала buffer в потоке
+    while True:
+        chunk = stream.read(chunk_size)
+        buffer += chunk
+        final = not chunk
+        # Последние overlap байт ещё могут быть началом маркера из следующего куска
+        limit = len(buffer) if final else max(0, len(buffer) - overlap)
+        scan_to = limit
+        for hit in matcher.iter_hits(buffer, 0, len(buffer), consumed):
+            local = hit.offset - consumed
+            if local >= limit:
+                break
+            scan_to = max(scan_to, local + len(hit.marker))
+            yield hit
+        if final:
+            return
+        del buffer[:scan_to]
+        consumed += scan_to
+
+
+def scan_file(path: str, matcher: Optional[MarkerMatcher] = None) -> Iterator[MarkerHit]:
+    """Поиск в файле через mmap (файл не читается в память целиком)"""
+    matcher = matcher or MarkerMatcher()
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield from matcher.iter_hits(mapped)
+
+
+def hex_find_positions(data: bytes, markers: Dict[bytes, str] = DEFAULT_MARKERS) -> Dict[str, int]:
+    """Старый способ (hex + find на маркер), позиции пересчитаны в байты - для сравнения"""
+    hex_data = data.hex()
+    found = {}
+    for marker, name in markers.items():
+        pos = hex_data.find(marker.hex())
+        # Совпадение на нечётном полубайте - ложное, как и было в старом коде
+        if pos != -1:
+            found[name] = pos / 2
+    return found
+
+
+def benchmark(size: int = 64 * 1024 * 1024, seed: int = 42) -> Dict[str, float]:
+    """
+    Случайный дамп: все вхождения всех маркеров (matcher против hex + find
+    в цикле) и первые позиции на payload размером с webhook (как в скриптах).
+    """
+    rng = random.Random(seed)
+    data = bytearray(rng.getrandbits(8 * 4096).to_bytes(4096, 'little') * (size // 4096))
+    for _ in range(size // 65536):
+        position = rng.randrange(len(data) - 8)
+        data[position:position + 6] = b'status'
+    data = bytes(data)
+    matcher = MarkerMatcher()
+
+    start = time.perf_counter()
+    hits = sum(1 for _ in matcher.iter_hits(data))
+    matcher_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    hex_data = data.hex()
+    for marker in DEFAULT_MARKERS:
+        # Все вхождения, как у matcher
+        pos = hex_data.find(marker.hex())
+        while pos != -1:
+            pos = hex_data.find(marker.hex(), pos + 1)
+    hex_elapsed = time.perf_counter() - start
+
+    payloads = [bytes(rng.getrandbits(8) for _ in range(176)) for _ in range(2000)]
+    start = time.perf_counter()
+    for payload in payloads:
+        matcher.first_positions(payload)
+    first_elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    for payload in payloads:
+        hex_find_positions(payload)
+    hex_first_elapsed = time.perf_counter() - start
+
+    return {
+        'size_mb': size / 1024 / 1024,
+        'hits': hits,
+        'matcher_mb_per_sec': size / 1024 / 1024 / matcher_elapsed,
+        'hex_find_mb_per_sec': size / 1024 / 1024 / hex_elapsed,
+        'hex_extra_memory_mb': size * 2 / 1024 / 1024,
+        'first_positions_us': first_elapsed / len(payloads) * 1e6,
+        'hex_first_positions_us': hex_first_elapsed / len(payloads) * 1e6,
+    }
+
+
+def _self_check() -> Dict[str, bool]:
+    matcher = MarkerMatcher()
+    data = b'\x07\xb2{"status":3,"task_id":"a","video":"v"}'
+    hits = list(matcher.iter_hits(data))
+    # 0x07 0xb2 в hex дают '07b2' - старый поиск '7b' находил ложное совпадение на полубайте 1
+    stream_hits = list(scan_stream(io.BytesIO(data * 3), matcher, chunk_size=5))
+    return {
+        'byte_aligned': matcher.first_positions(data)['{'] == 2,
+        'hex_false_positive': hex_find_positions(data)['{'] == 0.5,
+        'longest_first': [hit.name for hit in hits if len(hit.marker) > 1] == ['status', 'task', 'video'],
+        'stream_matches_buffer': stream_hits == list(matcher.iter_hits(data * 3)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Поиск маркеров JSON/AKOOL в байтах и дампах')
+    parser.add_argument('files', nargs='*', help='Файлы с дампами payload (без аргументов - самопроверка и бенчмарк)')
+    parser.add_argument('--size-mb', type=int, default=64, help='Размер дампа для бенчмарка, МБ')
+    parser.add_argument('--show', type=int, default=20, help='Сколько совпадений показать на файл')
+    args = parser.parse_args()
+
+    if args.files:
+        matcher = MarkerMatcher()
+        for path in args.files:
+            counts: Counter = Counter()
+            print(f"📂 {path}")
+            for hit in scan_file(path, matcher):
+                counts[hit.name] += 1
+                if sum(counts.values()) <= args.show:
+                    print(f"  {hit.name!r} at byte {hit.offset}")
+            print(f"  Итого: {dict(counts)}")
+        return
+
+    print("🔍 Byte Marker Scanner")
+    print("======================")
+    checks = _self_check()
+    print(json.dumps({'checks': checks, 'benchmark': benchmark(args.size_mb * 1024 * 1024)}, indent=2))
+    if not all(checks.values()):
+        print("❌ Самопроверка не пройдена", file=sys.stderr)
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Pipeline DAG Runner
+Запуск шагов пайплайна по графу зависимостей
+
+Каждый шаг объявляет, от каких шагов зависит: requires - шаг должен
+завершиться успешно, after - только завершиться (результат не важен).
+Шаг стартует сразу, как только готовы его собственные зависимости, а
+независимые шаги выполняются параллельно в пуле потоков. Для каждого шага
+записывается время выполнения, для прогона - критический путь.
+"""
+
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+STAGE_SUCCESS = 'success'
+STAGE_FAILED = 'failed'
+STAGE_SKIPPED = 'skipped'
+STAGE_ERROR = 'error'
+
+
+class Stage:
+    """Описание шага пайплайна"""
+
+    def __init__(self, name: str, func: Callable[..., Any], requires: Iterable[str] = (),
+                 after: Iterable[str] = (), critical: bool = False,
+                 when: Optional[Callable[[], bool]] = None, pass_results: bool = False):
+        self.name = name
+        self.func = func
+        self.requires = tuple(requires)
+        self.after = tuple(after)
+        self.critical = critical
+        self.when = when
+        self.pass_results = pass_results
+
+    @property
+    def deps(self) -> Tuple[str, ...]:
+        return self.requires + self.after
+
+
+class PipelineResult:
+    """Итоги прогона: статусы, результаты, тайминги и критический путь"""
+
+    def __init__(self, stages: Dict[str, Stage]):
+        self.stages = stages
+        self.status: Dict[str, str] = {}
+        self.results: Dict[str, Any] = {}
+        self.errors: Dict[str, BaseException] = {}
+        self.timings: Dict[str, Tuple[float, float]] = {}
+        self.started_at = 0.0
+        self.finished_at = 0.0
+        self.aborted = False
+
+    def ok(self, name: str) -> bool:
+        return self.status.get(name) == STAGE_SUCCESS
+
+    @property
+    def wall_time(self) -> float:
+        return self.finished_at - self.started_at
+
+    def duration(self, name: str) -> float:
+        start, end = self.timings.get(name, (0.0, 0.0))
+        return end - start
+
+    @property
+    def critical_path(self) -> List[str]:
+        """Цепочка шагов, определившая общее время: от последнего шага назад по самой поздней зависимости"""
+        if not self.timings:
+            return []
+        name = max(self.timings, key=lambda n: self.timings[n][1])
+        path = [name]
+        while True:
+            deps = [dep for dep in self.stages[name].deps if dep in self.timings]
+            if not deps:
+                break
+            name = max(deps, key=lambda n: self.timings[n][1])
+            path.append(name)
+        return list(reversed(path))
+
+    @property
+    def critical_path_time(self) -> float:
+        return sum(self.duration(name) for name in self.critical_path)
+
+    def report(self) -> List[str]:
+        """Строки отчёта о прогоне"""
+        lines = []
+        for name in self.stages:
+            status = self.status.get(name, STAGE_SKIPPED)
+            if name in self.timings:
+                start, end = self.timings[name]
+                lines.append(f"{name}: {status} ({end - start:.2f} сек, старт +{start - self.started_at:.2f} сек)")
+            else:
+                lines.append(f"{name}: {status}")
+        lines.append(f"Общее время: {self.wall_time:.2f} сек")
+        lines.append(f"Критический путь: {' -> '.join(self.critical_path)} ({self.critical_path_time:.2f} сек)")
+        return lines
+
+
+class PipelineRunner:
+    """Исполнитель графа шагов"""
+
+    def __init__(self, max_workers: int = 4,
+                 on_event: Optional[Callable[[str, str, PipelineResult], None]] = None):
+        self.max_workers = max_workers
+        self.on_event = on_event
+        self.stages: Dict[str, Stage] = {}
+
+    def add_stage(self, name: str, func: Callable[..., Any], requires: Iterable[str] = (),
+                  after: Iterable[str] = (), critical: bool = False,
+                  when: Optional[Callable[[], bool]] = None, pass_results: bool = False) -> 'PipelineRunner':
+        """
+        Добавить шаг.
+
+        func возвращает результат шага; False/None считается неудачей.
+        pass_results=True - func получает dict результатов своих зависимостей.
+        """
+        if name in self.stages:
+            raise ValueError(f"Шаг {name} уже добавлен")
+        for dep in tuple(requires) + tuple(after):
+            if dep not in self.stages:
+                raise ValueError(f"Шаг {name} зависит от неизвестного шага {dep}")
+        self.stages[name] = Stage(name, func, requires, after, critical, when, pass_results)
+        return self
+
+    def _emit(self, event: str, name: str, result: PipelineResult) -> None:
+        if self.on_event is not None:
+            self.on_event(event, name, result)
+
+    def _run_stage(self, stage: Stage, result: PipelineResult) -> Any:
+        start = time.perf_counter()
+        try:
+            if stage.pass_results:
+                return stage.func({dep: result.results.get(dep) for dep in stage.deps})
+            return stage.func()
+        finally:
+            result.timings[stage.name] = (start, time.perf_counter())
+
+    def run(self) -> PipelineResult:
+        """Выполнить все шаги; возвращает PipelineResult"""
+        result = PipelineResult(self.stages)
+        result.started_at = time.perf_counter()
+        remaining = dict(self.stages)
+        running = {}
+
+        def ready(stage: Stage) -> bool:
+            return all(dep in result.status for dep in stage.deps)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='pipeline') as pool:
+            while remaining or running:
+                if not result.aborted:
+                    for name, stage in list(remaining.items()):
+                        if not ready(stage):
+                            continue
+                        del remaining[name]
+                        if any(result.status[dep] != STAGE_SUCCESS for dep in stage.requires):
+                            result.status[name] = STAGE_SKIPPED
+                            self._emit('skipped', name, result)
+                            continue
+                        if stage.when is not None and not stage.when():
+                            result.status[name] = STAGE_SKIPPED
+                            self._emit('skipped', name, result)
+                            continue
+                        self._emit('started', name, result)
+                        running[pool.submit(self._run_stage, stage, result)] = stage
+
+                    # Новые статусы skipped могли сделать готовыми другие шаги
+                    if any(ready(stage) for stage in remaining.values()):
+                        continue
+                elif remaining:
+                    for name in remaining:
+                        result.status[name] = STAGE_SKIPPED
+                    remaining.clear()
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    try:
+                        value = future.result()
+                        result.results[stage.name] = value
+                        status = STAGE_FAILED if value is False or value is None else STAGE_SUCCESS
+                    except Exception as e:
+                        result.errors[stage.name] = e
+                        status = STAGE_ERROR
+                    result.status[stage.name] = status
+                    self._emit(status, stage.name, result)
+                    if status != STAGE_SUCCESS and stage.critical:
+                        result.aborted = True
+
+        result.finished_at = time.perf_counter()
+        return result
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+AKOOL Webhook Replay
+Массовая офлайн обработка захваченных webhook'ов AKOOL из JSONL/NDJSON
+
+Файл читается построчно, строки группируются в чанки и раздаются в
+ProcessPoolExecutor. Количество чанков "в полёте" ограничено, поэтому
+память не растёт с размером входного файла; результаты пишутся в выходной
+JSONL в исходном порядке.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from akool_webhook import (
+    DEFAULT_CLIENT_ID,
+    DEFAULT_CLIENT_SECRET,
+    AkoolDecryptError,
+    SignatureVerifier,
+    get_cipher,
+)
+
+# Настройки воркера (заполняются в initializer пула)
+_worker_config: Dict[str, Any] = {}
+
+
+def _init_worker(client_id: str, client_secret: str, verify: bool) -> None:
+    """Инициализация процесса: один AES контекст на весь воркер"""
+    _worker_config['verifier'] = SignatureVerifier(client_id)
+    _worker_config['cipher'] = get_cipher(client_id, client_secret)
+    _worker_config['verify'] = verify
+
+
+def process_record(line_no: int, line: str) -> Tuple[str, str]:
+    """Обработка одной строки: (статус, JSON строка результата)"""
+    try:
+        record = json.loads(line)
+        body = record.get('body', record) if isinstance(record, dict) else None
+        if isinstance(body, str):
+            body = json.loads(body)
+        if not isinstance(body, dict) or 'dataEncrypt' not in body:
+            raise KeyError('dataEncrypt')
+    except (ValueError, KeyError) as e:
+        return 'parse_error', json.dumps({'line': line_no, 'ok': False, 'error': f'parse: {e}'})
+
+    if _worker_config['verify']:
+        try:
+            valid = _worker_config['verifier'].verify(body['timestamp'], body['nonce'], body['dataEncrypt'], body['signature'])
+        except KeyError:
+            valid = False
+        if not valid:
+            return 'invalid_signature', json.dumps({'line': line_no, 'ok': False, 'error': 'invalid signature'})
+
+    try:
+        data = _worker_config['cipher'].decrypt_json(body['dataEncrypt'])
+    except (AkoolDecryptError, ValueError) as e:
+        return 'decrypt_error', json.dumps({'line': line_no, 'ok': False, 'error': f'decrypt: {e}'})
+
+    return 'ok', json.dumps({'line': line_no, 'ok': True, 'data': data}, ensure_ascii=False)
+
+
+def process_chunk(chunk: List[Tuple[int, str]]) -> Tuple[List[str], Dict[str, int]]:
+    """Обработка чанка строк в воркере"""
+    lines = []
+    stats: Dict[str, int] = {}
+    for line_no, line in chunk:
+        status, result = process_record(line_no, line)
+        stats[status] = stats.get(status, 0) + 1
+        lines.append(result)
+    return lines, stats
+
+
+def read_chunks(stream: Iterable[str], chunk_size: int) -> Iterator[List[Tuple[int, str]]]:
+    """Построчное чтение входа чанками, пустые строки пропускаются"""
+    numbered = ((no, line) for no, line in enumerate(stream, 1) if line.strip())
+    while True:
+        chunk = list(itertools.islice(numbered, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def replay(input_stream: Iterable[str], output_stream, client_id: str, client_secret: str,
+           workers: int = 0, chunk_size: int = 1000, max_in_flight: Optional[int] = None,
+           verify: bool = True) -> Dict[str, int]:
+    """
+    Прогон всех записей из input_stream, результаты - в output_stream.
+
+    workers=0 - обработка в текущем процессе (удобно для отладки).
+    """
+    totals: Dict[str, int] = {'total': 0}
+
+    def write(result: Tuple[List[str], Dict[str, int]]) -> None:
+        lines, stats = result
+        if lines:
+            output_stream.write('\n'.join(lines) + '\n')
+        for status, count in stats.items():
+            totals[status] = totals.get(status, 0) + count
+            totals['total'] += count
+
+    if workers <= 0:
+        _init_worker(client_id, client_secret, verify)
+        for chunk in read_chunks(input_stream, chunk_size):
+            write(process_chunk(chunk))
+        return totals
+
+    max_in_flight = max_in_flight or workers * 2
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(client_id, client_secret, verify)) as pool:
+        for chunk in read_chunks(input_stream, chunk_size):
+            if len(pending) >= max_in_flight:
+                write(pending.popleft().result())
+            pending.append(pool.submit(process_chunk, chunk))
+        while pending:
+            write(pending.popleft().result())
+
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Офлайн повтор webhook данных AKOOL из JSONL')
+    parser.add_argument('input', help='JSONL/NDJSON с телами webhook ("-" для stdin)')
+    parser.add_argument('-o', '--output', default='-', help='Выходной JSONL ("-" для stdout)')
+    parser.add_argument('--client-id', default=os.getenv('AKOOL_CLIENT_ID', DEFAULT_CLIENT_ID))
+    parser.add_argument('--client-secret', default=os.getenv('AKOOL_CLIENT_SECRET', DEFAULT_CLIENT_SECRET))
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1, help='Процессов в пуле (0 - без пула)')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='Строк в одном чанке')
+    parser.add_argument('--max-in-flight', type=int, help='Максимум чанков в обработке (по умолчанию 2 x workers)')
+    parser.add_argument('--no-verify', action='store_true', help='Не проверять подпись')
+    args = parser.parse_args()
+
+    input_stream = sys.stdin if args.input == '-' else open(args.input, 'r', encoding='utf-8')
+    output_stream = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+
+    start = time.perf_counter()
+    try:
+        totals = replay(input_stream, output_stream, args.client_id, args.client_secret,
+                        workers=args.workers, chunk_size=args.chunk_size,
+                        max_in_flight=args.max_in_flight, verify=not args.no_verify)
+    finally:
+        if input_stream is not sys.stdin:
+            input_stream.close()
+        if output_stream is not sys.stdout:
+            output_stream.close()
+    elapsed = time.perf_counter() - start
+
+    totals['records_per_sec'] = int(totals['total'] / elapsed) if elapsed else 0
+    print(f"📊 Replay: {json.dumps(totals)}", file=sys.stderr)
+    if totals.get('ok', 0) != totals['total']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
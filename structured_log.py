@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Structured Logging
+Неблокирующее ленивое логирование в JSON-lines для диагностических скриптов
+
+Потоки запросов только кладут LogRecord в очередь (QueueHandler), а
+форматирование и запись в консоль/файл выполняет фоновый QueueListener.
+Сообщение форматируется лишь при реальной записи: уровень проверяется до
+создания записи, аргументы подставляются в потоке слушателя. Тела ответов
+передаются как LazyBody и обрезаются до max_body символов только при
+выводе. Высокочастотные DEBUG события прореживаются (DebugSampler).
+
+В файл пишется JSON-lines (одна запись - один JSON объект с полями события),
+в консоль - цветные строки [LEVEL] message, как раньше.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+DEFAULT_MAX_BODY = 2048
+# DEBUG событие с одним шаблоном: первые N пишутся всегда, дальше каждое sample_every-е
+DEFAULT_DEBUG_ALWAYS = 20
+DEFAULT_DEBUG_SAMPLE_EVERY = 10
+
+# Теги self.log(...) -> уровни logging
+TAG_LEVELS = {
+    "DEBUG": logging.DEBUG,
+    "INFO": logging.INFO,
+    "INFO_SPECIAL": logging.INFO,
+    "SUCCESS": logging.INFO,
+    "WARNING": logging.WARNING,
+    "ERROR": logging.ERROR,
+}
+
+TAG_COLORS = {
+    "INFO": '\033[0;34m',
+    "SUCCESS": '\033[0;32m',
+    "ERROR": '\033[0;31m',
+    "WARNING": '\033[1;33m',
+    "DEBUG": '\033[0;36m',
+    "INFO_SPECIAL": '\033[0;35m',
+}
+COLOR_RESET = '\033[0m'
+
+
+def truncate_body(text: str, limit: int = DEFAULT_MAX_BODY) -> str:
+    if limit and len(text) > limit:
+        return f"{text[:limit]}... (+{len(text) - limit} симв.)"
+    return text
+
+
+class LazyBody:
+    """
+    Тело ответа, которое читается и обрезается только при выводе записи.
+
+    Принимает requests/httpx Response (берётся .text) или любое значение.
+    """
+
+    __slots__ = ('value', 'limit')
+
+    def __init__(self, value: Any, limit: int = DEFAULT_MAX_BODY):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self) -> str:
+        value = self.value
+        text = value.text if hasattr(value, 'text') and hasattr(value, 'status_code') else str(value)
+        return truncate_body(text, self.limit)
+
+    __repr__ = __str__
+
+
+class DebugSampler:
+    """Прореживание DEBUG событий по шаблону сообщения"""
+
+    def __init__(self, always: int = DEFAULT_DEBUG_ALWAYS, sample_every: int = DEFAULT_DEBUG_SAMPLE_EVERY):
+        self.always = always
+        self.sample_every = max(1, sample_every)
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key: str) -> int:
+        """0 - пропустить событие, иначе порядковый номер события с этим шаблоном"""
+        with self._lock:
+            count = self._counts.get(key, 0) + 1
+            self._counts[key] = count
+        if count <= self.always or count % self.sample_every == 0:
+            return count
+        return 0
+
+
+class _LazyQueueHandler(QueueHandler):
+    """QueueHandler без форматирования в вызывающем потоке"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        if record.exc_info:
+            # traceback сериализуем сразу: к моменту записи исключение уже обработано
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class ConsoleFormatter(logging.Formatter):
+    """Цветная строка [TAG] message"""
+
+    def __init__(self, colors: bool = True):
+        super().__init__()
+        self.colors = colors
+
+    def format(self, record: logging.LogRecord) -> str:
+        tag = getattr(record, 'tag', None) or record.levelname
+        message = record.getMessage()
+        if record.exc_text:
+            message = f"{message}\n{record.exc_text}"
+        if not self.colors:
+            return f"[{tag}] {message}"
+        return f"{TAG_COLORS.get(tag, COLOR_RESET)}[{tag}]{COLOR_RESET} {message}"
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Одна запись - один JSON объект"""
+
+    def __init__(self, max_body: int = DEFAULT_MAX_BODY):
+        super().__init__()
+        self.max_body = max_body
+
+    def format(self, record: logging.LogRecord) -> str:
+        event = {
+            'ts': round(record.created, 6),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)),
+            'level': record.levelname,
+            'tag': getattr(record, 'tag', None) or record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'msg': truncate_body(record.getMessage(), self.max_body * 2),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            for key, value in fields.items():
+                event[key] = value if isinstance(value, (int, float, bool, type(None))) else truncate_body(str(value), self.max_body)
+        if getattr(record, 'sampled', None):
+            event['sample_seq'] = record.sampled
+        if record.exc_text:
+            event['exc'] = record.exc_text
+        return json.dumps(event, ensure_ascii=False, default=str)
+
+
+_state: Dict[str, Any] = {'listener': None, 'handlers': [], 'files': set(), 'sampler': DebugSampler()}
+_state_lock = threading.Lock()
+
+
+def setup_logging(log_file: Optional[str] = None, level: int = logging.INFO,
+                  console: bool = True, max_body: int = DEFAULT_MAX_BODY,
+                  debug_always: int = DEFAULT_DEBUG_ALWAYS,
+                  debug_sample_every: int = DEFAULT_DEBUG_SAMPLE_EVERY) -> QueueListener:
+    """
+    Root logger -> очередь -> фоновый слушатель (консоль + JSON-lines файл).
+
+    Повторный вызов с другим файлом добавляет его к уже работающему слушателю.
+    """
+    with _state_lock:
+        listener = _state['listener']
+        if listener is not None and (log_file is None or log_file in _state['files']):
+            return listener
+
+        handlers = list(_state['handlers'])
+        if listener is None:
+            if console:
+                console_handler = logging.StreamHandler(sys.stdout)
+                console_handler.setFormatter(ConsoleFormatter(colors=sys.stdout.isatty()))
+                handlers.append(console_handler)
+            _state['sampler'] = DebugSampler(debug_always, debug_sample_every)
+        else:
+            listener.stop()
+        if log_file:
+            file_handler = logging.FileHandler(log_file, encoding='utf-8')
+            file_handler.setFormatter(JsonLinesFormatter(max_body))
+            handlers.append(file_handler)
+            _state['files'].add(log_file)
+
+        if listener is None:
+            log_queue: 'queue.SimpleQueue[logging.LogRecord]' = queue.SimpleQueue()
+            root = logging.getLogger()
+            for handler in list(root.handlers):
+                root.removeHandler(handler)
+            root.addHandler(_LazyQueueHandler(log_queue))
+            root.setLevel(level)
+            listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+            atexit.register(shutdown_logging)
+        else:
+            listener = QueueListener(listener.queue, *handlers, respect_handler_level=True)
+
+        listener.start()
+        _state['listener'] = listener
+        _state['handlers'] = handlers
+        return listener
+
+
+def shutdown_logging() -> None:
+    """Дописать очередь и остановить слушатель"""
+    with _state_lock:
+        listener = _state['listener']
+        if listener is not None and listener._thread is not None:
+            listener.stop()
+        for handler in _state['handlers']:
+            handler.flush()
+
+
+def log_event(logger: logging.Logger, tag: str, message: str, *args: Any, **fields: Any) -> None:
+    """
+    Ленивое событие: message - шаблон с %s, args подставляются при записи.
+
+    fields попадают в JSON-lines запись отдельными полями.
+    """
+    level = TAG_LEVELS.get(tag, logging.INFO)
+    if not logger.isEnabledFor(level):
+        return
+    sampled = 0
+    if level == logging.DEBUG:
+        sampled = _state['sampler'].allow(message)
+        if not sampled:
+            return
+    logger.log(level, message, *args, extra={'tag': tag, 'fields': fields, 'sampled': sampled})
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Synthetic Media Generator
+Генерация тестовых WAV/PNG/JPEG реалистичного размера для нагрузочных прогонов
+
+WAV: любая длительность, частота дискретизации и число каналов; тон, шум
+или тишина. Сэмплы считаются блоками (NumPy, иначе array с повторением
+одного периода), без Python цикла по сэмплам, и пишутся через memoryview,
+так что память не зависит от длительности.
+
+PNG собирается вручную через zlib построчно. JPEG кодируется через PIL,
+если он установлен; без PIL - минимальный baseline JPEG (равномерно серое
+изображение нужного разрешения).
+
+MediaPool хранит сгенерированные файлы по ключу из параметров генерации,
+повторные прогоны берут готовые файлы.
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from array import array
+from typing import Any, BinaryIO, Callable, Dict, Iterator, Optional
+
+try:
+    import numpy as np
+except ImportError:  # NumPy опционален, есть запасной путь на array
+    np = None
+
+try:
+    from PIL import Image
+except ImportError:  # без PIL - минимальный JPEG кодировщик
+    Image = None
+
+# Меняется при изменении алгоритмов, чтобы пул не отдавал старые файлы
+GENERATOR_VERSION = 1
+
+DEFAULT_POOL_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'airshorts', 'media')
+
+AUDIO_TONE = 'tone'
+AUDIO_NOISE = 'noise'
+AUDIO_SILENCE = 'silence'
+
+IMAGE_GRADIENT = 'gradient'
+IMAGE_NOISE = 'noise'
+IMAGE_SOLID = 'solid'
+
+SAMPLE_WIDTH = 2  # 16-bit PCM
+INT16_MAX = 32767
+
+
+# ---------------------------------------------------------------- WAV
+
+def wav_header(frames: int, sample_rate: int, channels: int) -> bytes:
+    """44-байтный заголовок PCM WAV"""
+    data_size = frames * channels * SAMPLE_WIDTH
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + data_size, b'WAVE',
+        b'fmt ', 16, 1, channels, sample_rate,
+        sample_rate * channels * SAMPLE_WIDTH, channels * SAMPLE_WIDTH, SAMPLE_WIDTH * 8,
+        b'data', data_size
+    )
+
+
+def _interleave(mono: bytes, channels: int) -> bytes:
+    """Один и тот же сигнал во все каналы (срезы bytearray, цикл только по каналам)"""
+    if channels == 1:
+        return mono
+    out = bytearray(len(mono) * channels)
+    step = SAMPLE_WIDTH * channels
+    for channel in range(channels):
+        offset = channel * SAMPLE_WIDTH
+        out[offset::step] = mono[0::2]
+        out[offset + 1::step] = mono[1::2]
+    return bytes(out)
+
+
+class _SampleSource:
+    """Блоки моно сэмплов int16 little-endian с непрерывной фазой между блоками"""
+
+    def __init__(self, kind: str, sample_rate: int, frequency: float, amplitude: float, seed: int):
+        if kind not in (AUDIO_TONE, AUDIO_NOISE, AUDIO_SILENCE):
+            raise ValueError(f"Неизвестный тип аудио: {kind}")
+        self.kind = kind
+        self.sample_rate = sample_rate
+        self.frequency = frequency
+        self.amplitude = max(0.0, min(1.0, amplitude))
+        self._position = 0
+        if np is not None:
+            self._rng = np.random.default_rng(seed)
+        else:
+            self._random = random.Random(seed)
+            if kind == AUDIO_TONE:
+                # Один период тона; блоки собираются его повторением
+                period = max(2, int(round(sample_rate / frequency)))
+                scale = self.amplitude * INT16_MAX
+                self._period = array('h', (int(scale * math.sin(2 * math.pi * i / period)) for i in range(period)))
+                if sys.byteorder == 'big':
+                    self._period.byteswap()
+
+    def block(self, frames: int) -> bytes:
+        start = self._position
+        self._position += frames
+
+        if self.kind == AUDIO_SILENCE:
+            return bytes(frames * SAMPLE_WIDTH)
+
+        if np is not None:
+            if self.kind == AUDIO_TONE:
+                phase = np.arange(start, start + frames, dtype=np.float64) * (2 * np.pi * self.frequency / self.sample_rate)
+                samples = np.sin(phase) * (self.amplitude * INT16_MAX)
+            else:
+                # Гауссов шум, amplitude ~ 3 сигмы
+                samples = np.clip(self._rng.standard_normal(frames) * (self.amplitude * INT16_MAX / 3),
+                                  -INT16_MAX, INT16_MAX)
+            return samples.astype('<i2').tobytes()
+
+        if self.kind == AUDIO_TONE:
+            period = len(self._period)
+            offset = start % period
+            repeated = self._period * ((offset + frames) // period + 1)
+            return repeated[offset:offset + frames].tobytes()
+        # Без NumPy шум равномерный на полной шкале
+        return self._random.randbytes(frames * SAMPLE_WIDTH)
+
+
+def write_wav(f: BinaryIO, duration: float, sample_rate: int = 44100, channels: int = 1,
+              kind: str = AUDIO_TONE, frequency: float = 440.0, amplitude: float = 0.5,
+              seed: int = 0, block_frames: Optional[int] = None) -> int:
+    """Записать WAV в файловый объект блоками; возвращает число байт"""
+    frames = int(round(duration * sample_rate))
+    block_frames = block_frames or sample_rate
+    source = _SampleSource(kind, sample_rate, frequency, amplitude, seed)
+
+    header = wav_header(frames, sample_rate, channels)
+    f.write(header)
+    written = len(header)
+    remaining = frames
+    while remaining > 0:
+        count = min(block_frames, remaining)
+        data = memoryview(_interleave(source.block(count), channels))
+        f.write(data)
+        written += len(data)
+        remaining -= count
+    return written
+
+
+def make_wav(duration: float, **spec: Any) -> bytes:
+    """WAV целиком в памяти (для небольших файлов)"""
+    buffer = io.BytesIO()
+    write_wav(buffer, duration, **spec)
+    return buffer.getvalue()
+
+
+# ---------------------------------------------------------------- Изображения
+
+def _rgb_rows(width: int, height: int, pattern: str, seed: int,
+              color: tuple = (128, 128, 128)) -> Iterator[bytes]:
+    """Строки RGB; пиксели собираются срезами bytes, цикл только по строкам"""
+    if pattern == IMAGE_SOLID:
+        row = bytes(color) * width
+        for _ in range(height):
+            yield row
+    elif pattern == IMAGE_GRADIENT:
+        red = bytes(x * 255 // max(1, width - 1) for x in range(width))
+        blue = bytes([color[2]]) * width
+        row = bytearray(width * 3)
+        row[0::3] = red
+        row[2::3] = blue
+        for y in range(height):
+            row[1::3] = bytes([y * 255 // max(1, height - 1)]) * width
+            yield bytes(row)
+    elif pattern == IMAGE_NOISE:
+        rnd = random.Random(seed)
+        for _ in range(height):
+            yield rnd.randbytes(width * 3)
+    else:
+        raise ValueError(f"Неизвестный шаблон изображения: {pattern}")
+
+
+def _png_chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+
+def write_png(f: BinaryIO, width: int, height: int, pattern: str = IMAGE_GRADIENT,
+              seed: int = 0, level: int = 6) -> int:
+    """PNG (RGB, 8 бит) построчно через zlib.compressobj; возвращает число байт"""
+    written = f.write(b'\x89PNG\r\n\x1a\n')
+    written += f.write(_png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+
+    compressor = zlib.compressobj(level)
+    parts = []
+    pending = 0
+    for row in _rgb_rows(width, height, pattern, seed):
+        chunk = compressor.compress(b'\x00' + row)
+        if chunk:
+            parts.append(chunk)
+            pending += len(chunk)
+        # IDAT чанками ~1 МБ, чтобы не держать всё изображение в памяти
+        if pending >= 1 << 20:
+            written += f.write(_png_chunk(b'IDAT', b''.join(parts)))
+            parts, pending = [], 0
+    parts.append(compressor.flush())
+    written += f.write(_png_chunk(b'IDAT', b''.join(parts)))
+    written += f.write(_png_chunk(b'IEND', b''))
+    return written
+
+
+def _minimal_jpeg(width: int, height: int) -> bytes:
+    """
+    Baseline JPEG без PIL: одна компонента, у каждого блока 8x8 только DC=0
+    (серый 128). Huffman таблицы из одного кода '0', поэтому блок - это два
+    нулевых бита и поток данных собирается без цикла по блокам.
+    """
+    def segment(marker: int, payload: bytes) -> bytes:
+        return struct.pack('>HH', 0xFF00 | marker, len(payload) + 2) + payload
+
+    single_code = bytes([1] + [0] * 15)
+    blocks = ((width + 7) // 8) * ((height + 7) // 8)
+    bits = blocks * 2
+    scan = bytearray((bits + 7) // 8)
+    padding = len(scan) * 8 - bits
+    if padding:
+        scan[-1] = (1 << padding) - 1
+
+    return b''.join([
+        b'\xFF\xD8',
+        segment(0xDB, b'\x00' + bytes([1]) * 64),
+        segment(0xC0, struct.pack('>BHHB', 8, height, width, 1) + b'\x01\x11\x00'),
+        segment(0xC4, b'\x00' + single_code + b'\x00'),
+        segment(0xC4, b'\x10' + single_code + b'\x00'),
+        segment(0xDA, b'\x01\x01\x00\x00\x3F\x00'),
+        bytes(scan),
+        b'\xFF\xD9',
+    ])
+
+
+def write_jpeg(f: BinaryIO, width: int, height: int, pattern: str = IMAGE_GRADIENT,
+               seed: int = 0, quality: int = 85) -> int:
+    """JPEG через PIL; без PIL - минимальный серый JPEG того же разрешения"""
+    if Image is None:
+        return f.write(_minimal_jpeg(width, height))
+    image = Image.frombytes('RGB', (width, height), b''.join(_rgb_rows(width, height, pattern, seed)))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=quality)
+    return f.write(buffer.getbuffer())
+
+
+def jpeg_backend() -> str:
+    return 'pil' if Image is not None else 'minimal'
+
+
+# ---------------------------------------------------------------- Пул
+
+class MediaPool:
+    """Сгенерированные файлы по ключу SHA-256 от параметров генерации"""
+
+    def __init__(self, pool_dir: Optional[str] = None):
+        self.pool_dir = pool_dir or os.getenv('SYNTHETIC_MEDIA_DIR', DEFAULT_POOL_DIR)
+        os.makedirs(self.pool_dir, exist_ok=True)
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _path(self, extension: str, spec: Dict[str, Any]) -> str:
+        raw = json.dumps([GENERATOR_VERSION, extension, spec], sort_keys=True)
+        return os.path.join(self.pool_dir, hashlib.sha256(raw.encode('utf-8')).hexdigest() + extension)
+
+    def get(self, extension: str, spec: Dict[str, Any], generate: Callable[[BinaryIO], int]) -> str:
+        """Путь к файлу; генерирует его атомарно, если в пуле ещё нет"""
+        path = self._path(extension, spec)
+        if os.path.exists(path):
+            return path
+        with self._locks_guard:
+            lock = self._locks.setdefault(path, threading.Lock())
+        with lock:
+            if os.path.exists(path):
+                return path
+            fd, tmp_path = tempfile.mkstemp(dir=self.pool_dir, prefix='.media_')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    generate(f)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+        return path
+
+    def wav(self, duration: float, sample_rate: int = 44100, channels: int = 1,
+            kind: str = AUDIO_TONE, frequency: float = 440.0, amplitude: float = 0.5,
+            seed: int = 0) -> str:
+        spec = {'duration': duration, 'sample_rate': sample_rate, 'channels': channels,
+                'kind': kind, 'frequency': frequency, 'amplitude': amplitude, 'seed': seed,
+                'numpy': np is not None}
+        return self.get('.wav', spec, lambda f: write_wav(
+            f, duration, sample_rate, channels, kind, frequency, amplitude, seed))
+
+    def png(self, width: int, height: int, pattern: str = IMAGE_GRADIENT, seed: int = 0) -> str:
+        spec = {'width': width, 'height': height, 'pattern': pattern, 'seed': seed}
+        return self.get('.png', spec, lambda f: write_png(f, width, height, pattern, seed))
+
+    def jpeg(self, width: int, height: int, pattern: str = IMAGE_GRADIENT,
+             seed: int = 0, quality: int = 85) -> str:
+        spec = {'width': width, 'height': height, 'pattern': pattern, 'seed': seed,
+                'quality': quality, 'backend': jpeg_backend()}
+        return self.get('.jpg', spec, lambda f: write_jpeg(f, width, height, pattern, seed, quality))
+
+
+_pools: Dict[str, MediaPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_media_pool(pool_dir: Optional[str] = None) -> MediaPool:
+    """Общий (на процесс) пул для каталога"""
+    pool_dir = pool_dir or os.getenv('SYNTHETIC_MEDIA_DIR', DEFAULT_POOL_DIR)
+    with _pools_lock:
+        pool = _pools.get(pool_dir)
+        if pool is None:
+            pool = MediaPool(pool_dir)
+            _pools[pool_dir] = pool
+        return pool
+
+
+def parse_size(value: str) -> tuple:
+    """'1920x1080' -> (1920, 1080)"""
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+
+def benchmark(duration: float = 60.0) -> None:
+    """Скорость генерации WAV и PNG"""
+    for kind in (AUDIO_TONE, AUDIO_NOISE, AUDIO_SILENCE):
+        buffer = io.BytesIO()
+        start = time.perf_counter()
+        size = write_wav(buffer, duration, kind=kind, channels=2)
+        elapsed = time.perf_counter() - start
+        print(f"🎵 WAV {kind:<8} {duration:.0f} сек стерео: {size / 1e6:.1f} МБ за {elapsed:.3f} сек "
+              f"({size / 1e6 / elapsed:.0f} МБ/с)")
+    for pattern in (IMAGE_GRADIENT, IMAGE_NOISE):
+        buffer = io.BytesIO()
+        start = time.perf_counter()
+        size = write_png(buffer, 1920, 1080, pattern)
+        print(f"🖼️ PNG {pattern:<8} 1920x1080: {size / 1e6:.2f} МБ за {time.perf_counter() - start:.3f} сек")
+    buffer = io.BytesIO()
+    start = time.perf_counter()
+    size = write_jpeg(buffer, 1920, 1080)
+    print(f"🖼️ JPEG ({jpeg_backend()}) 1920x1080: {size / 1e3:.1f} КБ за {time.perf_counter() - start:.3f} сек")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Генератор тестовых аудио и изображений')
+    parser.add_argument('output', nargs='?', help='Файл (.wav/.png/.jpg)')
+    parser.add_argument('--duration', type=float, default=5.0, help='Длительность WAV, сек')
+    parser.add_argument('--sample-rate', type=int, default=44100)
+    parser.add_argument('--channels', type=int, default=1)
+    parser.add_argument('--audio', choices=[AUDIO_TONE, AUDIO_NOISE, AUDIO_SILENCE], default=AUDIO_TONE)
+    parser.add_argument('--size', type=parse_size, default=(1280, 720), help='Разрешение, например 1920x1080')
+    parser.add_argument('--pattern', choices=[IMAGE_GRADIENT, IMAGE_NOISE, IMAGE_SOLID], default=IMAGE_GRADIENT)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--benchmark', action='store_true', help='Замер скорости генерации')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark()
+        return
+
+    if not args.output:
+        parser.error('Укажите файл или --benchmark')
+    output = args.output
+    extension = os.path.splitext(output)[1].lower()
+    width, height = args.size
+
+    with open(output, 'wb') as f:
+        if extension == '.wav':
+            size = write_wav(f, args.duration, args.sample_rate, args.channels, args.audio, seed=args.seed)
+        elif extension == '.png':
+            size = write_png(f, width, height, args.pattern, args.seed)
+        elif extension in ('.jpg', '.jpeg'):
+            size = write_jpeg(f, width, height, args.pattern, args.seed)
+        else:
+            parser.error(f"Неизвестное расширение: {extension}")
+    print(f"✅ {output} ({size} байт)")
+
+
+if __name__ == "__main__":
+    main()
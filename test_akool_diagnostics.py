@@ -7,35 +7,33 @@
 import os
 import sys
 import json
+import asyncio
 import time
 import requests
 import argparse
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Iterable, Iterator, List
 from pathlib import Path
 import tempfile
 import logging
+from collections import deque
 from datetime import datetime
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('akool_diagnostics.log')
-    ]
-)
-logger = logging.getLogger(__name__)
+from akool_batch_submit import AimdRateLimiter, SubmitResult, split_job_line, submit_batch, summarize, talking_photo_submitter
+from akool_circuit_breaker import ENDPOINT_CREATE_TALKING_PHOTO, get_breaker, get_retry_budget
+from akool_flight_recorder import get_flight_recorder
+from akool_http import DEFAULT_POOL_MAXSIZE, get_session
+from akool_job_store import UPSERT_CHUNK, get_job_store
+from akool_media_preflight import get_media_preflight
+from akool_metrics import get_registry, start_metrics_server
+from akool_status_poller import OUTCOME_COMPLETED, OUTCOME_EXHAUSTED, SOURCE_WEBHOOK, VideoStatusPoller, http_status_fetcher
+from akool_token_cache import AkoolTokenError, get_token_provider
+from akool_webhook_reconcile import WebhookReconciler
+from akool_webhook_server import DurableQueue
+from structured_log import LazyBody, log_event, setup_logging
 
-class Colors:
-    """Цвета для консольного вывода"""
-    RED = '\033[0;31m'
-    GREEN = '\033[0;32m'
-    BLUE = '\033[0;34m'
-    YELLOW = '\033[1;33m'
-    PURPLE = '\033[0;35m'
-    CYAN = '\033[0;36m'
-    NC = '\033[0m'  # No Color
+# Настройка логирования: запись в консоль и JSON-lines файл выполняет фоновый поток
+setup_logging('akool_diagnostics.log')
+logger = logging.getLogger(__name__)
 
 class AkoolDiagnostics:
     """Класс для диагностики ошибок AKOOL API"""
@@ -44,7 +42,8 @@ class AkoolDiagnostics:
         # AKOOL конфигурация
         self.client_id = "mrj0kTxsc6LoKCEJX2oyyA=="
         self.client_secret = "J6QZyb+g0ucATnJa7MSG9QRm9FfVDsMF"
-        self.base_url = "https://openapi.akool.com/api/open/v3"
+        # AKOOL_BASE_URL позволяет направить клиент на akool_stub_server.py
+        self.base_url = os.getenv('AKOOL_BASE_URL', "https://openapi.akool.com/api/open/v3")
         self.access_token = None
         
         # Retry настройки
@@ -53,50 +52,48 @@ class AkoolDiagnostics:
         self.max_delay = 30
         self.status_check_attempts = 10
         self.status_delay = 5
+        self.status_rate_limit = 10  # запросов getvideostatus в секунду на процесс
+        
+        # Очередь akool_webhook_server.py: при ней статус берётся из webhook, опрос - запасной
+        self.webhook_queue_dir = None
+        self.webhook_timeout = 180
+        self.webhook_fallback_interval = 30
+        
+        # Общий HTTP слой с пулом keep-alive соединений
+        self.session = get_session()
+        # Латентность запросов пишет сама сессия, коды AKOOL и статусы видео - клиент
+        self.metrics = get_registry()
+        # Последние запросы/ответы по endpoint (пишет сессия) - для отчётов в поддержку
+        self.flight_recorder = get_flight_recorder()
+        # Проверка URL медиа до отправки (None - отключена)
+        self.media_preflight = get_media_preflight(self.session)
+        # Состояние задач рендера (SQLite), чтобы после падения дочитать статусы (--resume)
+        self.job_store = get_job_store()
+        # _id видео из ответов пакетной отправки (по нему AKOOL шлёт webhook)
+        self._video_ids: Dict[str, str] = {}
         
         # Временные файлы
         self.temp_dir = tempfile.mkdtemp(prefix='akool_diagnostics_')
-        logger.info(f"Временная директория: {self.temp_dir}")
+        logger.info("Временная директория: %s", self.temp_dir)
     
-    def log(self, message: str, level: str = "INFO"):
-        """Логирование с цветами"""
-        color_map = {
-            "INFO": Colors.BLUE,
-            "SUCCESS": Colors.GREEN,
-            "ERROR": Colors.RED,
-            "WARNING": Colors.YELLOW,
-            "DEBUG": Colors.CYAN,
-            "INFO_SPECIAL": Colors.PURPLE
-        }
-        color = color_map.get(level, Colors.NC)
-        print(f"{color}[{level}]{Colors.NC} {message}")
-        logger.info(f"[{level}] {message}")
+    def log(self, message: str, level: str = "INFO", *args: Any, **fields: Any):
+        """Ленивое структурированное логирование: args подставляются в message только при записи"""
+        log_event(logger, level, message, *args, **fields)
     
     def get_access_token(self) -> bool:
-        """Получение API токена AKOOL"""
+        """Получение API токена AKOOL (из общего кэша или через /getToken)"""
         self.log("🔑 Получение API токена AKOOL...")
         
         try:
-            response = requests.post(
-                f"{self.base_url}/getToken",
-                json={
-                    "clientId": self.client_id,
-                    "clientSecret": self.client_secret
-                },
-                timeout=10
-            )
-            
-            self.log(f"Ответ getToken: {response.text}", "DEBUG")
+            provider = get_token_provider(self.client_id, self.client_secret, self.base_url, self.session)
+            self.access_token = provider.get_token()
+            provider.start_background_refresh()
+            self.log("✅ API токен AKOOL получен успешно", "SUCCESS")
+            return True
             
-            data = response.json()
-            if data.get('code') == 1000 and data.get('token'):
-                self.access_token = data['token']
-                self.log("✅ API токен AKOOL получен успешно", "SUCCESS")
-                return True
-            else:
-                self.log(f"❌ Ошибка получения токена. Код: {data.get('code')}", "ERROR")
-                return False
-                
+        except AkoolTokenError as e:
+            self.log(f"❌ {e}", "ERROR")
+            return False
         except Exception as e:
             self.log(f"❌ Ошибка при получении токена: {e}", "ERROR")
             return False
@@ -110,13 +107,14 @@ class AkoolDiagnostics:
             return False
         
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/user/info",
                 headers={"Authorization": f"Bearer {self.access_token}"},
                 timeout=10
             )
             
-            self.log(f"Ответ user/info: {response.text}", "DEBUG")
+            self.log("Ответ user/info: %s", "DEBUG", LazyBody(response),
+                     endpoint="/user/info", status=response.status_code)
             
             if response.status_code == 200:
                 data = response.json()
@@ -165,6 +163,14 @@ class AkoolDiagnostics:
         if webhook_url and not webhook_url.startswith(('http://', 'https://')):
             errors.append("Webhook URL должен начинаться с http:// или https://")
         
+        if not errors and self.media_preflight is not None:
+            # Недоступное медиа AKOOL всё равно отклонит (1015) - после запроса и повторов
+            for result in self.media_preflight.check_job(talking_photo_url, audio_url):
+                self.log("Preflight %s: HTTP %s, %s, %s байт, %.0f мс%s", "DEBUG", result.url, result.status,
+                         result.content_type, result.size, result.latency * 1000, " (кэш)" if result.cached else "")
+                label = "изображения" if result.kind == 'image' else "аудио"
+                errors.extend(f"Файл {label} не прошёл проверку: {problem}" for problem in result.problems)
+        
         if errors:
             self.log("❌ Ошибки валидации параметров:", "ERROR")
             for error in errors:
@@ -188,16 +194,31 @@ class AkoolDiagnostics:
             
             # Создаем отчет для поддержки
             self.create_support_report(code, msg, full_response)
+            return
         elif code == "1001":
             self.log("❌ Ошибка аутентификации - проверьте CLIENT_ID и CLIENT_SECRET", "ERROR")
         elif code == "2001":
             self.log("❌ Ошибка формата запроса - проверьте JSON структуру", "ERROR")
         else:
             self.log(f"❓ Неизвестная ошибка {code} - обратитесь в поддержку", "WARNING")
+        self.dump_flight_recorder(f"code-{code}", code=code, msg=msg)
+    
+    def dump_flight_recorder(self, reason: str, **extra: Any) -> Optional[str]:
+        """Сохранить последние запросы/ответы в постоянный каталог (с ротацией)"""
+        try:
+            path = self.flight_recorder.dump(reason, extra)
+        except OSError as e:
+            self.log(f"⚠️ Не удалось сохранить журнал запросов: {e}", "WARNING")
+            return None
+        self.log(f"🛩️ Последние запросы сохранены: {path}", "INFO")
+        return path
     
     def create_support_report(self, code: str, msg: str, full_response: str) -> None:
-        """Создание отчета для поддержки"""
-        report_file = os.path.join(self.temp_dir, f"akool_error_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt")
+        """Создание отчета для поддержки (рядом с дампом flight recorder, не во временном каталоге)"""
+        dump_path = self.dump_flight_recorder(f"code-{code}", code=code, msg=msg)
+        report_dir = self.flight_recorder.directory
+        os.makedirs(report_dir, exist_ok=True)
+        report_file = os.path.join(report_dir, f"akool_error_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt")
         
         with open(report_file, 'w', encoding='utf-8') as f:
             f.write("=== ОТЧЕТ ОБ ОШИБКЕ AKOOL API ===\n")
@@ -213,6 +234,13 @@ class AkoolDiagnostics:
             f.write("=== ОТВЕТ API ===\n")
             f.write(f"{full_response}\n\n")
             
+            f.write("=== ПОСЛЕДНИЕ ЗАПРОСЫ ===\n")
+            for line in self.flight_recorder.summary_lines():
+                f.write(f"{line}\n")
+            if dump_path:
+                f.write(f"Полный журнал (тела запросов и ответов): {dump_path}\n")
+            f.write("\n")
+            
             f.write("=== СИСТЕМНАЯ ИНФОРМАЦИЯ ===\n")
             f.write(f"Python версия: {sys.version}\n")
             f.write(f"OS: {os.name}\n")
@@ -229,6 +257,7 @@ class AkoolDiagnostics:
             f.write("Email: support@akool.com\n")
             f.write("Документация: https://docs.akool.com/\n")
         
+        self.flight_recorder.rotate('akool_error_report_')
         self.log(f"📄 Отчет для поддержки создан: {report_file}", "INFO")
         self.log("Отправьте этот файл в поддержку AKOOL для диагностики", "INFO")
     
@@ -244,10 +273,16 @@ class AkoolDiagnostics:
         if not self.check_account_limits():
             return False
         
+        breaker = get_breaker(ENDPOINT_CREATE_TALKING_PHOTO, "1015")
+        retry_budget = get_retry_budget(ENDPOINT_CREATE_TALKING_PHOTO)
         attempt = 1
         delay = self.base_delay
         
         while attempt <= self.max_retries:
+            if not breaker.allow():
+                self.log(f"⛔ AKOOL перегружен (1015), circuit breaker разомкнут ещё {breaker.remaining_open():.0f} сек", "WARNING")
+                return False
+            
             self.log(f"🔄 Попытка {attempt}/{self.max_retries} создания Talking Photo...")
             
             try:
@@ -259,7 +294,7 @@ class AkoolDiagnostics:
                 if webhook_url:
                     payload["webhookUrl"] = webhook_url
                 
-                response = requests.post(
+                response = self.session.post(
                     f"{self.base_url}/content/video/createbytalkingphoto",
                     headers={
                         "Authorization": f"Bearer {self.access_token}",
@@ -269,22 +304,34 @@ class AkoolDiagnostics:
                     timeout=30
                 )
                 
-                self.log(f"Ответ create talking photo (попытка {attempt}): {response.text}", "DEBUG")
+                self.log("Ответ create talking photo (попытка %d): %s", "DEBUG", attempt, LazyBody(response),
+                         endpoint=ENDPOINT_CREATE_TALKING_PHOTO, status=response.status_code, attempt=attempt)
                 
                 if response.status_code == 200:
                     data = response.json()
                     code = str(data.get('code', ''))
                     task_id = data.get('data', {}).get('task_id')
                     msg = data.get('msg', '')
+                    self.metrics.count_code(ENDPOINT_CREATE_TALKING_PHOTO, code)
                     
                     if code == "1000" and task_id:
+                        breaker.record_success()
+                        retry_budget.record_success()
                         self.log(f"✅ Запрос на создание Talking Photo отправлен успешно. Task ID: {task_id}", "SUCCESS")
+                        self.job_store.upsert(task_id, payload=payload, next_poll_in=self.status_delay,
+                                              video_id=data['data'].get('_id'))
                         return True
                     elif code == "1015":
+                        breaker.record_failure()
                         self.log(f"⚠️ Ошибка 1015: {msg}", "WARNING")
-                        self.log(f"🔄 Повтор через {delay} секунд...", "WARNING")
+                        
+                        if attempt < self.max_retries and not retry_budget.try_spend():
+                            self.log("⛔ Бюджет повторов исчерпан, не нагружаем AKOOL дальше", "WARNING")
+                            self.analyze_error_1015(code, msg, response.text)
+                            return False
                         
                         if attempt < self.max_retries:
+                            self.log(f"🔄 Повтор через {delay} секунд...", "WARNING")
                             time.sleep(delay)
                             delay = min(delay * 2, self.max_delay)
                         else:
@@ -296,11 +343,13 @@ class AkoolDiagnostics:
                         self.analyze_error_1015(code, msg, response.text)
                         return False
                 else:
+                    # HTTP статусы >= 400 recorder сбрасывает сам
                     self.log(f"❌ HTTP ошибка: {response.status_code}", "ERROR")
                     return False
                     
             except Exception as e:
                 self.log(f"❌ Ошибка при создании Talking Photo: {e}", "ERROR")
+                self.dump_flight_recorder("exception", error=str(e))
                 return False
             
             attempt += 1
@@ -308,6 +357,64 @@ class AkoolDiagnostics:
         self.log(f"❌ Не удалось создать Talking Photo после {self.max_retries} попыток", "ERROR")
         return False
     
+    def _log_status_update(self, task_id: str, status: Optional[int], data: Dict[str, Any], attempt: int) -> None:
+        """Логирование каждого ответа getvideostatus"""
+        self.log("Ответ video status %s (попытка %d): %s", "DEBUG", task_id, attempt, LazyBody(data),
+                 task_id=task_id, video_status=status, attempt=attempt)
+        if status is not None:
+            self.metrics.count_video_status(status)
+            self.job_store.record_status(task_id, status, video_url=data.get('video_url') or None,
+                                         next_poll_in=self.status_delay)
+        
+        if status == 2:
+            self.log(f"⏳ Видео обрабатывается... (статус: {status})", "INFO")
+        elif status == 3:
+            self.log(f"🎉 Видео готово! URL: {data.get('video_url', '')}", "SUCCESS")
+        elif status == 4:
+            self.log(f"❌ Ошибка обработки видео (статус: {status})", "ERROR")
+        elif 'error' in data:
+            self.log(f"❌ Ошибка при проверке статуса: {data['error']}", "ERROR")
+        else:
+            self.log(f"❓ Неизвестный статус: {status}", "WARNING")
+    
+    def check_video_statuses(self, task_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Параллельная проверка статусов множества видео в одном event loop"""
+        poller_kwargs = {
+            'rate': self.status_rate_limit,
+            'base_interval': self.status_delay,
+            'max_attempts': self.status_check_attempts,
+            'on_update': self._log_status_update,
+        }
+        if self.webhook_queue_dir:
+            # Опрос только для задач, чей webhook просрочен
+            poller_kwargs['webhook_timeout'] = self.webhook_timeout
+            poller_kwargs['fallback_interval'] = self.webhook_fallback_interval
+        
+        async def poll() -> Dict[str, Dict[str, Any]]:
+            fetcher = http_status_fetcher(self.session, self.base_url, self.access_token)
+            poller = VideoStatusPoller(fetcher, **poller_kwargs)
+            follower = None
+            try:
+                if not self.webhook_queue_dir:
+                    return await poller.wait_all(task_ids)
+                
+                reconciler = WebhookReconciler(poller, self.job_store)
+                futures = {}
+                for task_id in task_ids:
+                    job = self.job_store.get(task_id)
+                    futures[task_id] = reconciler.track(task_id, job.video_id if job else None)
+                follower = asyncio.ensure_future(reconciler.follow(DurableQueue(self.webhook_queue_dir)))
+                await asyncio.gather(*futures.values())
+                return {task_id: future.result() for task_id, future in futures.items()}
+            finally:
+                if follower is not None:
+                    follower.cancel()
+                await poller.close()
+                self.log(f"📉 Запросов getvideostatus: {poller.polls}, статусов из webhook: {poller.webhook_updates}",
+                         "INFO", polls=poller.polls, webhook_updates=poller.webhook_updates)
+        
+        return asyncio.run(poll())
+    
     def check_video_status_with_retry(self, task_id: str) -> bool:
         """Проверка статуса видео с retry"""
         self.log(f"🔍 Проверка статуса видео с retry логикой (Task ID: {task_id})...")
@@ -316,53 +423,12 @@ class AkoolDiagnostics:
             self.log("❌ Нужен токен AKOOL", "ERROR")
             return False
         
-        attempt = 1
-        
-        while attempt <= self.status_check_attempts:
-            self.log(f"🔄 Проверка статуса {attempt}/{self.status_check_attempts}...")
-            
-            try:
-                response = requests.get(
-                    f"{self.base_url}/content/video/getvideostatus?task_id={task_id}",
-                    headers={"Authorization": f"Bearer {self.access_token}"},
-                    timeout=10
-                )
-                
-                self.log(f"Ответ video status (попытка {attempt}): {response.text}", "DEBUG")
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    code = str(data.get('code', ''))
-                    status = str(data.get('data', {}).get('status', ''))
-                    video_url = data.get('data', {}).get('video_url', '')
-                    
-                    if code == "1000":
-                        if status == "2":
-                            self.log(f"⏳ Видео обрабатывается... (статус: {status})", "INFO")
-                            if attempt < self.status_check_attempts:
-                                time.sleep(self.status_delay)
-                        elif status == "3":
-                            self.log(f"🎉 Видео готово! URL: {video_url}", "SUCCESS")
-                            return True
-                        elif status == "4":
-                            self.log(f"❌ Ошибка обработки видео (статус: {status})", "ERROR")
-                            return False
-                        else:
-                            self.log(f"❓ Неизвестный статус: {status}", "WARNING")
-                    else:
-                        self.log(f"❌ Ошибка проверки статуса видео. Код: {code}", "ERROR")
-                        msg = data.get('msg', '')
-                        if msg:
-                            self.log(f"Сообщение: {msg}", "ERROR")
-                else:
-                    self.log(f"❌ HTTP ошибка: {response.status_code}", "ERROR")
-                    
-            except Exception as e:
-                self.log(f"❌ Ошибка при проверке статуса: {e}", "ERROR")
-            
-            attempt += 1
+        result = self.check_video_statuses([task_id])[task_id]
         
-        self.log("⚠️ Превышено максимальное количество проверок статуса", "WARNING")
+        if result['outcome'] == OUTCOME_COMPLETED:
+            return True
+        if result['outcome'] == OUTCOME_EXHAUSTED:
+            self.log("⚠️ Превышено максимальное количество проверок статуса", "WARNING")
         return False
     
     def test_different_formats(self) -> None:
@@ -377,7 +443,7 @@ class AkoolDiagnostics:
         
         for i, test_case in enumerate(test_cases, 1):
             self.log(f"🔄 Тестирование {i}: {test_case['quality']} качество", "INFO")
-            self.log(f"Фото: {test_case['photo']}, Аудио: {test_case['audio']}", "DEBUG")
+            self.log("Фото: %s, Аудио: %s", "DEBUG", test_case['photo'], test_case['audio'])
     
     def cleanup(self):
         """Очистка временных файлов"""
@@ -389,6 +455,111 @@ class AkoolDiagnostics:
         except Exception as e:
             self.log(f"⚠️ Ошибка при очистке: {e}", "WARNING")
     
+    def create_talking_photos_batch(self, jobs: Iterable[Any], webhook_url: str = None,
+                                    workers: int = 8, rate: float = 5.0) -> Iterator[SubmitResult]:
+        """Пакетная отправка Talking Photo: результаты по мере готовности"""
+        submit = talking_photo_submitter(self.session, self.base_url, self.access_token, webhook_url,
+                                         on_accepted=self._remember_video_id)
+        limiter = AimdRateLimiter(rate=rate)
+        
+        retry_budget = get_retry_budget(ENDPOINT_CREATE_TALKING_PHOTO)
+        # Принятые задачи пишутся в хранилище пачками, а не транзакцией на каждую
+        pending: List[Dict[str, Any]] = []
+        # Задачи с недоступными медиа отклоняются до отправки, без запросов и повторов
+        rejected: deque = deque()
+        
+        def checked_jobs() -> Iterator[Any]:
+            for job, problems in self.media_preflight.iter_checked(jobs):
+                if problems:
+                    rejected.append(SubmitResult(job, None, f"preflight: {'; '.join(problems)}", 0))
+                else:
+                    yield job
+        
+        def results() -> Iterator[SubmitResult]:
+            for result in submit_batch(checked_jobs() if self.media_preflight is not None else jobs, submit,
+                                       workers=workers, limiter=limiter, max_retries=self.max_retries,
+                                       retry_budget=retry_budget):
+                while rejected:
+                    yield rejected.popleft()
+                yield result
+            while rejected:
+                yield rejected.popleft()
+        
+        try:
+            for result in results():
+                if result.task_id:
+                    self.log(f"✅ {result.job} -> Task ID: {result.task_id} (попыток: {result.attempts})", "SUCCESS")
+                    photo_url, audio_url = result.job
+                    pending.append({
+                        'task_id': result.task_id,
+                        'video_id': self._video_ids.pop(result.task_id, None),
+                        'payload': {'talking_photo_url': photo_url, 'audio_url': audio_url},
+                        'next_poll_in': self.status_delay,
+                    })
+                    if len(pending) >= UPSERT_CHUNK:
+                        self.job_store.upsert_many(pending)
+                        pending = []
+                else:
+                    self.log(f"❌ {result.job} -> {result.error} (попыток: {result.attempts})", "ERROR")
+                yield result
+        finally:
+            if pending:
+                self.job_store.upsert_many(pending)
+    
+    def _remember_video_id(self, task_id: str, data: Dict[str, Any]) -> None:
+        """Вызывается из потоков пакетной отправки"""
+        if data.get('_id'):
+            self._video_ids[task_id] = data['_id']
+    
+    def run_batch(self, jobs_file: str, webhook_url: str = None, workers: int = 8, wait: bool = False) -> bool:
+        """Отправка пакета задач из файла (строки 'photo_url audio_url'); wait - дождаться рендера"""
+        self.log(f"📦 Пакетная отправка задач из {jobs_file}...", "INFO_SPECIAL")
+        
+        if not self.get_access_token():
+            return False
+        
+        with open(jobs_file, 'r', encoding='utf-8') as f:
+            jobs = (split_job_line(line) for line in f if line.strip() and not line.startswith('#'))
+            task_ids: List[str] = []
+            
+            def accepted(results: Iterable[SubmitResult]) -> Iterator[SubmitResult]:
+                for result in results:
+                    if result.task_id:
+                        task_ids.append(result.task_id)
+                    yield result
+            
+            stats = summarize(accepted(self.create_talking_photos_batch(jobs, webhook_url, workers)))
+        
+        self.log(f"📊 Итог пакета: {stats}", "INFO")
+        if not wait or not task_ids:
+            return stats['failed'] == 0
+        
+        outcomes = self.check_video_statuses(task_ids)
+        completed = sum(1 for result in outcomes.values() if result['outcome'] == OUTCOME_COMPLETED)
+        by_webhook = sum(1 for result in outcomes.values() if result['source'] == SOURCE_WEBHOOK)
+        self.log(f"📊 Готово видео: {completed}/{len(task_ids)} (из webhook: {by_webhook})", "INFO")
+        return stats['failed'] == 0 and completed == len(task_ids)
+    
+    def resume_pending(self, limit: int = 100) -> bool:
+        """Дочитать статусы незавершённых задач из хранилища (после падения процесса)"""
+        self.log(f"♻️ Продолжение незавершённых задач из {self.job_store.path}...", "INFO_SPECIAL")
+        
+        if not self.get_access_token():
+            return False
+        
+        success = True
+        while True:
+            # Аренда на всё время опроса пачки: параллельный --resume не возьмёт те же задачи
+            jobs = self.job_store.claim_due(limit, lease=self.status_delay * (self.status_check_attempts + 1))
+            if not jobs:
+                break
+            self.log(f"🔍 Задач к проверке: {len(jobs)}", "INFO")
+            results = self.check_video_statuses([job.task_id for job in jobs])
+            success = success and all(result['outcome'] == OUTCOME_COMPLETED for result in results.values())
+        
+        self.log(f"📊 Задачи по статусам: {self.job_store.count_by_status()}", "INFO")
+        return success
+    
     def run_diagnostics(self) -> bool:
         """Запуск полной диагностики"""
         self.log("🚀 Расширенная диагностика AKOOL API с анализом ошибки 1015", "INFO_SPECIAL")
@@ -419,6 +590,20 @@ def main():
     parser.add_argument('--verbose', '-v', action='store_true', help='Подробный вывод')
     parser.add_argument('--max-retries', type=int, default=5, help='Максимальное количество попыток')
     parser.add_argument('--base-delay', type=int, default=2, help='Базовая задержка между попытками (секунды)')
+    parser.add_argument('--pool-size', type=int, default=DEFAULT_POOL_MAXSIZE, help='Соединений в пуле на хост')
+    parser.add_argument('--http2', action='store_true', help='HTTP/2 транспорт (нужен httpx[http2])')
+    parser.add_argument('--batch', help='Файл с задачами "photo_url audio_url" для пакетной отправки')
+    parser.add_argument('--workers', type=int, default=8, help='Потоков для пакетной отправки')
+    parser.add_argument('--webhook-url', help='Webhook URL для пакетной отправки')
+    parser.add_argument('--base-url', help='Базовый URL AKOOL API (например, локального stub сервера)')
+    parser.add_argument('--job-db', help='SQLite база задач (по умолчанию AKOOL_JOB_DB или ~/.cache/airshorts)')
+    parser.add_argument('--resume', action='store_true', help='Дочитать статусы незавершённых задач из базы')
+    parser.add_argument('--wait', action='store_true', help='С --batch: дождаться рендера отправленных задач')
+    parser.add_argument('--webhook-queue', help='Очередь akool_webhook_server.py: статусы из webhook, опрос - запасной')
+    parser.add_argument('--no-preflight', action='store_true', help='Не проверять URL медиа перед отправкой')
+    parser.add_argument('--webhook-timeout', type=float, default=180, help='Сколько ждать webhook до первого опроса, сек')
+    parser.add_argument('--metrics-out', help='Записать метрики в файл (.json - JSON, иначе формат Prometheus)')
+    parser.add_argument('--metrics-port', type=int, help='Отдавать /metrics и /metrics.json на этом порту')
     
     args = parser.parse_args()
     
@@ -428,15 +613,33 @@ def main():
     diagnostics = AkoolDiagnostics()
     diagnostics.max_retries = args.max_retries
     diagnostics.base_delay = args.base_delay
+    if args.base_url:
+        diagnostics.base_url = args.base_url.rstrip('/')
+    diagnostics.session = get_session(pool_maxsize=args.pool_size, http2=args.http2)
+    diagnostics.media_preflight = None if args.no_preflight else get_media_preflight(diagnostics.session)
+    if args.job_db:
+        diagnostics.job_store = get_job_store(args.job_db)
+    diagnostics.webhook_queue_dir = args.webhook_queue
+    diagnostics.webhook_timeout = args.webhook_timeout
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+        diagnostics.log(f"📈 Метрики: http://127.0.0.1:{args.metrics_port}/metrics")
     
     try:
-        success = diagnostics.run_diagnostics()
+        if args.resume:
+            success = diagnostics.resume_pending()
+        elif args.batch:
+            success = diagnostics.run_batch(args.batch, args.webhook_url, args.workers, args.wait)
+        else:
+            success = diagnostics.run_diagnostics()
         if success:
             diagnostics.log("🎉 Диагностика завершена успешно!", "SUCCESS")
         else:
             diagnostics.log("❌ Диагностика завершена с ошибками", "ERROR")
             sys.exit(1)
     finally:
+        if args.metrics_out:
+            diagnostics.metrics.write(args.metrics_out)
         diagnostics.cleanup()
 
 if __name__ == "__main__":
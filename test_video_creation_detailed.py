@@ -16,25 +16,24 @@ from pathlib import Path
 import tempfile
 import logging
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('test_video_creation.log')
-    ]
-)
-logger = logging.getLogger(__name__)
+from akool_circuit_breaker import ENDPOINT_CREATE_TALKING_PHOTO, get_breaker
+from akool_flight_recorder import get_flight_recorder
+from akool_http import DEFAULT_POOL_MAXSIZE, get_session
+from akool_job_store import get_job_store
+from akool_metrics import get_registry, start_metrics_server
+from akool_token_cache import AkoolTokenError, get_token_provider
+from akool_webhook_reconcile import WebhookReconciler
+from akool_webhook_server import DurableQueue
+from pipeline_dag import STAGE_SKIPPED, STAGE_SUCCESS, PipelineResult, PipelineRunner
+from structured_log import LazyBody, log_event, setup_logging
+from synthetic_media import AUDIO_NOISE, AUDIO_SILENCE, AUDIO_TONE, IMAGE_GRADIENT, get_media_pool, parse_size
+from tts_cache import get_tts_cache, iter_view_chunks, tts_key
+from tts_stream import DEFAULT_CHUNK_SIZE, open_stream, stream_to_file
+from voice_clone_cache import elevenlabs_voice_validator, get_voice_clone_cache, sample_file_key
 
-class Colors:
-    """Цвета для консольного вывода"""
-    RED = '\033[0;31m'
-    GREEN = '\033[0;32m'
-    BLUE = '\033[0;34m'
-    YELLOW = '\033[1;33m'
-    PURPLE = '\033[0;35m'
-    NC = '\033[0m'  # No Color
+# Настройка логирования: запись в консоль и JSON-lines файл выполняет фоновый поток
+setup_logging('test_video_creation.log')
+logger = logging.getLogger(__name__)
 
 class VideoCreationTester:
     """Класс для тестирования создания видео с клонированием голоса"""
@@ -43,12 +42,13 @@ class VideoCreationTester:
         # AKOOL конфигурация
         self.akool_client_id = "mrj0kTxsc6LoKCEJX2oyyA=="
         self.akool_client_secret = "J6QZyb+g0ucATnJa7MSG9QRm9FfVDsMF"
-        self.akool_base_url = "https://openapi.akool.com/api/open/v3"
+        # *_BASE_URL позволяют направить клиент на akool_stub_server.py
+        self.akool_base_url = os.getenv('AKOOL_BASE_URL', "https://openapi.akool.com/api/open/v3")
         self.akool_access_token = None
         
         # ElevenLabs конфигурация
         self.elevenlabs_api_key = os.getenv('ELEVENLABS_API_KEY', '')
-        self.elevenlabs_base_url = "https://api.elevenlabs.io/v1"
+        self.elevenlabs_base_url = os.getenv('ELEVENLABS_BASE_URL', "https://api.elevenlabs.io/v1")
         self.elevenlabs_voice_id = None
         
         # Тестовые данные
@@ -58,22 +58,39 @@ class VideoCreationTester:
         self.generated_audio_path = None
         self.akool_task_id = None
         
+        # Синтетические медиа: размеры задаются для замеров загрузки и пайплайна
+        self.media_pool = get_media_pool()
+        self.test_audio_duration = 3.0
+        self.test_audio_sample_rate = 44100
+        self.test_audio_channels = 1
+        self.test_audio_kind = AUDIO_TONE
+        self.test_image_size = (512, 512)
+        self.test_image_pattern = IMAGE_GRADIENT
+        
+        # Общий HTTP слой с пулом keep-alive соединений
+        self.session = get_session()
+        # Латентность запросов пишет сама сессия, коды AKOOL и статусы видео - клиент
+        self.metrics = get_registry()
+        # Последние запросы/ответы по endpoint (пишет сессия), сбрасываются на диск при ошибках
+        self.flight_recorder = get_flight_recorder()
+        # Состояние задач рендера (SQLite): task_id и голос переживают падение процесса (--resume)
+        self.job_store = get_job_store()
+        # Очередь akool_webhook_server.py: если webhook уже пришёл, getvideostatus не нужен
+        self.webhook_queue_dir = None
+        
+        # Потоковая озвучка: consumer(chunks) получает аудио параллельно с записью на диск
+        self.tts_streaming = True
+        self.tts_chunk_size = DEFAULT_CHUNK_SIZE
+        self.audio_consumer = None
+        self.tts_cache = get_tts_cache()
+        
         # Временные файлы
         self.temp_dir = tempfile.mkdtemp(prefix='video_test_')
-        logger.info(f"Временная директория: {self.temp_dir}")
+        logger.info("Временная директория: %s", self.temp_dir)
     
-    def log(self, message: str, level: str = "INFO"):
-        """Логирование с цветами"""
-        color_map = {
-            "INFO": Colors.BLUE,
-            "SUCCESS": Colors.GREEN,
-            "ERROR": Colors.RED,
-            "WARNING": Colors.YELLOW,
-            "INFO_SPECIAL": Colors.PURPLE
-        }
-        color = color_map.get(level, Colors.NC)
-        print(f"{color}[{level}]{Colors.NC} {message}")
-        logger.info(f"[{level}] {message}")
+    def log(self, message: str, level: str = "INFO", *args: Any, **fields: Any):
+        """Ленивое структурированное логирование: args подставляются в message только при записи"""
+        log_event(logger, level, message, *args, **fields)
     
     def check_dependencies(self) -> bool:
         """Проверка зависимостей"""
@@ -89,30 +106,19 @@ class VideoCreationTester:
             return False
     
     def get_akool_token(self) -> bool:
-        """Получение API токена AKOOL"""
+        """Получение API токена AKOOL (из общего кэша или через /getToken)"""
         self.log("🔑 Получение API токена AKOOL...")
         
         try:
-            response = requests.post(
-                f"{self.akool_base_url}/getToken",
-                json={
-                    "clientId": self.akool_client_id,
-                    "clientSecret": self.akool_client_secret
-                },
-                timeout=10
-            )
-            
-            self.log(f"Ответ getToken: {response.text}")
+            provider = get_token_provider(self.akool_client_id, self.akool_client_secret, self.akool_base_url, self.session)
+            self.akool_access_token = provider.get_token()
+            provider.start_background_refresh()
+            self.log("✅ API токен AKOOL получен успешно", "SUCCESS")
+            return True
             
-            data = response.json()
-            if data.get('code') == 1000 and data.get('token'):
-                self.akool_access_token = data['token']
-                self.log("✅ API токен AKOOL получен успешно", "SUCCESS")
-                return True
-            else:
-                self.log(f"❌ Ошибка получения токена. Код: {data.get('code')}", "ERROR")
-                return False
-                
+        except AkoolTokenError as e:
+            self.log(f"❌ {e}", "ERROR")
+            return False
         except Exception as e:
             self.log(f"❌ Ошибка при получении токена: {e}", "ERROR")
             return False
@@ -126,7 +132,7 @@ class VideoCreationTester:
             return False
         
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.elevenlabs_base_url}/voices",
                 headers={"xi-api-key": self.elevenlabs_api_key},
                 timeout=10
@@ -150,32 +156,15 @@ class VideoCreationTester:
         self.log("🎵 Создание тестового аудио файла...")
         
         try:
-            # Создаем минимальный WAV файл
-            self.test_audio_path = os.path.join(self.temp_dir, "test_audio.wav")
-            
-            # Простой WAV заголовок + тишина
-            wav_header = bytearray([
-                0x52, 0x49, 0x46, 0x46,  # "RIFF"
-                0x24, 0x00, 0x00, 0x00,  # File size - 8
-                0x57, 0x41, 0x56, 0x45,  # "WAVE"
-                0x66, 0x6D, 0x74, 0x20,  # "fmt "
-                0x10, 0x00, 0x00, 0x00,  # fmt chunk size
-                0x01, 0x00,              # Audio format (PCM)
-                0x01, 0x00,              # Number of channels
-                0x44, 0xAC, 0x00, 0x00,  # Sample rate (44100)
-                0x88, 0x58, 0x01, 0x00,  # Byte rate
-                0x02, 0x00,              # Block align
-                0x10, 0x00,              # Bits per sample
-                0x64, 0x61, 0x74, 0x61,  # "data"
-                0x00, 0x00, 0x00, 0x00   # Data size
-            ])
-            
-            with open(self.test_audio_path, 'wb') as f:
-                f.write(wav_header)
-                # Добавляем немного тишины
-                f.write(b'\x00' * 1000)
+            # Файл берётся из пула синтетических медиа, повторные прогоны его не генерируют
+            self.test_audio_path = self.media_pool.wav(
+                self.test_audio_duration,
+                sample_rate=self.test_audio_sample_rate,
+                channels=self.test_audio_channels,
+                kind=self.test_audio_kind
+            )
             
-            self.log("✅ Тестовое аудио создано", "SUCCESS")
+            self.log(f"✅ Тестовое аудио создано ({os.path.getsize(self.test_audio_path)} байт)", "SUCCESS")
             return True
             
         except Exception as e:
@@ -187,27 +176,10 @@ class VideoCreationTester:
         self.log("🖼️ Создание тестового изображения...")
         
         try:
-            self.test_photo_path = os.path.join(self.temp_dir, "test_image.jpg")
-            
-            # Создаем минимальный JPEG файл
-            jpeg_data = bytes([
-                0xFF, 0xD8, 0xFF, 0xE0, 0x00, 0x10, 0x4A, 0x46, 0x49, 0x46, 0x00, 0x01, 0x01, 0x01, 0x00, 0x48,
-                0x00, 0x48, 0x00, 0x00, 0xFF, 0xDB, 0x00, 0x43, 0x00, 0x08, 0x06, 0x06, 0x07, 0x06, 0x05, 0x08,
-                0x07, 0x07, 0x07, 0x09, 0x09, 0x08, 0x0A, 0x0C, 0x14, 0x0D, 0x0C, 0x0B, 0x0B, 0x0C, 0x19, 0x12,
-                0x13, 0x0F, 0x14, 0x1D, 0x1A, 0x1F, 0x1E, 0x1D, 0x1A, 0x1C, 0x1C, 0x20, 0x24, 0x2E, 0x27, 0x20,
-                0x22, 0x2C, 0x23, 0x1C, 0x1C, 0x28, 0x37, 0x29, 0x2C, 0x30, 0x31, 0x34, 0x34, 0x34, 0x1F, 0x27,
-                0x39, 0x3D, 0x38, 0x32, 0x3C, 0x2E, 0x33, 0x34, 0x32, 0xFF, 0xC0, 0x00, 0x11, 0x08, 0x00, 0x01,
-                0x00, 0x01, 0x01, 0x01, 0x11, 0x00, 0x02, 0x11, 0x01, 0x03, 0x11, 0x01, 0xFF, 0xC4, 0x00, 0x14,
-                0x00, 0x01, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-                0x00, 0x08, 0xFF, 0xC4, 0x00, 0x14, 0x10, 0x01, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-                0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0xFF, 0xDA, 0x00, 0x0C, 0x03, 0x01, 0x00, 0x02,
-                0x11, 0x03, 0x11, 0x00, 0x3F, 0x00, 0xAA, 0xFF, 0xD9
-            ])
-            
-            with open(self.test_photo_path, 'wb') as f:
-                f.write(jpeg_data)
+            width, height = self.test_image_size
+            self.test_photo_path = self.media_pool.jpeg(width, height, self.test_image_pattern)
             
-            self.log("✅ Тестовое изображение создано", "SUCCESS")
+            self.log(f"✅ Тестовое изображение создано ({os.path.getsize(self.test_photo_path)} байт)", "SUCCESS")
             return True
             
         except Exception as e:
@@ -223,38 +195,49 @@ class VideoCreationTester:
         self.log("🎤 Клонирование голоса через ElevenLabs...")
         
         try:
-            with open(self.test_audio_path, 'rb') as audio_file:
-                files = {
-                    'files': ('voice_sample.wav', audio_file, 'audio/wav')
-                }
-                data = {
-                    'name': f'TestVoice_{int(time.time())}',
-                    'description': 'Test voice for integration testing'
-                }
-                
-                response = requests.post(
-                    f"{self.elevenlabs_base_url}/voices/add",
-                    headers={"xi-api-key": self.elevenlabs_api_key},
-                    files=files,
-                    data=data,
-                    timeout=30
-                )
+            # Имя голоса в ключ не входит - оно каждый раз новое
+            clone_params = {'description': 'Test voice for integration testing'}
+            key = sample_file_key(self.test_audio_path, clone_params)
+            cache = get_voice_clone_cache(self.elevenlabs_api_key)
+            validate = elevenlabs_voice_validator(self.session, self.elevenlabs_base_url, self.elevenlabs_api_key)
             
-            self.log(f"Ответ ElevenLabs voice clone: {response.text}")
-            
-            if response.status_code == 200:
-                data = response.json()
-                if 'voice_id' in data:
-                    self.elevenlabs_voice_id = data['voice_id']
-                    self.log(f"✅ Голос клонирован успешно. Voice ID: {self.elevenlabs_voice_id}", "SUCCESS")
-                    return True
-            
-            self.log(f"❌ Ошибка клонирования голоса. Статус: {response.status_code}", "ERROR")
-            return False
+            result = cache.get_or_clone(key, lambda: self._clone_voice_request(clone_params), validate)
+            self.elevenlabs_voice_id = result['voice_id']
+            if result['cached']:
+                self.log(f"✅ Голос взят из кэша. Voice ID: {self.elevenlabs_voice_id}", "SUCCESS")
+            else:
+                self.log(f"✅ Голос клонирован успешно. Voice ID: {self.elevenlabs_voice_id}", "SUCCESS")
+            return True
             
         except Exception as e:
             self.log(f"❌ Ошибка клонирования голоса: {e}", "ERROR")
             return False
+
+    def _clone_voice_request(self, clone_params: Dict[str, Any]) -> str:
+        """POST /voices/add; возвращает voice_id"""
+        with open(self.test_audio_path, 'rb') as audio_file:
+            files = {
+                'files': ('voice_sample.wav', audio_file, 'audio/wav')
+            }
+            data = dict(clone_params, name=f'TestVoice_{int(time.time())}')
+            
+            response = self.session.post(
+                f"{self.elevenlabs_base_url}/voices/add",
+                headers={"xi-api-key": self.elevenlabs_api_key},
+                files=files,
+                data=data,
+                timeout=30
+            )
+        
+        self.log("Ответ ElevenLabs voice clone: %s", "INFO", LazyBody(response),
+                 endpoint="/voices/add", status=response.status_code)
+        
+        if response.status_code == 200:
+            voice_id = response.json().get('voice_id')
+            if voice_id:
+                return voice_id
+        
+        raise RuntimeError(f"Статус: {response.status_code}")
     
     def create_audio_with_voice(self) -> bool:
         """Создание аудио с клонированным голосом"""
@@ -276,30 +259,91 @@ class VideoCreationTester:
                 }
             }
             
-            response = requests.post(
-                f"{self.elevenlabs_base_url}/text-to-speech/{self.elevenlabs_voice_id}",
-                headers={
-                    "xi-api-key": self.elevenlabs_api_key,
-                    "Content-Type": "application/json"
-                },
-                json=payload,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                self.generated_audio_path = os.path.join(self.temp_dir, "generated_audio.mp3")
-                with open(self.generated_audio_path, 'wb') as f:
-                    f.write(response.content)
-                
-                self.log("✅ Аудио с клонированным голосом создано успешно", "SUCCESS")
+            headers = {
+                "xi-api-key": self.elevenlabs_api_key,
+                "Content-Type": "application/json"
+            }
+            self.generated_audio_path = os.path.join(self.temp_dir, "generated_audio.mp3")
+
+            cache_key = tts_key(payload["text"], self.elevenlabs_voice_id,
+                                payload["model_id"], payload["voice_settings"])
+            if self.tts_cache is not None and self._audio_from_cache(cache_key):
                 return True
+
+            if self.tts_streaming:
+                created = self._stream_audio_with_voice(headers, payload)
             else:
-                self.log(f"❌ Ошибка создания аудио. Статус: {response.status_code}", "ERROR")
-                return False
+                created = self._download_audio_with_voice(headers, payload)
+
+            if created and self.tts_cache is not None:
+                self.tts_cache.put_file(cache_key, self.generated_audio_path)
+            return created
                 
         except Exception as e:
             self.log(f"❌ Ошибка создания аудио: {e}", "ERROR")
             return False
+
+    def _audio_from_cache(self, cache_key: str) -> bool:
+        """Клип из кэша TTS: файл в temp_dir, consumer читает его через mmap"""
+        if not self.tts_cache.copy_to(cache_key, self.generated_audio_path):
+            return False
+        if self.audio_consumer is not None:
+            with self.tts_cache.open_mmap(cache_key) as view:
+                if view is not None:
+                    self.audio_consumer(iter_view_chunks(view, self.tts_chunk_size))
+        self.log("✅ Аудио взято из кэша TTS", "SUCCESS")
+        return True
+
+    def _download_audio_with_voice(self, headers: Dict[str, str], payload: Dict[str, Any]) -> bool:
+        """Озвучка одним ответом (без /stream)"""
+        response = self.session.post(
+            f"{self.elevenlabs_base_url}/text-to-speech/{self.elevenlabs_voice_id}",
+            headers=headers,
+            json=payload,
+            timeout=30
+        )
+        
+        if response.status_code == 200:
+            with open(self.generated_audio_path, 'wb') as f:
+                f.write(response.content)
+            
+            self.log("✅ Аудио с клонированным голосом создано успешно", "SUCCESS")
+            return True
+        else:
+            self.log(f"❌ Ошибка создания аудио. Статус: {response.status_code}", "ERROR")
+            return False
+
+    def _stream_audio_with_voice(self, headers: Dict[str, str], payload: Dict[str, Any]) -> bool:
+        """
+        Потоковая озвучка через /stream: чанки пишутся на диск по мере
+        синтеза и, если задан self.audio_consumer, сразу передаются дальше
+        """
+        started = time.perf_counter()
+
+        def first_chunk():
+            self.log(f"🔊 Первый чанк аудио через {time.perf_counter() - started:.2f} сек", "INFO")
+
+        with open_stream(
+            self.session,
+            f"{self.elevenlabs_base_url}/text-to-speech/{self.elevenlabs_voice_id}/stream",
+            headers=headers,
+            json=payload,
+            timeout=30
+        ) as response:
+            if response.status_code != 200:
+                self.log(f"❌ Ошибка создания аудио. Статус: {response.status_code}", "ERROR")
+                return False
+            stats = stream_to_file(
+                response, self.generated_audio_path,
+                chunk_size=self.tts_chunk_size,
+                consumer=self.audio_consumer,
+                on_first_chunk=first_chunk
+            )
+
+        self.log(f"✅ Аудио с клонированным голосом создано успешно "
+                 f"({stats['bytes']} байт, {stats['chunks']} чанков, "
+                 f"{time.perf_counter() - started:.2f} сек)", "SUCCESS")
+        return True
     
     def create_talking_photo_akool(self) -> bool:
         """Создание Talking Photo через AKOOL"""
@@ -321,8 +365,13 @@ class VideoCreationTester:
                 "webhookUrl": webhook_url
             }
             
-            response = requests.post(
-                f"{self.akool_base_url}/content/video/createbytalkingphoto",
+            breaker = get_breaker(ENDPOINT_CREATE_TALKING_PHOTO, "1015")
+            if not breaker.allow():
+                self.log(f"⛔ AKOOL перегружен (1015), circuit breaker разомкнут ещё {breaker.remaining_open():.0f} сек", "WARNING")
+                return False
+            
+            response = self.session.post(
+                f"{self.akool_base_url}{ENDPOINT_CREATE_TALKING_PHOTO}",
                 headers={
                     "Authorization": f"Bearer {self.akool_access_token}",
                     "Content-Type": "application/json"
@@ -331,22 +380,66 @@ class VideoCreationTester:
                 timeout=30
             )
             
-            self.log(f"Ответ AKOOL create talking photo: {response.text}")
+            self.log("Ответ AKOOL create talking photo: %s", "INFO", LazyBody(response),
+                     endpoint=ENDPOINT_CREATE_TALKING_PHOTO, status=response.status_code)
             
             if response.status_code == 200:
                 data = response.json()
+                self.metrics.count_code(ENDPOINT_CREATE_TALKING_PHOTO, data.get('code'))
                 if data.get('code') == 1000 and data.get('data', {}).get('task_id'):
+                    breaker.record_success()
                     self.akool_task_id = data['data']['task_id']
+                    self.job_store.upsert(self.akool_task_id, voice_id=self.elevenlabs_voice_id, payload=payload,
+                                          video_id=data['data'].get('_id'))
                     self.log(f"✅ Запрос на создание Talking Photo отправлен. Task ID: {self.akool_task_id}", "SUCCESS")
                     return True
+                if str(data.get('code')) == "1015":
+                    breaker.record_failure()
             
             self.log(f"❌ Ошибка создания Talking Photo. Код: {data.get('code')}", "ERROR")
+            self.dump_flight_recorder(f"code-{data.get('code')}")
             return False
             
         except Exception as e:
             self.log(f"❌ Ошибка создания Talking Photo: {e}", "ERROR")
+            self.dump_flight_recorder("exception", error=str(e))
             return False
     
+    def resume_last_job(self) -> bool:
+        """Восстановить Task ID и голос последней незавершённой задачи из хранилища"""
+        job = self.job_store.latest_active()
+        if job is None:
+            self.log(f"ℹ️ Незавершённых задач в {self.job_store.path} нет", "INFO")
+            return False
+        
+        self.akool_task_id = job.task_id
+        self.elevenlabs_voice_id = self.elevenlabs_voice_id or job.voice_id
+        self.log(f"♻️ Продолжение задачи {job.task_id} (статус {job.status}, голос {job.voice_id})", "INFO")
+        return True
+    
+    def _status_from_webhook(self) -> bool:
+        """Итоговый статус, уже доставленный webhook'ом (очередь -> job store), без запроса к AKOOL"""
+        if self.webhook_queue_dir:
+            WebhookReconciler(store=self.job_store).drain(DurableQueue(self.webhook_queue_dir))
+        
+        job = self.job_store.get(self.akool_task_id)
+        if job is None or not job.terminal:
+            return False
+        
+        self.metrics.count_video_status(job.status)
+        if job.status == 3:
+            self.log(f"🎉 Видео готово (webhook)! URL: {job.video_url}", "SUCCESS")
+        else:
+            self.log(f"❌ Ошибка обработки видео (webhook, статус: {job.status})", "ERROR")
+        return True
+    
+    def dump_flight_recorder(self, reason: str, **extra: Any) -> None:
+        """Сохранить последние запросы/ответы в постоянный каталог (с ротацией)"""
+        try:
+            self.log(f"🛩️ Последние запросы сохранены: {self.flight_recorder.dump(reason, extra)}", "INFO")
+        except OSError as e:
+            self.log(f"⚠️ Не удалось сохранить журнал запросов: {e}", "WARNING")
+    
     def check_akool_video_status(self) -> bool:
         """Проверка статуса видео AKOOL"""
         if not self.akool_access_token or not self.akool_task_id:
@@ -355,20 +448,27 @@ class VideoCreationTester:
         
         self.log(f"🔍 Проверка статуса видео AKOOL (Task ID: {self.akool_task_id})...")
         
+        if self._status_from_webhook():
+            return True
+        
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.akool_base_url}/content/video/getvideostatus?task_id={self.akool_task_id}",
                 headers={"Authorization": f"Bearer {self.akool_access_token}"},
                 timeout=10
             )
             
-            self.log(f"Ответ AKOOL video status: {response.text}")
+            self.log("Ответ AKOOL video status: %s", "INFO", LazyBody(response),
+                     endpoint="/content/video/getvideostatus", status=response.status_code)
             
             if response.status_code == 200:
                 data = response.json()
                 if data.get('code') == 1000:
                     status = data.get('data', {}).get('status')
                     video_url = data.get('data', {}).get('video_url')
+                    self.metrics.count_video_status(status)
+                    if status is not None:
+                        self.job_store.record_status(self.akool_task_id, status, video_url=video_url or None)
                     
                     self.log(f"✅ Статус видео: {status}", "SUCCESS")
                     
@@ -388,42 +488,53 @@ class VideoCreationTester:
             self.log(f"❌ Ошибка проверки статуса видео: {e}", "ERROR")
             return False
     
+    def _log_pipeline_event(self, event: str, name: str, result: PipelineResult) -> None:
+        """Логирование событий пайплайна"""
+        if event == 'started':
+            self.log(f"=== {name} ===", "INFO_SPECIAL")
+        elif event == STAGE_SKIPPED:
+            self.log(f"⚠️ Пропускаю шаг: {name}", "WARNING")
+        elif event != STAGE_SUCCESS:
+            if result.stages[name].critical:
+                self.log(f"❌ Критическая ошибка в шаге: {name}", "ERROR")
+            else:
+                self.log(f"⚠️ Шаг не выполнен: {name}", "WARNING")
+    
+    def build_pipeline(self) -> PipelineRunner:
+        """Граф шагов создания видео: независимые шаги выполняются параллельно"""
+        runner = PipelineRunner(max_workers=4, on_event=self._log_pipeline_event)
+        
+        runner.add_stage("Получение токена AKOOL", self.get_akool_token, critical=True)
+        runner.add_stage("Проверка ElevenLabs API", self.check_elevenlabs_key)
+        runner.add_stage("Создание тестового аудио", self.create_test_audio)
+        runner.add_stage("Создание тестового изображения", self.create_test_image)
+        
+        # Опциональные шаги: клонирование голоса и озвучка
+        runner.add_stage("Клонирование голоса", self.clone_voice_elevenlabs,
+                         requires=["Проверка ElevenLabs API", "Создание тестового аудио"],
+                         when=lambda: bool(self.elevenlabs_api_key))
+        runner.add_stage("Создание аудио с клонированным голосом", self.create_audio_with_voice,
+                         requires=["Клонирование голоса"])
+        
+        # Talking Photo ждёт озвучку, но не требует её успеха (иначе используем тестовое аудио)
+        runner.add_stage("Создание Talking Photo через AKOOL", self.create_talking_photo_akool,
+                         requires=["Получение токена AKOOL", "Создание тестового изображения"],
+                         after=["Создание аудио с клонированным голосом"], critical=True)
+        runner.add_stage("Проверка статуса видео", self.check_akool_video_status,
+                         requires=["Создание Talking Photo через AKOOL"])
+        return runner
+    
     def test_full_process(self) -> bool:
         """Тестирование полного процесса"""
         self.log("🚀 Начинаю тестирование полного процесса создания видео с клонированием голоса", "INFO_SPECIAL")
         
-        steps = [
-            ("Получение токена AKOOL", self.get_akool_token),
-            ("Проверка ElevenLabs API", self.check_elevenlabs_key),
-            ("Создание тестового аудио", self.create_test_audio),
-            ("Создание тестового изображения", self.create_test_image),
-        ]
-        
-        # Выполняем обязательные шаги
-        for step_name, step_func in steps:
-            self.log(f"=== {step_name} ===", "INFO_SPECIAL")
-            if not step_func():
-                if "AKOOL" in step_name:
-                    self.log(f"❌ Критическая ошибка в шаге: {step_name}", "ERROR")
-                    return False
-                else:
-                    self.log(f"⚠️ Пропускаю шаг: {step_name}", "WARNING")
-        
-        # Опциональные шаги
-        if self.elevenlabs_api_key:
-            self.log("=== Клонирование голоса ===", "INFO_SPECIAL")
-            if self.clone_voice_elevenlabs():
-                self.log("=== Создание аудио с клонированным голосом ===", "INFO_SPECIAL")
-                self.create_audio_with_voice()
-            else:
-                self.log("⚠️ Клонирование голоса недоступно, используем тестовое аудио", "WARNING")
+        result = self.build_pipeline().run()
         
-        # Создание Talking Photo
-        self.log("=== Создание Talking Photo через AKOOL ===", "INFO_SPECIAL")
-        if self.create_talking_photo_akool():
-            self.log("=== Проверка статуса видео ===", "INFO_SPECIAL")
-            self.check_akool_video_status()
-        else:
+        self.log("📊 Тайминги шагов:", "INFO")
+        for line in result.report():
+            self.log(f"  {line}", "INFO")
+        
+        if not result.ok("Создание Talking Photo через AKOOL"):
             self.log("❌ Не удалось создать Talking Photo", "ERROR")
             return False
         
@@ -447,6 +558,21 @@ def main():
     parser.add_argument('--akool-only', action='store_true', help='Тестировать только AKOOL')
     parser.add_argument('--elevenlabs-only', action='store_true', help='Тестировать только ElevenLabs')
     parser.add_argument('--verbose', '-v', action='store_true', help='Подробный вывод')
+    parser.add_argument('--pool-size', type=int, default=DEFAULT_POOL_MAXSIZE, help='Соединений в пуле на хост')
+    parser.add_argument('--http2', action='store_true', help='HTTP/2 транспорт (нужен httpx[http2])')
+    parser.add_argument('--no-tts-stream', action='store_true', help='Скачивать озвучку целиком, без /stream')
+    parser.add_argument('--no-tts-cache', action='store_true', help='Не использовать дисковый кэш озвучки')
+    parser.add_argument('--audio-seconds', type=float, default=3.0, help='Длительность тестового аудио')
+    parser.add_argument('--audio-kind', choices=[AUDIO_TONE, AUDIO_NOISE, AUDIO_SILENCE], default=AUDIO_TONE,
+                        help='Сигнал тестового аудио')
+    parser.add_argument('--akool-base-url', help='Базовый URL AKOOL API (например, локального stub сервера)')
+    parser.add_argument('--elevenlabs-base-url', help='Базовый URL ElevenLabs API')
+    parser.add_argument('--image-size', type=parse_size, default=(512, 512), help='Разрешение тестового фото, например 1920x1080')
+    parser.add_argument('--job-db', help='SQLite база задач (по умолчанию AKOOL_JOB_DB или ~/.cache/airshorts)')
+    parser.add_argument('--resume', action='store_true', help='Проверить статус последней незавершённой задачи AKOOL')
+    parser.add_argument('--webhook-queue', help='Очередь akool_webhook_server.py: статус из webhook без опроса AKOOL')
+    parser.add_argument('--metrics-out', help='Записать метрики в файл (.json - JSON, иначе формат Prometheus)')
+    parser.add_argument('--metrics-port', type=int, help='Отдавать /metrics и /metrics.json на этом порту')
     
     args = parser.parse_args()
     
@@ -457,9 +583,35 @@ def main():
     
     if args.elevenlabs_key:
         tester.elevenlabs_api_key = args.elevenlabs_key
+    tester.session = get_session(pool_maxsize=args.pool_size, http2=args.http2)
+    tester.tts_streaming = not args.no_tts_stream
+    if args.no_tts_cache:
+        tester.tts_cache = None
+    tester.test_audio_duration = args.audio_seconds
+    if args.akool_base_url:
+        tester.akool_base_url = args.akool_base_url.rstrip('/')
+    if args.elevenlabs_base_url:
+        tester.elevenlabs_base_url = args.elevenlabs_base_url.rstrip('/')
+    tester.test_audio_kind = args.audio_kind
+    tester.test_image_size = args.image_size
+    if args.job_db:
+        tester.job_store = get_job_store(args.job_db)
+    tester.webhook_queue_dir = args.webhook_queue
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+        tester.log(f"📈 Метрики: http://127.0.0.1:{args.metrics_port}/metrics")
     
     try:
-        if args.elevenlabs_only:
+        if args.resume:
+            tester.log("=== РЕЖИМ: Продолжение задачи AKOOL ===", "INFO_SPECIAL")
+            if not tester.resume_last_job():
+                sys.exit(1)
+            if not tester.get_akool_token():
+                sys.exit(1)
+            if not tester.check_akool_video_status():
+                sys.exit(1)
+            
+        elif args.elevenlabs_only:
             tester.log("=== РЕЖИМ: Только ElevenLabs ===", "INFO_SPECIAL")
             if not tester.check_elevenlabs_key():
                 sys.exit(1)
@@ -489,6 +641,8 @@ def main():
                 sys.exit(1)
                 
     finally:
+        if args.metrics_out:
+            tester.metrics.write(args.metrics_out)
         tester.cleanup()
 
 if __name__ == "__main__":
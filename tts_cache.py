@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+TTS Cache
+Дисковый кэш озвучки ElevenLabs, адресуемый по содержимому запроса
+
+Ключ - SHA-256 от (text, voice_id, model_id, voice_settings), файл клипа
+лежит в каталоге кэша под именем ключа. Индекс (ключ -> размер) держится в
+памяти в порядке LRU и восстанавливается при старте по времени доступа
+файлов. Запись атомарная (временный файл + os.replace), при превышении
+max_bytes вытесняются давно не использованные клипы. Клип можно читать
+через mmap, не копируя его в память процесса.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'airshorts', 'tts')
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+CLIP_SUFFIX = '.mp3'
+
+
+def tts_key(text: str, voice_id: str, model_id: str,
+            voice_settings: Optional[Dict[str, Any]] = None) -> str:
+    """Ключ кэша для запроса text-to-speech"""
+    raw = json.dumps([text, voice_id, model_id, voice_settings or {}],
+                     sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class TtsCache:
+    """LRU кэш клипов с ограничением общего размера"""
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or os.getenv('TTS_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self._index: 'OrderedDict[str, int]' = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._load_index()
+
+    def _load_index(self) -> None:
+        """Индекс из каталога: от давно не использованных к недавним"""
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(CLIP_SUFFIX) or not entry.is_file():
+                    continue
+                st = entry.stat()
+                entries.append((max(st.st_atime, st.st_mtime), entry.name[:-len(CLIP_SUFFIX)], st.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total += size
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + CLIP_SUFFIX)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def get(self, key: str) -> Optional[str]:
+        """Путь к клипу или None; попадание продвигает клип в LRU"""
+        with self._lock:
+            if key not in self._index:
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+            self.hits += 1
+        path = self.path(key)
+        try:
+            # Время доступа сохраняет порядок LRU между перезапусками
+            now = time.time()
+            os.utime(path, (now, now))
+        except FileNotFoundError:
+            # Файл удалили снаружи - чиним индекс
+            with self._lock:
+                self._total -= self._index.pop(key, 0)
+            return None
+        return path
+
+    @contextmanager
+    def writer(self, key: str):
+        """
+        Файл для записи клипа; в кэш попадает только при успешном выходе.
+
+            with cache.writer(key) as f:
+                f.write(chunk)
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.tts_')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                yield f
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, self.path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self._add(key, size)
+
+    def put_file(self, key: str, src_path: str) -> str:
+        """Скопировать готовый клип в кэш"""
+        with self.writer(key) as f, open(src_path, 'rb') as src:
+            shutil.copyfileobj(src, f)
+        return self.path(key)
+
+    def _add(self, key: str, size: int) -> None:
+        with self._lock:
+            self._total -= self._index.pop(key, 0)
+            self._index[key] = size
+            self._total += size
+            evicted = []
+            while self._total > self.max_bytes and len(self._index) > 1:
+                old_key, old_size = self._index.popitem(last=False)
+                self._total -= old_size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.unlink(self.path(old_key))
+            except FileNotFoundError:
+                pass
+        if evicted:
+            logger.info("🧹 Из кэша TTS вытеснено клипов: %d", len(evicted))
+
+    def evict(self, key: str) -> None:
+        with self._lock:
+            self._total -= self._index.pop(key, 0)
+        try:
+            os.unlink(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def open_mmap(self, key: str):
+        """memoryview клипа через mmap (None при промахе)"""
+        path = self.get(key)
+        if path is None:
+            yield None
+            return
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield memoryview(b'')
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    yield view
+                finally:
+                    view.release()
+
+    def copy_to(self, key: str, dst_path: str) -> bool:
+        """Клип из кэша в dst_path (жёсткая ссылка, иначе копия)"""
+        path = self.get(key)
+        if path is None:
+            return False
+        if os.path.exists(dst_path):
+            os.unlink(dst_path)
+        try:
+            os.link(path, dst_path)
+        except OSError:
+            shutil.copyfile(path, dst_path)
+        return True
+
+
+def iter_view_chunks(view: memoryview, chunk_size: int) -> Iterator[memoryview]:
+    """Чанки memoryview без копирования"""
+    for offset in range(0, len(view), chunk_size):
+        yield view[offset:offset + chunk_size]
+
+
+_caches: Dict[str, TtsCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_tts_cache(cache_dir: Optional[str] = None) -> TtsCache:
+    """Общий (на процесс) кэш для каталога"""
+    cache_dir = cache_dir or os.getenv('TTS_CACHE_DIR', DEFAULT_CACHE_DIR)
+    with _caches_lock:
+        cache = _caches.get(cache_dir)
+        if cache is None:
+            max_bytes = int(os.getenv('TTS_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+            cache = TtsCache(cache_dir, max_bytes)
+            _caches[cache_dir] = cache
+        return cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Дисковый кэш озвучки ElevenLabs')
+    parser.add_argument('--cache-dir', help='Каталог кэша')
+    parser.add_argument('--clear', action='store_true', help='Очистить кэш')
+    args = parser.parse_args()
+
+    cache = get_tts_cache(args.cache_dir)
+    if args.clear:
+        for key in list(cache._index):
+            cache.evict(key)
+    print(f"📄 Кэш TTS: {cache.cache_dir}")
+    print(f"🎧 Клипов: {len(cache)}, занято {cache.total_bytes / 1024 / 1024:.1f} из "
+          f"{cache.max_bytes / 1024 / 1024:.0f} МБ")
+
+
+if __name__ == "__main__":
+    main()
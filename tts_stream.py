@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+TTS Streaming
+Потоковая загрузка озвучки ElevenLabs с одновременной передачей дальше
+
+Ответ /text-to-speech/{voice_id}/stream читается чанками через
+iter_content и сразу пишется на диск и, при необходимости, в ограниченную
+очередь ChunkPipe, из которой следующий этап (например, загрузка аудио)
+читает параллельно. Память на задачу постоянна и не зависит от длины аудио.
+"""
+
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import requests
+
+DEFAULT_CHUNK_SIZE = 16 * 1024
+DEFAULT_PIPE_CHUNKS = 16
+
+_CLOSED = object()
+
+
+class ChunkPipe:
+    """
+    Ограниченная очередь чанков между загрузкой и следующим этапом.
+
+    write() блокируется, когда потребитель отстаёт (back-pressure), итерация
+    по pipe отдаёт чанки до close(). Объект можно передать как data= в
+    requests для chunked загрузки.
+    """
+
+    def __init__(self, max_chunks: int = DEFAULT_PIPE_CHUNKS):
+        self._queue: 'queue.Queue[Any]' = queue.Queue(maxsize=max_chunks)
+        self.error: Optional[BaseException] = None
+
+    def write(self, chunk: bytes) -> None:
+        self._queue.put(chunk)
+
+    def close(self, error: Optional[BaseException] = None) -> None:
+        self.error = error
+        self._queue.put(_CLOSED)
+
+    def __iter__(self) -> Iterator[bytes]:
+        while True:
+            chunk = self._queue.get()
+            if chunk is _CLOSED:
+                if self.error is not None:
+                    raise self.error
+                return
+            yield chunk
+
+
+@contextmanager
+def open_stream(session, url: str, **kwargs):
+    """POST со стримингом ответа для requests.Session и httpx.Client"""
+    if isinstance(session, requests.Session):
+        response = session.post(url, stream=True, **kwargs)
+        try:
+            yield response
+        finally:
+            response.close()
+    else:
+        with session.stream('POST', url, **kwargs) as response:
+            yield response
+
+
+def iter_response_chunks(response, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+    """Чанки тела ответа (requests: iter_content, httpx: iter_bytes)"""
+    if hasattr(response, 'iter_content'):
+        return response.iter_content(chunk_size=chunk_size)
+    return response.iter_bytes(chunk_size)
+
+
+def stream_to_file(response, path: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                   consumer: Optional[Callable[[Iterator[bytes]], Any]] = None,
+                   on_first_chunk: Optional[Callable[[], None]] = None,
+                   max_pipe_chunks: int = DEFAULT_PIPE_CHUNKS) -> Dict[str, Any]:
+    """
+    Запись ответа в файл по чанкам.
+
+    consumer(chunks) - следующий этап (например, загрузка), запускается в
+    отдельном потоке сразу и получает те же чанки по мере поступления.
+    Возвращает {'bytes': ..., 'chunks': ..., 'consumer_result': ...}.
+    """
+    pipe = ChunkPipe(max_pipe_chunks) if consumer is not None else None
+    consumer_result: Dict[str, Any] = {}
+    consumer_thread = None
+
+    if pipe is not None:
+        def run_consumer():
+            try:
+                consumer_result['value'] = consumer(iter(pipe))
+            except BaseException as e:
+                consumer_result['error'] = e
+                # Дочитываем очередь, чтобы загрузка не заблокировалась на write()
+                for _ in pipe:
+                    pass
+
+        consumer_thread = threading.Thread(target=run_consumer, name='tts-consumer', daemon=True)
+        consumer_thread.start()
+
+    total = 0
+    chunks = 0
+    error: Optional[BaseException] = None
+    try:
+        with open(path, 'wb') as f:
+            for chunk in iter_response_chunks(response, chunk_size):
+                if not chunk:
+                    continue
+                if chunks == 0 and on_first_chunk is not None:
+                    on_first_chunk()
+                f.write(chunk)
+                if pipe is not None:
+                    pipe.write(chunk)
+                total += len(chunk)
+                chunks += 1
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        if pipe is not None:
+            pipe.close(error)
+            consumer_thread.join()
+
+    if 'error' in consumer_result:
+        raise consumer_result['error']
+    return {'bytes': total, 'chunks': chunks, 'consumer_result': consumer_result.get('value')}
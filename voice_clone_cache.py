@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Voice Clone Cache
+Кэш клонированных голосов ElevenLabs, адресуемый по содержимому
+
+Ключ - SHA-256 от байтов образца и параметров клонирования (без имени
+голоса, которое каждый раз новое), значение - voice_id. Индекс хранится в
+JSON файле, общем для процессов. Поиск single-flight: параллельные задачи с
+одним образцом ждут одного клонирования (блокировка на ключ внутри
+процесса + flock между процессами). Перед выдачей голос периодически
+проверяется через GET /voices/{voice_id}; удалённые голоса вытесняются.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: только внутрипроцессная блокировка
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'airshorts')
+# Как часто перепроверять, что голос ещё существует
+DEFAULT_VALIDATE_INTERVAL = 3600
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Результат проверки голоса
+VOICE_VALID = 'valid'
+VOICE_MISSING = 'missing'
+VOICE_UNKNOWN = 'unknown'
+
+
+def sample_key(sample: bytes, params: Optional[Dict[str, Any]] = None) -> str:
+    """Ключ кэша для образца в памяти"""
+    digest = hashlib.sha256(sample)
+    digest.update(json.dumps(params or {}, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def sample_file_key(path: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """Ключ кэша для файла образца (читается по частям)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    digest.update(json.dumps(params or {}, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class VoiceCloneCache:
+    """Кэш sample_key -> voice_id с single-flight клонированием"""
+
+    def __init__(self, namespace: str = 'default', cache_dir: Optional[str] = None,
+                 validate_interval: float = DEFAULT_VALIDATE_INTERVAL):
+        cache_dir = cache_dir or os.getenv('VOICE_CLONE_CACHE_DIR', DEFAULT_CACHE_DIR)
+        os.makedirs(cache_dir, exist_ok=True)
+        name = hashlib.sha256(namespace.encode('utf-8')).hexdigest()[:16]
+        self.index_path = os.path.join(cache_dir, f"voice_clones_{name}.json")
+        self.lock_path = self.index_path + '.lock'
+        self.validate_interval = validate_interval
+
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._key_locks_guard = threading.Lock()
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._key_locks_guard:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    @contextmanager
+    def _file_lock(self):
+        """Межпроцессная блокировка на время клонирования и записи индекса"""
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _read_index(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self, index: Dict[str, Dict[str, Any]]) -> None:
+        """Атомарная запись: временный файл + os.replace"""
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.index_path), prefix='.voice_clones_')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(index, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def lookup(self, key: str) -> Optional[str]:
+        """voice_id из индекса без проверки"""
+        entry = self._read_index().get(key)
+        return entry.get('voice_id') if entry else None
+
+    def store(self, key: str, voice_id: str) -> None:
+        with self._file_lock():
+            self._store_locked(key, voice_id)
+
+    def _store_locked(self, key: str, voice_id: str) -> None:
+        index = self._read_index()
+        now = time.time()
+        index[key] = {'voice_id': voice_id, 'created_at': now, 'validated_at': now}
+        self._write_index(index)
+
+    def evict(self, key: str) -> None:
+        with self._file_lock():
+            self._evict_locked(key)
+
+    def _evict_locked(self, key: str) -> None:
+        index = self._read_index()
+        if index.pop(key, None) is not None:
+            self._write_index(index)
+
+    def evict_voice(self, voice_id: str) -> int:
+        """Удалить все записи с данным voice_id (например, после удаления голоса)"""
+        with self._file_lock():
+            index = self._read_index()
+            keys = [key for key, entry in index.items() if entry.get('voice_id') == voice_id]
+            for key in keys:
+                del index[key]
+            if keys:
+                self._write_index(index)
+            return len(keys)
+
+    def _check_entry(self, key: str, entry: Dict[str, Any],
+                     validate: Optional[Callable[[str], str]]) -> bool:
+        """True - запись можно использовать; устаревшая и удалённая вытесняется"""
+        if validate is None or time.time() - entry.get('validated_at', 0) < self.validate_interval:
+            return True
+        result = validate(entry['voice_id'])
+        if result == VOICE_MISSING:
+            logger.info("🗑️ Голос %s удалён в ElevenLabs, запись кэша вытеснена", entry['voice_id'])
+            self._evict_locked(key)
+            return False
+        if result == VOICE_VALID:
+            index = self._read_index()
+            if key in index:
+                index[key]['validated_at'] = time.time()
+                self._write_index(index)
+        # VOICE_UNKNOWN (сеть, 5xx) - используем кэш, проверим в следующий раз
+        return True
+
+    def get_or_clone(self, key: str, clone: Callable[[], str],
+                     validate: Optional[Callable[[str], str]] = None) -> Dict[str, Any]:
+        """
+        voice_id для ключа: из кэша или через clone().
+
+        validate(voice_id) возвращает VOICE_VALID / VOICE_MISSING / VOICE_UNKNOWN.
+        Возвращает {'voice_id': ..., 'cached': bool}.
+        """
+        with self._key_lock(key):
+            # Быстрый путь без межпроцессной блокировки
+            entry = self._read_index().get(key)
+            if entry and (validate is None or time.time() - entry.get('validated_at', 0) < self.validate_interval):
+                return {'voice_id': entry['voice_id'], 'cached': True}
+
+            with self._file_lock():
+                entry = self._read_index().get(key)
+                if entry and self._check_entry(key, entry, validate):
+                    return {'voice_id': entry['voice_id'], 'cached': True}
+
+                voice_id = clone()
+                self._store_locked(key, voice_id)
+                return {'voice_id': voice_id, 'cached': False}
+
+
+def elevenlabs_voice_validator(session, base_url: str, api_key: str,
+                               timeout: float = 10) -> Callable[[str], str]:
+    """validate(voice_id) через GET /voices/{voice_id}"""
+
+    def validate(voice_id: str) -> str:
+        try:
+            response = session.get(f"{base_url}/voices/{voice_id}",
+                                   headers={"xi-api-key": api_key}, timeout=timeout)
+        except Exception as e:
+            logger.warning("⚠️ Не удалось проверить голос %s: %s", voice_id, e)
+            return VOICE_UNKNOWN
+        if response.status_code == 200:
+            return VOICE_VALID
+        if response.status_code in (400, 404):
+            return VOICE_MISSING
+        return VOICE_UNKNOWN
+
+    return validate
+
+
+_caches: Dict[str, VoiceCloneCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_voice_clone_cache(namespace: str = 'default') -> VoiceCloneCache:
+    """Общий (на процесс) кэш для namespace (например, ElevenLabs аккаунта)"""
+    with _caches_lock:
+        cache = _caches.get(namespace)
+        if cache is None:
+            cache = VoiceCloneCache(namespace)
+            _caches[namespace] = cache
+        return cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Кэш клонированных голосов ElevenLabs')
+    parser.add_argument('--namespace', default='default', help='Пространство ключей (аккаунт)')
+    parser.add_argument('--evict-voice', help='Удалить записи с данным voice_id')
+    args = parser.parse_args()
+
+    cache = get_voice_clone_cache(args.namespace)
+    if args.evict_voice:
+        print(f"🗑️ Удалено записей: {cache.evict_voice(args.evict_voice)}")
+        return
+
+    index = cache._read_index()
+    print(f"📄 Индекс: {cache.index_path} ({len(index)} голосов)")
+    for key, entry in index.items():
+        print(f"  {key[:16]}... -> {entry['voice_id']} (проверен {time.ctime(entry.get('validated_at', 0))})")
+
+
+if __name__ == "__main__":
+    main()